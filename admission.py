@@ -0,0 +1,157 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request cannot be admitted; retry_after is in seconds.
+    """
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def retry_after_header(seconds: float) -> str:
+    # Retry-After takes whole seconds; rounding down would invite an early retry
+    return str(max(1, math.ceil(seconds)))
+
+
+class RateLimiter:
+    """
+    Token bucket per client: each request takes one token, tokens refill at
+    rate per second up to burst. Buckets of the max_clients most recently seen
+    clients are kept; a forgotten client starts again with a full bucket.
+    """
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # client -> (tokens, last refill), least recently seen first
+        self._lock = threading.Lock()
+        self._stats = {'allowed': 0, 'limited': 0}
+
+    def acquire(self, client: str, cost: float = 1) -> float:
+        """
+        Takes cost tokens from client's bucket. Returns 0 when the request may
+        proceed, otherwise the seconds until enough tokens are available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0
+                self._stats['allowed'] += 1
+            else:
+                wait = (cost - tokens) / self.rate
+                self._stats['limited'] += 1
+            self._buckets[client] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['clients'] = len(self._buckets)
+        return stats
+
+
+class ConcurrencyLimit:
+    """
+    Counting semaphore with a bounded wait, e.g. for zip builds. A limit of 0
+    admits everything but still counts what is in flight.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._stats = {'admitted': 0, 'rejected': 0, 'waited': 0}
+
+    def acquire(self, timeout=None) -> bool:
+        """
+        Waits up to timeout seconds (None = indefinitely) for a slot.
+        Returns False if none became free.
+        """
+        with self._cond:
+            if self.limit and self._in_flight >= self.limit:
+                self._stats['waited'] += 1
+                if not self._cond.wait_for(lambda: self._in_flight < self.limit, timeout):
+                    self._stats['rejected'] += 1
+                    return False
+            self._in_flight += 1
+            self._stats['admitted'] += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify()
+
+    def releaser(self):
+        """
+        Returns a function that releases one slot on its first call only, for
+        holders with several exit paths.
+        """
+        once = threading.Lock()
+
+        def release():
+            if once.acquire(blocking=False):
+                self.release()
+        return release
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats['in_flight'] = self._in_flight
+            stats['limit'] = self.limit
+        return stats
+
+
+class ByteBudget:
+    """
+    Caps the bytes of request bodies being received at once (0 = unlimited).
+    A body larger than the whole budget is admitted only when nothing else is
+    in flight, so it is throttled rather than refused forever.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._stats = {'admitted': 0, 'rejected': 0}
+
+    def reserve(self, nbytes: int) -> bool:
+        with self._lock:
+            if self.max_bytes and self._in_flight and self._in_flight + nbytes > self.max_bytes:
+                self._stats['rejected'] += 1
+                return False
+            self._in_flight += nbytes
+            self._stats['admitted'] += 1
+            return True
+
+    def release(self, nbytes: int):
+        with self._lock:
+            self._in_flight -= nbytes
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight_bytes'] = self._in_flight
+            stats['max_bytes'] = self.max_bytes
+        return stats
@@ -1,14 +1,41 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, g, has_request_context, request, jsonify, render_template, send_file, url_for
 from config import Config
-from utils import decrypt_data, find_files_in_paths, process_file_retrieval, save_file_to_dir, encrypt_data
+from utils import decrypt_data, find_files_in_paths, process_file_retrieval, save_stream_to_dir, encrypt_data, stream_zip, CompressionPolicy
+from utils import archive_member, cached_archive, decrypt_many, entry_name, find_files_batch, is_plain_filename, unique_name
+from cas import ContentStore, is_blob_entry
+from werkzeug.utils import secure_filename
+from db import ConnectionPool, PoolTimeout, SURAT_INSERT_SQL, PATH_BY_DIGEST_SQL, PATH_BY_ENCRIP_SQL, NO_SURAT_ALL_SQL, DIGEST_COLUMN_PROBE_SQL, checksum_rows, encrip_digest, insert_checksums, is_missing_column
+from zip_cache import ZipCache
+from hot_cache import HotFileCache
+from path_index import PathIndex
+from suggest_index import SuggestIndex
+from jobs import JobManager
+from uploads import UploadSessionManager, UploadConflict
+from placement import PlacementEngine
+from lookup_cache import LookupCache, SQLiteCacheBackend
+from admission import ByteBudget, ConcurrencyLimit, Overloaded, RateLimiter, retry_after_header
+from staging import ARCHIVE_PREFIX, StagingManager, archive_path, is_batch_list_name, load_batch_list, save_batch_list, touch
+from metrics import CONTENT_TYPE, Registry, StageTimer
+from logs import configure_logging
+import hashlib
+import ipaddress
+import json
+import logging
 import os
+import shutil
+import time
 import mysql.connector
-import random
+from concurrent.futures import ThreadPoolExecutor
+import re
+from urllib.parse import urlencode
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
-def get_db_connection():
+configure_logging(app.config['LOG_LEVEL'], app.config['LOG_JSON'])
+logger = logging.getLogger('filedo')
+
+def _connect():
     return mysql.connector.connect(
         host=app.config['MYSQL_HOST'],
         user=app.config['MYSQL_USER'],
@@ -16,46 +43,603 @@ def get_db_connection():
         database=app.config['MYSQL_DB']
     )
 
-@app.route('/')
-def index():
-    return render_template('index.html')
+db_pool = ConnectionPool(
+    _connect,
+    size=app.config['MYSQL_POOL_SIZE'],
+    timeout=app.config['MYSQL_POOL_TIMEOUT'],
+    recycle=app.config['MYSQL_POOL_RECYCLE'],
+    pre_ping=app.config['MYSQL_POOL_PRE_PING']
+)
 
-@app.route('/search', methods=['POST'])
-def search_file():
+zip_cache = ZipCache(
+    max_entries=app.config['ZIP_CACHE_MAX_ENTRIES'],
+    max_bytes=app.config['ZIP_CACHE_MAX_BYTES'],
+    max_age=app.config['ZIP_CACHE_MAX_AGE']
+) if app.config['ZIP_CACHE_ENABLED'] else None
+
+compression_policy = CompressionPolicy.from_config(app.config)
+
+hot_cache = HotFileCache(
+    app.config['HOT_CACHE_DIR'],
+    app.config['HOT_CACHE_MAX_BYTES'],
+    roots=app.config['HOT_CACHE_ROOTS'],
+    admit_after=app.config['HOT_CACHE_ADMIT_AFTER'],
+    max_file_bytes=app.config['HOT_CACHE_MAX_FILE_BYTES']
+) if app.config['HOT_CACHE_ENABLED'] else None
+
+# Shared pool for compressing members of large bundles; bounds zip CPU across requests
+zip_executor = ThreadPoolExecutor(
+    max_workers=app.config['ZIP_WORKERS'], thread_name_prefix='zip'
+) if app.config['ZIP_WORKERS'] > 1 else None
+
+path_index = None
+if app.config['PATH_INDEX_ENABLED']:
+    path_index = PathIndex(
+        app.config['SEARCH_PATHS'],
+        rescan_interval=app.config['PATH_INDEX_RESCAN_INTERVAL'],
+        negative_cache_size=app.config['PATH_INDEX_NEGATIVE_CACHE_SIZE'],
+        negative_ttl=app.config['PATH_INDEX_NEGATIVE_TTL']
+    )
+    path_index.start()
+
+def _load_no_surats():
+    with db_pool.get() as conn:
+        cursor = conn.cursor()
+        cursor.execute(NO_SURAT_ALL_SQL)
+        return [row[0] for row in cursor.fetchall()]
+
+suggest_index = None
+if app.config['SUGGEST_ENABLED']:
+    suggest_index = SuggestIndex(
+        _load_no_surats,
+        reload_interval=app.config['SUGGEST_RELOAD_INTERVAL'],
+        min_similarity=app.config['SUGGEST_MIN_SIMILARITY']
+    )
+    suggest_index.start()
+
+job_manager = JobManager(workers=app.config['JOB_WORKERS'], retention=app.config['JOB_RETENTION'])
+
+def forget_path(filename: str, root: str):
+    # A file the app deletes leaves the path index now, not at the next rescan
+    if path_index:
+        path_index.discard(filename, root)
+
+upload_sessions = UploadSessionManager(
+    ttl=app.config['UPLOAD_SESSION_TTL'],
+    chunk_size=app.config['UPLOAD_CHUNK_SIZE'],
+    on_remove=forget_path,
+    roots=app.config['SEARCH_PATHS']
+)
+
+placement = PlacementEngine(
+    strategy=app.config['PLACEMENT_STRATEGY'],
+    min_free_bytes=app.config['PLACEMENT_MIN_FREE_BYTES'],
+    min_free_ratio=app.config['PLACEMENT_MIN_FREE_RATIO'],
+    stat_ttl=app.config['PLACEMENT_STAT_TTL'],
+    write_window=app.config['PLACEMENT_WRITE_WINDOW'],
+    weights=app.config['PLACEMENT_WEIGHTS']
+)
+
+lookup_cache = None
+if app.config['LOOKUP_CACHE_ENABLED']:
+    lookup_cache = LookupCache(
+        max_entries=app.config['LOOKUP_CACHE_MAX_ENTRIES'],
+        ttl=app.config['LOOKUP_CACHE_TTL'],
+        negative_ttl=app.config['LOOKUP_CACHE_NEGATIVE_TTL'],
+        backend=SQLiteCacheBackend(app.config['LOOKUP_CACHE_SHARED_PATH'], app.config['LOOKUP_CACHE_PURGE_EVERY'])
+        if app.config['LOOKUP_CACHE_SHARED_PATH'] else None
+    )
+
+# Always available for reads: rows written in 'cas' mode stay readable after switching back
+content_store = ContentStore(app.config['SEARCH_PATHS'], app.config['CAS_DIRNAME'])
+
+staging_manager = None
+if app.config['STAGING_GC_ENABLED']:
+    staging_manager = StagingManager(
+        app.config['STAGING_DIR'],
+        ttl=app.config['STAGING_TTL'],
+        max_age=app.config['STAGING_MAX_AGE'],
+        quota_bytes=app.config['STAGING_QUOTA_BYTES'],
+        min_age=app.config['STAGING_MIN_AGE'],
+        interval=app.config['STAGING_GC_INTERVAL']
+    )
+    staging_manager.start()
+
+rate_limiter = RateLimiter(
+    app.config['RATE_LIMIT_PER_MINUTE'] / 60,
+    app.config['RATE_LIMIT_BURST']
+) if app.config['RATE_LIMIT_ENABLED'] else None
+
+# Archives built in STAGING_DIR or streamed, by requests and jobs alike
+zip_builds = ConcurrencyLimit(app.config['MAX_CONCURRENT_ZIP_BUILDS'])
+upload_budget = ByteBudget(app.config['MAX_UPLOAD_BYTES_IN_FLIGHT'])
+
+metrics_registry = Registry()
+STAGE_SECONDS = metrics_registry.histogram(
+    'filedo_stage_seconds', 'Time spent in each stage of a request pipeline', ['endpoint', 'stage'])
+REQUEST_SECONDS = metrics_registry.histogram(
+    'filedo_request_seconds', 'Request latency', ['endpoint', 'method', 'status'])
+ZIP_BYTES = metrics_registry.counter('filedo_zip_bytes_total', 'Bytes of zip archives handed out', ['delivery'])
+UPLOAD_BYTES = metrics_registry.counter('filedo_upload_bytes_total', 'Bytes of uploaded files received', ['kind'])
+ERRORS = metrics_registry.counter('filedo_errors_total', 'Failed pipeline steps by cause', ['cause'])
+ADMISSION_REJECTED = metrics_registry.counter('filedo_admission_rejected_total',
+                                              'Requests refused by admission control', ['reason'])
+ARCHIVE_RESPONSES = metrics_registry.counter('filedo_archive_responses_total',
+                                             'Staged archive downloads by HTTP status (206 = resumed)', ['status'])
+metrics_registry.gauge('filedo_staging_disk_used_bytes', 'Used bytes on the STAGING_DIR filesystem',
+                       fn=lambda: shutil.disk_usage(app.config['STAGING_DIR']).used)
+metrics_registry.gauge('filedo_staging_disk_free_bytes', 'Free bytes on the STAGING_DIR filesystem',
+                       fn=lambda: shutil.disk_usage(app.config['STAGING_DIR']).free)
+metrics_registry.gauge('filedo_staging_archive_bytes', 'Total size of staged archives at the last sweep',
+                       fn=lambda: staging_manager.stats()['bytes'] if staging_manager else None)
+metrics_registry.gauge('filedo_staging_archives', 'Number of staged archives at the last sweep',
+                       fn=lambda: staging_manager.stats()['files'] if staging_manager else None)
+
+metrics_registry.gauge('filedo_zip_builds_in_flight', 'Archives being built or streamed',
+                       fn=lambda: zip_builds.in_flight)
+metrics_registry.gauge('filedo_upload_bytes_in_flight', 'Bytes of upload bodies admitted and not yet finished',
+                       fn=lambda: upload_budget.in_flight)
+
+def _pool_connections():
+    pool_stats = db_pool.stats()
+    return {('idle',): pool_stats['idle'], ('in_use',): pool_stats['in_use']}
+
+metrics_registry.gauge('filedo_db_pool_connections', 'Pooled database connections', ['state'], fn=_pool_connections)
+
+def request_timer(endpoint: str) -> StageTimer:
     """
-    Endpoint to search for files via the web UI using 'nomor_surat'.
-    Input JSON: { "filename": "SK/..." } (Nomor Surat)
+    Starts the stage timer of the current request; its stages feed /metrics
+    and the Server-Timing header.
     """
-    data = request.get_json()
-    query_input = data.get('filename') # 'filename' key is used for Nomor Surat input
-    
-    if not query_input:
-        return jsonify({"error": "Nomor Surat is required"}), 400
-    
+    g.stage_timer = StageTimer(endpoint, STAGE_SECONDS)
+    return g.stage_timer
+
+@app.before_request
+def start_request_clock():
+    g.request_started = time.perf_counter()
+
+# Expensive endpoints, each request takes a token from its client's bucket.
+# Upload chunks are exempt so a large file is not throttled chunk by chunk.
+RATE_LIMITED_ENDPOINTS = {'search_file', 'retrieve_file', 'search_batch', 'download_batch', 'download_file',
+                          'upload_file', 'create_upload_session', 'complete_upload_session'}
+UPLOAD_ENDPOINTS = {'upload_file', 'upload_session_chunk'}
+
+# Client address headers trusted from a proxy on the same host when RATE_LIMIT_CLIENT_HEADER is unset
+LOCAL_PROXY_HEADERS = ('X-Real-IP', 'X-Forwarded-For')
+
+def is_loopback(address: str) -> bool:
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return False
+
+def client_id() -> tuple:
+    """
+    Returns (client, from_header): the address a request is rate limited by, and
+    whether it was read from a proxy header rather than the peer address.
+    """
+    peer = request.remote_addr or 'unknown'
+    header = app.config['RATE_LIMIT_CLIENT_HEADER']
+    if header:
+        value = request.headers.get(header)
+    elif is_loopback(peer):
+        # Behind nginx on the same host every peer is loopback, which is exempt
+        value = next(filter(None, (request.headers.get(name) for name in LOCAL_PROXY_HEADERS)), None)
+    else:
+        value = None
+    # The proxy appends the address it saw to X-Forwarded-For; entries left of it
+    # are whatever the client sent, so only the last one can be trusted
+    client = value.split(',')[-1].strip() if value else None
+    return (client, True) if client else (peer, False)
+
+@app.before_request
+def admission_control():
+    """
+    Refuses requests over their client's rate and uploads beyond the in-flight
+    byte budget before any work is done. Zip build slots are taken where
+    archives are built.
+    """
+    if rate_limiter and request.endpoint in RATE_LIMITED_ENDPOINTS:
+        client, from_header = client_id()
+        # A header can name any address, so only a real local peer is exempt
+        if from_header or client not in app.config['RATE_LIMIT_EXEMPT']:
+            wait = rate_limiter.acquire(client)
+            if wait:
+                raise Overloaded('rate', wait)
+
+    if request.endpoint in UPLOAD_ENDPOINTS:
+        # Chunked bodies without Content-Length are not counted
+        size = request.content_length or 0
+        if not upload_budget.reserve(size):
+            raise Overloaded('upload_bytes', app.config['BUSY_RETRY_AFTER'])
+        g.upload_reserved = size
+
+@app.teardown_request
+def release_upload_budget(exc):
+    size = g.pop('upload_reserved', None)
+    if size is not None:
+        upload_budget.release(size)
+
+OVERLOADED_MESSAGES = {
+    'rate': "Too many requests, slow down",
+    'zip_builds': "Server is busy building archives, try again shortly",
+    'upload_bytes': "Server is busy receiving uploads, try again shortly"
+}
+
+@app.errorhandler(Overloaded)
+def overloaded(error):
+    ADMISSION_REJECTED.inc(reason=error.reason)
+    retry_after = retry_after_header(error.retry_after)
+    response = jsonify({"error": OVERLOADED_MESSAGES[error.reason], "retry_after": int(retry_after)})
+    response.headers['Retry-After'] = retry_after
+    return response, 429 if error.reason == 'rate' else 503
+
+def acquire_zip_slot():
+    """
+    Takes a zip build slot; the caller releases zip_builds. Requests wait up to
+    ZIP_BUILD_WAIT seconds and then get a 503, queued jobs wait their turn.
+    """
+    timeout = app.config['ZIP_BUILD_WAIT'] if has_request_context() else None
+    if not zip_builds.acquire(timeout):
+        raise Overloaded('zip_builds', app.config['BUSY_RETRY_AFTER'])
+
+@app.after_request
+def record_request(response):
+    elapsed = time.perf_counter() - g.get('request_started', time.perf_counter())
+    endpoint = request.endpoint or 'unknown'
+    REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+
+    timer = g.get('stage_timer')
+    if app.config['SERVER_TIMING_ENABLED']:
+        stages = timer.server_timing() if timer else ''
+        response.headers['Server-Timing'] = ', '.join(filter(None, [stages, f"total;dur={elapsed * 1000:.1f}"]))
+
+    logger.info("request", extra={
+        "method": request.method,
+        "path": request.path,
+        "endpoint": endpoint,
+        "status": response.status_code,
+        "duration_ms": round(elapsed * 1000, 2),
+        "stages": timer.to_dict() if timer else None
+    })
+    return response
+
+def get_db_connection():
+    """
+    Checks out a pooled connection. Calling close() on it returns it to the pool.
+    """
+    return db_pool.get()
+
+DELIVERY_MODES = ('scp', 'download', 'http')
+
+def resolve_delivery_mode(requested):
+    """
+    Returns the delivery mode for a request, falling back to Config.DELIVERY_MODE.
+    Returns None for an unknown mode.
+    """
+    mode = requested or app.config['DELIVERY_MODE']
+    return mode if mode in DELIVERY_MODES else None
+
+def download_endpoint(delivery: str, streaming_endpoint: str) -> str:
+    """
+    Endpoint the download links of a delivery mode point at: staged archives
+    for 'http', the streaming endpoint otherwise.
+    """
+    return 'download_archive' if delivery == 'http' else streaming_endpoint
+
+def build_archive(found_paths: list, progress=None, extra_members=None, delivery='scp') -> str:
+    """
+    Stages a zip of found_paths in STAGING_DIR and returns its name (None on failure).
+    progress: Optional callback(done, total) called as members are written.
+    extra_members: Optional {arcname: bytes} written alongside the files.
+    Raises Overloaded when no build slot frees up in time; an archive the zip
+    cache already holds is returned without taking one.
+    """
+    zip_filename = None
+    if zip_cache:
+        zip_filename = cached_archive(found_paths, app.config['STAGING_DIR'], zip_cache, extra_members,
+                                      count_miss=False)
+    if not zip_filename:
+        acquire_zip_slot()
+        try:
+            zip_filename = process_file_retrieval(
+                found_paths,
+                app.config['STAGING_DIR'],
+                cache=zip_cache,
+                policy=compression_policy,
+                executor=zip_executor,
+                parallel_min_bytes=app.config['ZIP_PARALLEL_MIN_BYTES'],
+                progress=progress,
+                extra_members=extra_members,
+                source_cache=hot_cache
+            )
+        finally:
+            zip_builds.release()
+    if zip_filename:
+        try:
+            ZIP_BYTES.inc(os.path.getsize(archive_path(app.config['STAGING_DIR'], zip_filename)), delivery=delivery)
+        except OSError:
+            pass
+    return zip_filename
+
+def lookup_surat(no_surat: str):
+    """
+    Returns (encrip, path) for a nomor surat, or None if there is no row.
+    Served from the lookup cache when possible. Raises on database errors.
+    """
+    if lookup_cache:
+        found, value = lookup_cache.get('no_surat', no_surat)
+        if found:
+            return tuple(value) if value else None
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        # Retrieve 'encrip' (filenames) and 'path' (directory)
+        cursor.execute("SELECT encrip, path FROM surat WHERE no_surat = %s LIMIT 1", (no_surat,))
+        result = cursor.fetchone()
+
+    if lookup_cache:
+        lookup_cache.set('no_surat', no_surat, list(result) if result else None)
+    return tuple(result) if result else None
+
+# SURAT_DIGEST_LOOKUP as resolved by digest_lookup_enabled(); None until checked
+digest_lookup = None
+
+def digest_lookup_enabled(cursor) -> bool:
+    """
+    Whether encrip keys are looked up by encrip_digest. With SURAT_DIGEST_LOOKUP
+    left at None the column is probed once per process.
+    """
+    global digest_lookup
+    if app.config['SURAT_DIGEST_LOOKUP'] is not None:
+        return app.config['SURAT_DIGEST_LOOKUP']
+    if digest_lookup is None:
+        try:
+            cursor.execute(DIGEST_COLUMN_PROBE_SQL)
+            cursor.fetchall()
+            digest_lookup = True
+        except Exception as e:
+            if not is_missing_column(e):
+                raise
+            logger.error("surat.encrip_digest does not exist, key lookups scan the encrip column; "
+                         "run 'python db_check.py migrate'")
+            digest_lookup = False
+    return digest_lookup
+
+def lookup_path_by_key(encrypted_key: str):
+    """
+    Returns the storage directory recorded for an encrypted key, or None.
+    """
+    if lookup_cache:
+        found, value = lookup_cache.get('encrip', encrypted_key)
+        if found:
+            return value
+
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            # Assuming encrypted_key passed in URL matches DB exactly.
+            if digest_lookup_enabled(cursor):
+                # Indexed digest narrows to one row; comparing encrip rules out collisions
+                cursor.execute(PATH_BY_DIGEST_SQL, (encrip_digest(encrypted_key), encrypted_key))
+            else:
+                cursor.execute(PATH_BY_ENCRIP_SQL, (encrypted_key,))
+            result = cursor.fetchone()
+    except Exception as e:
+        ERRORS.inc(cause='db_pool_timeout' if isinstance(e, PoolTimeout) else 'db')
+        logger.warning("Database lookup error: %s", e)
+        # Callers fall back to searching every SEARCH_PATHS entry
+        return None
+
+    path = result[0] if result else None
+    if lookup_cache:
+        lookup_cache.set('encrip', encrypted_key, path)
+    return path
+
+def lookup_surat_many(no_surats: list) -> dict:
+    """
+    Returns {no_surat: (encrip, path)} for the given numbers that have a row.
+    Cached numbers are answered from the lookup cache; the rest are fetched with
+    a single IN query. Raises on database errors.
+    """
+    rows = {}
+    pending = []
+    for no_surat in no_surats:
+        found, value = lookup_cache.get('no_surat', no_surat) if lookup_cache else (False, None)
+        if not found:
+            pending.append(no_surat)
+        elif value:
+            rows[no_surat] = tuple(value)
+
+    if pending:
+        placeholders = ', '.join(['%s'] * len(pending))
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT no_surat, encrip, path FROM surat WHERE no_surat IN ({placeholders})", pending)
+            fetched = cursor.fetchall()
+        for no_surat, encrip, path in fetched:
+            # Like lookup_surat's LIMIT 1, the first row wins for duplicate numbers
+            rows.setdefault(no_surat, (encrip, path))
+        if lookup_cache:
+            for no_surat in pending:
+                lookup_cache.set('no_surat', no_surat, list(rows[no_surat]) if no_surat in rows else None)
+    return rows
+
+def letter_folders(no_surats: list) -> dict:
+    """
+    Maps each nomor surat to a unique, filesystem-safe archive folder name.
+    """
+    folders = {}
+    used = set()
+    for i, no_surat in enumerate(no_surats, 1):
+        base = secure_filename(no_surat) or f"surat_{i}"
+        folder, n = base, 2
+        while folder in used:
+            folder, n = f"{base}_{n}", n + 1
+        used.add(folder)
+        folders[no_surat] = folder
+    return folders
+
+BATCH_MANIFEST_NAME = 'MANIFEST.json'
+
+def resolve_batch(no_surats: list, timer: StageTimer):
+    """
+    Resolves many surat with one query, one bulk decrypt and one pass over the roots.
+    Returns (members, manifest): members are (path, 'folder/filename') pairs, and
+    the manifest lists per surat what was found and what is missing.
+    """
+    with timer.stage('lookup'):
+        rows = lookup_surat_many(no_surats)
+
+    resolved = [no_surat for no_surat in no_surats if no_surat in rows]
+    with timer.stage('decrypt'):
+        filename_lists = decrypt_many([rows[no_surat][0] for no_surat in resolved], app.config['SECRET_KEY'])
+    decrypted = {no_surat: filenames for no_surat, filenames in zip(resolved, filename_lists) if filenames}
+
+    located = [no_surat for no_surat in resolved if no_surat in decrypted]
+    with timer.stage('find'):
+        found_lists = find_files_batch(
+            [(decrypted[no_surat], rows[no_surat][1]) for no_surat in located],
+            app.config['SEARCH_PATHS'],
+            index=path_index,
+            store=content_store
+        )
+    found = dict(zip(located, found_lists))
+
+    folders = letter_folders(no_surats)
+    members = []
+    manifest = {"requested": len(no_surats), "found": [], "missing": []}
+    for no_surat in no_surats:
+        if no_surat not in rows:
+            manifest["missing"].append({"nomor_surat": no_surat, "reason": "not_in_database"})
+            continue
+        if no_surat not in decrypted:
+            manifest["missing"].append({"nomor_surat": no_surat, "reason": "decrypt_failed"})
+            continue
+        found_members = [archive_member(entry) for entry in found[no_surat]]
+        present = {name for _, name in found_members}
+        missing_files = [entry_name(entry) for entry in decrypted[no_surat] if entry_name(entry) not in present]
+        if not found_members:
+            manifest["missing"].append({"nomor_surat": no_surat, "reason": "files_missing", "files": missing_files})
+            continue
+        folder = folders[no_surat]
+        members += [(path, f"{folder}/{name}") for path, name in found_members]
+        entry = {"nomor_surat": no_surat, "folder": folder, "files": sorted(present)}
+        if missing_files:
+            entry["missing_files"] = missing_files
+        manifest["found"].append(entry)
+    return members, manifest
+
+def manifest_member(manifest: dict) -> dict:
+    return {BATCH_MANIFEST_NAME: json.dumps(manifest, indent=2, ensure_ascii=False).encode()}
+
+def run_batch(no_surats: list, delivery: str, server_host: str, download_base: str, progress=None, timer=None):
+    """
+    The /search/batch pipeline: one archive with a folder per surat and a manifest.
+    Returns (response_dict, http_status).
+    """
+    progress = progress or (lambda *args: None)
+    timer = timer or StageTimer('search_batch', STAGE_SECONDS)
+
+    progress('lookup')
+    try:
+        members, manifest = resolve_batch(no_surats, timer)
+    except Exception as e:
+        cause = 'db_pool_timeout' if isinstance(e, PoolTimeout) else 'db'
+        ERRORS.inc(cause=cause)
+        logger.error("Database error: %s", e, extra={"cause": cause})
+        return {"error": "Database connection failed"}, 500
+
+    summary = {"found": manifest["found"], "missing": manifest["missing"]}
+    if not members:
+        ERRORS.inc(cause='not_found')
+        return dict(summary, error="None of the requested surat have files in storage"), 404
+
+    if delivery == 'download':
+        # The list stays in STAGING_DIR and the token only names it: a token carrying
+        # hundreds of numbers would exceed the server's request line limit
+        with timer.stage('encrypt'):
+            token = encrypt_data([save_batch_list(app.config['STAGING_DIR'], no_surats)], app.config['SECRET_KEY'])
+        return dict(summary, status="success", download_url=download_url(download_base, token)), 200
+
+    staging_dir = app.config['STAGING_DIR']
+    with timer.stage('zip'):
+        zip_filename = build_archive(members, progress=lambda done, total: progress('zip', done, total),
+                                     extra_members=manifest_member(manifest), delivery=delivery)
+    if not zip_filename:
+        ERRORS.inc(cause='zip')
+        return {"error": "System error: Failed to process files"}, 500
+
+    if delivery == 'http':
+        return dict(summary, status="success", download_url=archive_url(download_base, zip_filename)), 200
+    return dict(summary, status="success",
+                download_command=f"scp user@{server_host}:{staging_dir}/{zip_filename} ./"), 200
+
+def wants_job(flag) -> bool:
+    """
+    Interprets the 'async' request flag (JSON bool or query string).
+    """
+    if isinstance(flag, str):
+        return flag.lower() in ('1', 'true', 'yes')
+    return bool(flag)
+
+def queue_job(key: str, fn):
+    """
+    Queues fn(progress) as a background job and returns the 202 response.
+    """
+    job, _ = job_manager.submit(key, lambda job: fn(job.set_progress))
+    return jsonify({
+        "status": "queued",
+        "job_id": job.id,
+        "status_url": url_for('job_status', job_id=job.id, _external=True)
+    }), 202
+
+def download_url(download_base: str, encrypted_key: str) -> str:
+    return f"{download_base}?{urlencode({'key': encrypted_key})}"
+
+def archive_url(download_base: str, zip_filename: str) -> str:
+    """
+    Link to a staged archive on /archive; the token names the archive.
+    """
+    return download_url(download_base, encrypt_data([zip_filename], app.config['SECRET_KEY']))
+
+def run_search(query_input: str, delivery: str, server_host: str, download_base: str, progress=None, timer=None):
+    """
+    The /search pipeline: DB lookup, file search, then staged archive or download link.
+    Runs without a request context so it can also execute as a background job.
+    timer: StageTimer for the request; background jobs get their own.
+    Returns (response_dict, http_status).
+    """
+    progress = progress or (lambda *args: None)
+    timer = timer or StageTimer('search', STAGE_SECONDS)
     filenames = []
     target_path = None
+    encrypted_key = None
     
     # 1. Database Lookup (Get Encrypted List and Path)
+    progress('lookup')
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        # Retrieve 'encrip' (filenames) and 'path' (directory)
-        cursor.execute("SELECT encrip, path FROM surat WHERE no_surat = %s LIMIT 1", (query_input,))
-        result = cursor.fetchone()
-        conn.close()
+        with timer.stage('lookup'):
+            result = lookup_surat(query_input)
         
         if result:
             encrypted_key = result[0]
             db_path = result[1]
             
             # Decrypt to get the list of filenames
-            filenames = decrypt_data(encrypted_key, app.config['SECRET_KEY'])
+            with timer.stage('decrypt'):
+                filenames = decrypt_data(encrypted_key, app.config['SECRET_KEY'])
             if not filenames:
-                return jsonify({"error": "Failed to decrypt file data"}), 500
+                ERRORS.inc(cause='decrypt')
+                return {"error": "Failed to decrypt file data"}, 500
                 
             # Use the DB path as the target for search
             target_path = db_path
             
+        elif not is_plain_filename(query_input):
+            # The fallback below may only name a file directly inside a storage root
+            ERRORS.inc(cause='invalid_filename')
+            return {"error": "Invalid filename"}, 400
         else:
             # Fallback: maybe they entered a direct filename?
             filenames = [query_input]
@@ -63,104 +647,425 @@ def search_file():
             target_path = None
             
     except Exception as e:
-        print(f"Database error: {e}")
-        return jsonify({"error": "Database connection failed"}), 500
+        cause = 'db_pool_timeout' if isinstance(e, PoolTimeout) else 'db'
+        ERRORS.inc(cause=cause)
+        logger.error("Database error: %s", e, extra={"cause": cause})
+        return {"error": "Database connection failed"}, 500
 
     # 2. Find the files (Using specific DB path if available, else SEARCH_PATHS)
+    progress('locate')
     if target_path:
         search_paths = [target_path]
     else:
         search_paths = app.config['SEARCH_PATHS']
         
-    found_paths = find_files_in_paths(filenames, search_paths)
+    with timer.stage('find'):
+        found_paths = find_files_in_paths(filenames, search_paths, index=path_index, store=content_store)
     
     if not found_paths:
-        return jsonify({"error": "Files not found in storage"}), 404
+        ERRORS.inc(cause='not_found')
+        return {"error": "Files not found in storage"}, 404
+
+    if delivery == 'download':
+        # Direct filename lookups have no DB key, so issue one for the link
+        if not encrypted_key:
+            with timer.stage('encrypt'):
+                encrypted_key = encrypt_data(filenames, app.config['SECRET_KEY'])
+        return {
+            "status": "success",
+            "original_filenames": [entry_name(entry) for entry in filenames],
+            "download_url": download_url(download_base, encrypted_key)
+        }, 200
 
     # 3. Process (zip multiple files)
     staging_dir = app.config['STAGING_DIR']
-    zip_filename = process_file_retrieval(found_paths, staging_dir)
+    with timer.stage('zip'):
+        zip_filename = build_archive(found_paths, progress=lambda done, total: progress('zip', done, total),
+                                     delivery=delivery)
     
     if not zip_filename:
-        return jsonify({"error": "System error: Failed to process files"}), 500
+        ERRORS.inc(cause='zip')
+        return {"error": "System error: Failed to process files"}, 500
+
+    if delivery == 'http':
+        return {
+            "status": "success",
+            "original_filenames": [entry_name(entry) for entry in filenames],
+            "download_url": archive_url(download_base, zip_filename)
+        }, 200
 
     # 4. Generate SCP Command
-    server_host = request.host.split(':')[0]
     scp_command = f"scp user@{server_host}:{staging_dir}/{zip_filename} ./"
 
-    return jsonify({
+    return {
         "status": "success",
-        "original_filenames": filenames,
+        "original_filenames": [entry_name(entry) for entry in filenames],
         "download_command": scp_command
-    })
+    }, 200
+
+def run_retrieve(encrypted_key: str, filenames: list, delivery: str, server_host: str, download_base: str,
+                 progress=None, timer=None):
+    """
+    The /retrieve pipeline for an already decrypted key.
+    Returns (response_dict, http_status).
+    """
+    progress = progress or (lambda *args: None)
+    timer = timer or StageTimer('retrieve', STAGE_SECONDS)
+
+    # 2. Database Lookup to find the correct path for this key
+    progress('lookup')
+    with timer.stage('lookup'):
+        target_path = lookup_path_by_key(encrypted_key)
+
+    # 3. Find the files (Using specific DB path if found, else SEARCH_PATHS)
+    progress('locate')
+    if target_path:
+        search_paths = [target_path]
+    else:
+        search_paths = app.config['SEARCH_PATHS']
+        
+    with timer.stage('find'):
+        found_paths = find_files_in_paths(filenames, search_paths, index=path_index, store=content_store)
+    
+    if not found_paths:
+        ERRORS.inc(cause='not_found')
+        return {"error": "Files not found in any storage location"}, 404
+
+    if delivery == 'download':
+        return {
+            "res": 200,
+            "message": "Berhasil Decrypt!",
+            "data": [entry_name(entry) for entry in filenames],
+            "download_url": download_url(download_base, encrypted_key)
+        }, 200
+
+    # 4. Process the files (zip them)
+    staging_dir = app.config['STAGING_DIR']
+    with timer.stage('zip'):
+        zip_filename = build_archive(found_paths, progress=lambda done, total: progress('zip', done, total),
+                                     delivery=delivery)
+    
+    if not zip_filename:
+        ERRORS.inc(cause='zip')
+        return {"error": "Failed to process the files"}, 500
+
+    if delivery == 'http':
+        return {
+            "res": 200,
+            "message": "Berhasil Decrypt!",
+            "data": [entry_name(entry) for entry in filenames],
+            "download_url": archive_url(download_base, zip_filename)
+        }, 200
+
+    # 5. Generate the SCP command response
+    scp_command = f"scp user@{server_host}:{staging_dir}/{zip_filename} ./"
+
+    return {
+        "res": 200,
+        "message": "Berhasil Decrypt!",
+        "data": [entry_name(entry) for entry in filenames],
+        "scp_command": scp_command
+    }, 200
+
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+@app.route('/search', methods=['POST'])
+def search_file():
+    """
+    Endpoint to search for files via the web UI using 'nomor_surat'.
+    Input JSON: { "filename": "SK/...", "delivery": "scp|download", "async": false } (Nomor Surat)
+    With "async": true the search is queued and a job id is returned (HTTP 202).
+    """
+    data = request.get_json()
+    query_input = data.get('filename') # 'filename' key is used for Nomor Surat input
+    
+    if not query_input:
+        return jsonify({"error": "Nomor Surat is required"}), 400
+
+    delivery = resolve_delivery_mode(data.get('delivery'))
+    if not delivery:
+        return jsonify({"error": f"Unknown delivery mode, expected one of {list(DELIVERY_MODES)}"}), 400
+
+    server_host = request.host.split(':')[0]
+    download_base = url_for(download_endpoint(delivery, 'download_file'), _external=True)
+
+    if wants_job(data.get('async')):
+        return queue_job(
+            f"search:{delivery}:{server_host}:{query_input}",
+            lambda progress: run_search(query_input, delivery, server_host, download_base, progress)
+        )
+
+    payload, status = run_search(query_input, delivery, server_host, download_base, timer=request_timer('search'))
+    return jsonify(payload), status
+
+
+@app.route('/suggest', methods=['GET'])
+def suggest():
+    """
+    Search-as-you-type over nomor surat: prefix matches first, then close matches.
+    URL: /suggest?q=SK/2024/[&limit=10]
+    """
+    if suggest_index is None:
+        return jsonify({"error": "Suggestions are disabled"}), 404
+
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', app.config['SUGGEST_MAX_RESULTS'], type=int), app.config['SUGGEST_MAX_RESULTS'])
+    timer = request_timer('suggest')
+    with timer.stage('suggest'):
+        suggestions = suggest_index.suggest(query, limit)
+    return jsonify({"query": query, "suggestions": suggestions})
 
 
 @app.route('/retrieve', methods=['GET'])
 def retrieve_file():
     """
     Endpoint to retrieve files based on an encrypted key.
-    URL: /retrieve?key=<encrypted_key>
+    URL: /retrieve?key=<encrypted_key>[&delivery=scp|download][&async=1]
     """
     encrypted_key = request.args.get('key')
     
     if not encrypted_key:
         return jsonify({"error": "Missing 'key' parameter"}), 400
 
+    delivery = resolve_delivery_mode(request.args.get('delivery'))
+    if not delivery:
+        return jsonify({"error": f"Unknown delivery mode, expected one of {list(DELIVERY_MODES)}"}), 400
+
+    timer = request_timer('retrieve')
+
     # 1. Decrypt the key -> List of filenames
-    filenames = decrypt_data(encrypted_key, app.config['SECRET_KEY'])
+    with timer.stage('decrypt'):
+        filenames = decrypt_data(encrypted_key, app.config['SECRET_KEY'])
     
     if not filenames:
+        ERRORS.inc(cause='invalid_key')
         return jsonify({"error": "Invalid key or decryption failed"}), 400
 
-    target_path = None
-    
-    # 2. Database Lookup to find the correct path for this key
+    server_host = request.host.split(':')[0]
+    download_base = url_for(download_endpoint(delivery, 'download_file'), _external=True)
+
+    if wants_job(request.args.get('async')):
+        return queue_job(
+            f"retrieve:{delivery}:{server_host}:{encrypted_key}",
+            lambda progress: run_retrieve(encrypted_key, filenames, delivery, server_host, download_base, progress)
+        )
+
+    payload, status = run_retrieve(encrypted_key, filenames, delivery, server_host, download_base, timer=timer)
+    return jsonify(payload), status
+
+
+@app.route('/search/batch', methods=['POST'])
+def search_batch():
+    """
+    Retrieves many surat in one archive, one folder per surat plus MANIFEST.json.
+    Input JSON: { "nomor_surat": ["SK/...", ...], "delivery": "scp|download", "async": false }
+    """
+    data = request.get_json(silent=True) or {}
+    no_surats = data.get('nomor_surat')
+
+    if not isinstance(no_surats, list) or not no_surats or not all(isinstance(n, str) and n for n in no_surats):
+        return jsonify({"error": "nomor_surat must be a non-empty list of strings"}), 400
+    # Keep the request order, drop repeats
+    no_surats = list(dict.fromkeys(no_surats))
+    if len(no_surats) > app.config['BATCH_MAX_SURAT']:
+        return jsonify({"error": f"At most {app.config['BATCH_MAX_SURAT']} surat per batch"}), 400
+
+    delivery = resolve_delivery_mode(data.get('delivery'))
+    if not delivery:
+        return jsonify({"error": f"Unknown delivery mode, expected one of {list(DELIVERY_MODES)}"}), 400
+
+    server_host = request.host.split(':')[0]
+    download_base = url_for(download_endpoint(delivery, 'download_batch'), _external=True)
+
+    if wants_job(data.get('async')):
+        digest = hashlib.sha256(json.dumps(no_surats).encode()).hexdigest()
+        return queue_job(
+            f"batch:{delivery}:{server_host}:{digest}",
+            lambda progress: run_batch(no_surats, delivery, server_host, download_base, progress)
+        )
+
+    payload, status = run_batch(no_surats, delivery, server_host, download_base, timer=request_timer('search_batch'))
+    return jsonify(payload), status
+
+
+@app.route('/search/batch/download', methods=['GET'])
+def download_batch():
+    """
+    Streams a batch archive built on the fly.
+    URL: /search/batch/download?key=<token from /search/batch>
+    """
+    token = request.args.get('key')
+    if not token:
+        return jsonify({"error": "Missing 'key' parameter"}), 400
+
+    timer = request_timer('download_batch')
+    with timer.stage('decrypt'):
+        names = decrypt_data(token, app.config['SECRET_KEY'])
+    # Any other token we signed, e.g. a surat's encrip, is not a batch link
+    if not names or len(names) != 1 or not is_batch_list_name(names[0]):
+        ERRORS.inc(cause='invalid_key')
+        return jsonify({"error": "Invalid key or decryption failed"}), 400
+
+    no_surats = load_batch_list(app.config['STAGING_DIR'], names[0])
+    if no_surats is None:
+        ERRORS.inc(cause='archive_expired')
+        return jsonify({"error": "Batch link has expired, search again"}), 410
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        # Find the path associated with this encrypted key
-        # Assuming encrypted_key passed in URL matches DB exactly.
-        cursor.execute("SELECT path FROM surat WHERE encrip = %s LIMIT 1", (encrypted_key,))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            target_path = result[0]
-            
+        members, manifest = resolve_batch(no_surats, timer)
     except Exception as e:
-        print(f"Database lookup error: {e}")
-        # We can continue with fallback search or fail.
-        # Let's log it and try fallback.
-        pass
+        ERRORS.inc(cause='db_pool_timeout' if isinstance(e, PoolTimeout) else 'db')
+        logger.error("Database error: %s", e)
+        return jsonify({"error": "Database connection failed"}), 500
 
-    # 3. Find the files (Using specific DB path if found, else SEARCH_PATHS)
+    if not members:
+        ERRORS.inc(cause='not_found')
+        return jsonify({"error": "None of the requested surat have files in storage"}), 404
+
+    acquire_zip_slot()
+    release = zip_builds.releaser()
+    response = Response(
+        metered_stream(
+            stream_zip(members, chunk_size=app.config['STREAM_CHUNK_SIZE'], policy=compression_policy,
+                       extra_members=manifest_member(manifest)),
+            timer,
+            on_close=release
+        ),
+        mimetype='application/zip',
+        headers={"Content-Disposition": 'attachment; filename="secure_files_batch.zip"'}
+    )
+    # The slot is held until the stream is finished, or closed by the server if abandoned
+    response.call_on_close(release)
+    return response
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    Reports progress of a queued /search or /retrieve and, once done,
+    its result (scp command or download link).
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job id"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/download', methods=['GET'])
+def download_file():
+    """
+    Streams the files behind an encrypted key as a zip built on the fly.
+    URL: /download?key=<encrypted_key>
+    The Fernet key authorises the download; nothing is written to STAGING_DIR.
+    """
+    encrypted_key = request.args.get('key')
+
+    if not encrypted_key:
+        return jsonify({"error": "Missing 'key' parameter"}), 400
+
+    timer = request_timer('download')
+    with timer.stage('decrypt'):
+        filenames = decrypt_data(encrypted_key, app.config['SECRET_KEY'])
+
+    if not filenames:
+        ERRORS.inc(cause='invalid_key')
+        return jsonify({"error": "Invalid key or decryption failed"}), 400
+
+    with timer.stage('lookup'):
+        target_path = lookup_path_by_key(encrypted_key)
     if target_path:
         search_paths = [target_path]
     else:
         search_paths = app.config['SEARCH_PATHS']
-        
-    found_paths = find_files_in_paths(filenames, search_paths)
-    
+
+    with timer.stage('find'):
+        found_paths = find_files_in_paths(filenames, search_paths, index=path_index, store=content_store)
+
     if not found_paths:
+        ERRORS.inc(cause='not_found')
         return jsonify({"error": "Files not found in any storage location"}), 404
 
-    # 4. Process the files (zip them)
-    staging_dir = app.config['STAGING_DIR']
-    zip_filename = process_file_retrieval(found_paths, staging_dir)
-    
-    if not zip_filename:
-        return jsonify({"error": "Failed to process the files"}), 500
+    acquire_zip_slot()
+    release = zip_builds.releaser()
+    response = Response(
+        metered_stream(
+            stream_zip(found_paths, chunk_size=app.config['STREAM_CHUNK_SIZE'], policy=compression_policy),
+            timer,
+            on_close=release
+        ),
+        mimetype='application/zip',
+        headers={"Content-Disposition": 'attachment; filename="secure_files.zip"'}
+    )
+    response.call_on_close(release)
+    return response
 
-    # 5. Generate the SCP command response
-    server_host = request.host.split(':')[0] 
-    scp_command = f"scp user@{server_host}:{staging_dir}/{zip_filename} ./"
 
-    return jsonify({
-        "res": 200,
-        "message": "Berhasil Decrypt!",
-        "data": filenames,
-        "scp_command": scp_command
-    })
+def is_archive_name(name) -> bool:
+    parts = name.split('/') if isinstance(name, str) else []
+    return bool(parts) and parts[-1].startswith(ARCHIVE_PREFIX) and '..' not in parts
+
+@app.route('/archive', methods=['GET'])
+def download_archive():
+    """
+    Serves a staged archive with Range, ETag and If-Range support, so an
+    interrupted transfer resumes instead of rebuilding the zip.
+    URL: /archive?key=<token from an 'http' delivery>
+    """
+    token = request.args.get('key')
+    if not token:
+        return jsonify({"error": "Missing 'key' parameter"}), 400
+
+    names = decrypt_data(token, app.config['SECRET_KEY'])
+    # Only archive tokens name a staged zip; a surat key lists stored filenames
+    if not names or not is_archive_name(names[0]):
+        ERRORS.inc(cause='invalid_key')
+        return jsonify({"error": "Invalid key or decryption failed"}), 400
+
+    zip_filename = names[0]
+    path = archive_path(app.config['STAGING_DIR'], zip_filename)
+    if not os.path.isfile(path):
+        ERRORS.inc(cause='archive_expired')
+        return jsonify({"error": "Archive has expired, search again to rebuild it"}), 410
+
+    # Each (resumed) download counts as an access for the staging sweeper
+    touch(path)
+
+    accel_prefix = app.config['ARCHIVE_ACCEL_REDIRECT']
+    if accel_prefix:
+        # nginx sends the file itself, including ranges and conditional requests
+        ARCHIVE_RESPONSES.inc(status='accel')
+        return Response(mimetype='application/zip', headers={
+            "X-Accel-Redirect": f"{accel_prefix.rstrip('/')}/{zip_filename}",
+            "Content-Disposition": 'attachment; filename="secure_files.zip"'
+        })
+
+    # Staged archives never change, so the mtime/size ETag is stable for If-Range
+    response = send_file(path, mimetype='application/zip', as_attachment=True,
+                         download_name='secure_files.zip', conditional=True, etag=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    ARCHIVE_RESPONSES.inc(status=str(response.status_code))
+    return response
+
+
+def metered_stream(chunks, timer: StageTimer, on_close=None):
+    """
+    Passes chunks through, counting the bytes sent and timing the whole stream.
+    The stream outlives the request, so it is not part of Server-Timing.
+    on_close: Optional callback run once the stream ends.
+    """
+    started = time.perf_counter()
+    sent = 0
+    try:
+        for chunk in chunks:
+            sent += len(chunk)
+            yield chunk
+    finally:
+        ZIP_BYTES.inc(sent, delivery='download')
+        timer.record('stream', time.perf_counter() - started)
+        if on_close:
+            on_close()
 
 
 @app.route('/upload', methods=['POST'])
@@ -169,7 +1074,7 @@ def upload_file():
     Endpoint to upload multiple files.
     Form Data: 'file' (multiple), 'nomor_surat'
     Behavior:
-    1. Select ONE random directory.
+    1. Select ONE storage directory (placement strategy).
     2. Save ALL files there.
     3. Encrypt the LIST of filenames.
     4. Insert into DB (no_surat, path, encrip).
@@ -183,57 +1088,297 @@ def upload_file():
     if not files or not nomor_surat:
         return jsonify({"error": "No selected files or missing nomor_surat"}), 400
 
-    # 1. Select Random Directory
+    timer = request_timer('upload')
+
+    # 1. Select Storage Directory
     search_paths = app.config['SEARCH_PATHS']
     if not search_paths:
         return jsonify({"error": "No search paths configured"}), 500
         
-    target_dir = random.choice(search_paths)
+    with timer.stage('place'):
+        target_dir = placement.choose(search_paths)
+    if not target_dir:
+        ERRORS.inc(cause='no_space')
+        return jsonify({"error": "No storage volume is available with enough free space"}), 507
     saved_filenames = []
+    checksums = []
+    written_bytes = 0
     
     # 2. Save All Files
     try:
-        for file in files:
-            if file.filename == '':
-                continue
-            full_path = save_file_to_dir(file, target_dir)
-            saved_filenames.append(os.path.basename(full_path))
+        with timer.stage('save'):
+            for file in files:
+                if file.filename == '':
+                    continue
+                if app.config['STORAGE_MODE'] == 'cas':
+                    # Stored once per content; the name is kept in encrip only, unique
+                    # within the surat like the checksum rows keyed by it
+                    digest, size, _ = content_store.store(file.stream, target_dir)
+                    name = unique_name(secure_filename(file.filename) or 'file',
+                                       {entry_name(entry) for entry in saved_filenames})
+                    saved_filenames.append({"name": name, "sha256": digest})
+                else:
+                    # Names that sanitize alike, or match another surat's file, get a suffix
+                    full_path, digest, size = save_stream_to_dir(file.stream, file.filename, target_dir,
+                                                                 unique=True)
+                    saved_filenames.append(os.path.basename(full_path))
+                checksums.append((entry_name(saved_filenames[-1]), size, digest))
+                written_bytes += size
             
+        placement.record_write(target_dir, written_bytes)
+        UPLOAD_BYTES.inc(written_bytes, kind='form')
         if not saved_filenames:
             return jsonify({"error": "No valid files saved"}), 400
             
-    except Exception as e:
-        print(f"File save error: {e}")
+    except Exception:
+        release_saved(saved_filenames, target_dir)
+        ERRORS.inc(cause='file_save')
+        logger.exception("File save error", extra={"target_dir": target_dir})
         return jsonify({"error": "Failed to save files locally"}), 500
 
+    payload, status = record_upload(nomor_surat, target_dir, saved_filenames, checksums=checksums, timer=timer)
+    return jsonify(payload), status
+
+def release_saved(entries: list, target_dir: str):
+    """
+    Gives back the content store references taken for entries of a failed upload,
+    and deletes its plain files, which no surat row refers to.
+    """
+    for entry in entries:
+        if is_blob_entry(entry):
+            content_store.release(entry['sha256'], prefer=[target_dir])
+            continue
+        try:
+            os.remove(os.path.join(target_dir, entry))
+        except OSError:
+            continue
+        forget_path(entry, target_dir)
+
+def record_upload(nomor_surat: str, target_dir: str, saved_filenames: list, extra=None, timer=None, checksums=None,
+                  release_on_failure=True):
+    """
+    Encrypts the list of stored filenames (or content store entries) and inserts the surat row.
+    checksums: Optional [(filename, size, sha256)] kept in surat_file for the scrubber.
+    release_on_failure: give back content store references if the insert fails;
+    an upload session keeps them so the client can retry.
+    Returns (response_dict, http_status).
+    """
+    timer = timer or StageTimer('upload', STAGE_SECONDS)
+    if path_index:
+        for filename in saved_filenames:
+            if not is_blob_entry(filename):
+                path_index.add(filename, target_dir)
+
     # 3. Encrypt List of Filenames
-    encrypted_key = encrypt_data(saved_filenames, app.config['SECRET_KEY'])
+    with timer.stage('encrypt'):
+        encrypted_key = encrypt_data(saved_filenames, app.config['SECRET_KEY'])
     
     # 4. Insert into Database
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         # Store only the directory path
         directory_path = target_dir
         
-        sql = "INSERT INTO surat (no_surat, path, encrip) VALUES (%s, %s, %s)"
         val = (nomor_surat, directory_path, encrypted_key)
         
-        cursor.execute(sql, val)
-        conn.commit()
-        conn.close()
+        with timer.stage('db'), get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(SURAT_INSERT_SQL, val)
+            # Uploads keep working before 'db_check.py migrate' adds surat_file; other errors fail the insert
+            if checksums and not insert_checksums(cursor, checksum_rows(encrypted_key, checksums)):
+                ERRORS.inc(cause='checksum_insert')
+                logger.warning("Checksums not recorded, is the surat_file table missing?",
+                               extra={"nomor_surat": nomor_surat})
+            conn.commit()
+
+        if lookup_cache:
+            # Drop a cached "no such surat" so the new row is visible at once
+            lookup_cache.invalidate('no_surat', nomor_surat)
+            lookup_cache.invalidate('encrip', encrypted_key)
+        if suggest_index:
+            suggest_index.add(nomor_surat)
         
-        return jsonify({
+        payload = {
             "status": "success",
             "message": "Files uploaded and stored safely",
             "stored_path": directory_path,
-            "filenames": saved_filenames
-        })
+            "filenames": [entry_name(entry) for entry in saved_filenames]
+        }
+        payload.update(extra or {})
+        return payload, 200
         
     except Exception as e:
-        print(f"DB Insert Error: {e}")
-        return jsonify({"error": f"Database error during insertion: {str(e)}"}), 500
+        if release_on_failure:
+            release_saved(saved_filenames, target_dir)
+        ERRORS.inc(cause='db_insert')
+        logger.error("DB Insert Error: %s", e, extra={"nomor_surat": nomor_surat})
+        return {"error": f"Database error during insertion: {str(e)}"}, 500
+
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+@app.route('/upload/sessions', methods=['POST'])
+def create_upload_session():
+    """
+    Starts a resumable upload that streams straight into a storage root.
+    Input JSON: { "nomor_surat": "SK/...", "files": [{"name": "scan.pdf", "size": 123}] }
+    Each file is then sent with PUT /upload/sessions/<id>/files/<index>, in one
+    request or in chunks carrying a 'Content-Range: bytes start-end/total' header.
+    """
+    data = request.get_json(silent=True) or {}
+    nomor_surat = data.get('nomor_surat')
+    files = data.get('files')
+
+    if not nomor_surat or not files or not isinstance(files, list):
+        return jsonify({"error": "nomor_surat and a non-empty files list are required"}), 400
+
+    search_paths = app.config['SEARCH_PATHS']
+    if not search_paths:
+        return jsonify({"error": "No search paths configured"}), 500
+
+    timer = request_timer('upload_session')
+    with timer.stage('place'):
+        target_dir = placement.choose(search_paths)
+    if not target_dir:
+        ERRORS.inc(cause='no_space')
+        return jsonify({"error": "No storage volume is available with enough free space"}), 507
+    try:
+        session = upload_sessions.create(nomor_surat, target_dir, files)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except OSError:
+        ERRORS.inc(cause='upload_session')
+        logger.exception("Upload session error", extra={"target_dir": target_dir})
+        return jsonify({"error": "Failed to prepare storage for upload"}), 500
+
+    payload = session.to_dict()
+    for entry in payload['files']:
+        entry['upload_url'] = url_for('upload_session_chunk', session_id=session.id,
+                                      index=entry['index'], _external=True)
+    return jsonify(payload), 201
+
+@app.route('/upload/sessions/<session_id>', methods=['GET'])
+def upload_session_status(session_id):
+    """
+    Bytes received per file, so an interrupted client knows where to resume.
+    """
+    session = upload_sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown or expired upload session"}), 404
+    return jsonify(session.to_dict())
+
+@app.route('/upload/sessions/<session_id>/files/<int:index>', methods=['PUT'])
+def upload_session_chunk(session_id, index):
+    """
+    Streams the request body into the file's part file without spooling it first.
+    """
+    session = upload_sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown or expired upload session"}), 404
+
+    start, total, length = 0, None, None
+    content_range = request.headers.get('Content-Range')
+    if content_range:
+        match = CONTENT_RANGE_RE.match(content_range.strip())
+        if not match:
+            return jsonify({"error": "Malformed Content-Range header"}), 400
+        start, end = int(match.group(1)), int(match.group(2))
+        if end < start:
+            return jsonify({"error": "Malformed Content-Range header"}), 400
+        length = end - start + 1
+        total = None if match.group(3) == '*' else int(match.group(3))
+
+    timer = request_timer('upload_chunk')
+    try:
+        with timer.stage('write'):
+            upload = upload_sessions.write_chunk(session, index, request.stream, start, total, length)
+    except UploadConflict as e:
+        return jsonify({"error": str(e), "received": e.received}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except OSError:
+        ERRORS.inc(cause='upload_chunk')
+        logger.exception("Upload chunk error", extra={"session_id": session_id, "index": index})
+        return jsonify({"error": "Failed to store chunk"}), 500
+
+    UPLOAD_BYTES.inc(upload.received - start, kind='session')
+    return jsonify(upload.to_dict(index))
+
+@app.route('/upload/sessions/<session_id>/complete', methods=['POST'])
+def complete_upload_session(session_id):
+    """
+    Moves every fully received file into place and records the surat row.
+    The session is closed only once the row is committed; after a failure the
+    same request can be retried.
+    """
+    session = upload_sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown or expired upload session"}), 404
+
+    timer = request_timer('upload_complete')
+    # Held until the row is saved, so concurrent completions cannot insert it twice
+    with session.lock:
+        if session.closed:
+            return jsonify({"error": "Unknown or expired upload session"}), 404
+        try:
+            with timer.stage('finalize'):
+                stored = upload_sessions.finalize(
+                    session, store=content_store if app.config['STORAGE_MODE'] == 'cas' else None)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 409
+        except OSError:
+            ERRORS.inc(cause='upload_finalize')
+            logger.exception("Upload finalize error", extra={"session_id": session_id})
+            return jsonify({"error": "Failed to move uploaded files into place"}), 500
+
+        if session.store is not None:
+            entries = [{"name": entry['name'], "sha256": entry['sha256']} for entry in stored]
+        else:
+            entries = [entry['name'] for entry in stored]
+        payload, status = record_upload(
+            session.nomor_surat,
+            session.target_dir,
+            entries,
+            extra={"checksums": {entry['name']: entry['sha256'] for entry in stored}},
+            timer=timer,
+            checksums=[(entry['name'], entry['size'], entry['sha256']) for entry in stored],
+            release_on_failure=False
+        )
+        if status == 200:
+            upload_sessions.close(session)
+            placement.record_write(session.target_dir, sum(entry['size'] for entry in stored))
+    return jsonify(payload), status
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """
+    Runtime counters for operators.
+    """
+    return jsonify({
+        "db_pool": db_pool.stats(),
+        "zip_cache": zip_cache.stats() if zip_cache else None,
+        "hot_cache": hot_cache.stats() if hot_cache else None,
+        "path_index": path_index.stats() if path_index else None,
+        "suggest_index": suggest_index.stats() if suggest_index else None,
+        "jobs": job_manager.stats(),
+        "upload_sessions": upload_sessions.stats(),
+        "placement": placement.stats(),
+        "lookup_cache": lookup_cache.stats() if lookup_cache else None,
+        "staging": staging_manager.stats() if staging_manager else None,
+        "admission": {
+            "rate_limiter": rate_limiter.stats() if rate_limiter else None,
+            "zip_builds": zip_builds.stats(),
+            "upload_budget": upload_budget.stats()
+        },
+        "cas": content_store.stats() if app.config['STORAGE_MODE'] == 'cas' else None
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus text exposition of this process's metrics.
+    """
+    return Response(metrics_registry.render(), content_type=CONTENT_TYPE)
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Development server only; production runs wsgi:app under gunicorn (see gunicorn.conf.py)
+    app.run(host='0.0.0.0', port=5000, debug=app.config['DEBUG'])
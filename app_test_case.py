@@ -0,0 +1,85 @@
+"""
+Base TestCase for tests that drive the Flask app against a SQLite surat table.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from cryptography.fernet import Fernet
+
+import app as app_module
+from app import app
+from db import ConnectionPool, SURAT_INSERT_SQL
+from fake_db import create_database
+from utils import encrypt_data
+
+
+class AppTestCase(unittest.TestCase):
+    """
+    Gives each test a temporary directory, a fresh SECRET_KEY, STAGING_DIR and
+    database, and a test client. app.config and the app singletons named in
+    `swapped` are restored afterwards, so tests may change them freely.
+    """
+
+    # app module attributes saved before and restored after every test
+    swapped = ('db_pool', 'lookup_cache')
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.test_dir)
+
+        original_config = dict(app.config)
+        self.addCleanup(self._restore_config, original_config)
+        original_singletons = {name: getattr(app_module, name) for name in self.swapped}
+        self.addCleanup(self._restore_singletons, original_singletons)
+
+        self.key = Fernet.generate_key().decode()
+        self.staging_dir = os.path.join(self.test_dir, 'staging')
+        app.config['SECRET_KEY'] = self.key
+        app.config['STAGING_DIR'] = self.staging_dir
+
+        self.connect = create_database(os.path.join(self.test_dir, 'surat.sqlite'))
+        app_module.db_pool = ConnectionPool(self.connect, size=2)
+        self.addCleanup(lambda: app_module.db_pool.close_all())
+        # Tests reuse the same numbers with fresh rows
+        app_module.lookup_cache = None
+        self.client = app.test_client()
+
+    @staticmethod
+    def _restore_config(original: dict):
+        app.config.clear()
+        app.config.update(original)
+
+    @staticmethod
+    def _restore_singletons(original: dict):
+        for name, value in original.items():
+            setattr(app_module, name, value)
+
+    def make_roots(self, *names) -> list:
+        """
+        Creates <test_dir>/<name>/surat for each name and makes them SEARCH_PATHS.
+        """
+        roots = [os.path.join(self.test_dir, name, 'surat') for name in names]
+        for root in roots:
+            os.makedirs(root)
+        app.config['SEARCH_PATHS'] = roots
+        return roots
+
+    def write_files(self, root: str, files: dict):
+        for name, content in files.items():
+            with open(os.path.join(root, name), 'wb') as f:
+                f.write(content)
+
+    def insert_surat(self, no_surat: str, root: str, filenames: list) -> str:
+        """
+        Inserts a surat row and returns its encrypted key.
+        """
+        encrypted_key = encrypt_data(filenames, self.key)
+        conn = self.connect()
+        try:
+            conn.cursor().execute(SURAT_INSERT_SQL, (no_surat, root, encrypted_key))
+            conn.commit()
+        finally:
+            conn.close()
+        return encrypted_key
@@ -0,0 +1,96 @@
+"""
+Compares archive build time and size for each compression policy on a mixed corpus.
+
+    python bench_compression.py --files 40 --size-kb 2048 --repeat 3
+
+The corpus mimics typical surat attachments: incompressible PDF/JPEG/TIFF scans,
+compressible text exports, and incompressible files with unknown extensions
+(caught only by the sample test).
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from config import Config
+from utils import CompressionPolicy, process_file_retrieval
+
+WORDS = b"surat keputusan nomor tanggal perihal lampiran kepala dinas tembusan arsip".split()
+
+
+def make_corpus(root: str, files: int, size: int) -> list:
+    rng = random.Random(42)
+    kinds = [
+        ('.pdf', 'random'),
+        ('.jpg', 'random'),
+        ('.tif', 'random'),
+        ('.txt', 'text'),
+        ('.csv', 'text'),
+        ('.bin', 'random'),
+    ]
+    paths = []
+    for i in range(files):
+        ext, kind = kinds[i % len(kinds)]
+        path = os.path.join(root, f"doc_{i:04d}{ext}")
+        with open(path, 'wb') as f:
+            if kind == 'random':
+                f.write(os.urandom(size))
+            else:
+                written = 0
+                while written < size:
+                    line = b" ".join(rng.choice(WORDS) for _ in range(12)) + b"\n"
+                    f.write(line)
+                    written += len(line)
+        paths.append(path)
+    return paths
+
+
+def run(paths: list, staging_dir: str, policy, repeat: int):
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        zip_filename = process_file_retrieval(paths, staging_dir, policy=policy)
+        timings.append(time.perf_counter() - start)
+        zip_path = os.path.join(staging_dir, zip_filename)
+        size = os.path.getsize(zip_path)
+        os.remove(zip_path)
+    return min(timings), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=30, help="number of files in the corpus")
+    parser.add_argument('--size-kb', type=int, default=1024, help="size of each file in KiB")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per policy, best time is reported")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_zip_')
+    try:
+        corpus_dir = os.path.join(work_dir, 'corpus')
+        staging_dir = os.path.join(work_dir, 'staging')
+        os.makedirs(corpus_dir)
+        paths = make_corpus(corpus_dir, args.files, args.size_kb * 1024)
+        raw_bytes = sum(os.path.getsize(p) for p in paths)
+
+        print(f"Corpus: {len(paths)} files, {raw_bytes / 1024 ** 2:.1f} MiB")
+        print(f"{'policy':<10} {'time (s)':>10} {'MiB/s':>10} {'size (MiB)':>12} {'ratio':>8}")
+        for mode in CompressionPolicy.MODES:
+            policy = CompressionPolicy(
+                mode=mode,
+                level=Config.ZIP_COMPRESSLEVEL,
+                store_extensions=Config.ZIP_STORE_EXTENSIONS,
+                sample_bytes=Config.ZIP_SAMPLE_BYTES,
+                min_saving=Config.ZIP_MIN_SAVING
+            )
+            elapsed, size = run(paths, staging_dir, policy, args.repeat)
+            print(f"{mode:<10} {elapsed:>10.3f} {raw_bytes / 1024 ** 2 / elapsed:>10.1f} "
+                  f"{size / 1024 ** 2:>12.2f} {size / raw_bytes:>8.3f}")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
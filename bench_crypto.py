@@ -0,0 +1,66 @@
+"""
+Microbenchmark for Fernet handling of 'encrip' values.
+
+    python bench_crypto.py --calls 5000 --bulk 50000 --workers 4
+
+Compares building a Fernet per call (the old decrypt_data behaviour) with the
+cached cipher, then measures bulk decrypt/encrypt throughput sequentially and
+on a process pool.
+"""
+import argparse
+import os
+import time
+
+from cryptography.fernet import Fernet
+
+from utils import _decrypt_with, decrypt_data, decrypt_many, encrypt_many, get_fernet
+
+
+def per_call_uncached(tokens: list, secret_key: str):
+    for token in tokens:
+        _decrypt_with(Fernet(secret_key.strip()), token)
+
+
+def per_call_cached(tokens: list, secret_key: str):
+    for token in tokens:
+        decrypt_data(token, secret_key)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def report(label: str, count: int, elapsed: float):
+    print(f"{label:<34} {count:>8} ops {elapsed:>8.3f} s {count / elapsed:>12,.0f} ops/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=5000, help="tokens for the per-call comparison")
+    parser.add_argument('--bulk', type=int, default=50000, help="tokens for the bulk comparison")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="processes for parallel bulk runs")
+    args = parser.parse_args()
+
+    secret_key = Fernet.generate_key().decode()
+    f = get_fernet(secret_key)
+    filenames = [f"lampiran_{i:03d}.pdf" for i in range(5)]
+
+    tokens = [f.encrypt(str(filenames).encode()).decode() for _ in range(args.calls)]
+    report("per-call, new Fernet each time", args.calls, timed(per_call_uncached, tokens, secret_key))
+    report("per-call, cached Fernet", args.calls, timed(per_call_cached, tokens, secret_key))
+
+    items = [filenames] * args.bulk
+    start = time.perf_counter()
+    bulk_tokens = encrypt_many(items, secret_key)
+    report("encrypt_many, 1 process", args.bulk, time.perf_counter() - start)
+    report(f"encrypt_many, {args.workers} processes", args.bulk,
+           timed(encrypt_many, items, secret_key, args.workers))
+    report("decrypt_many, 1 process", args.bulk, timed(decrypt_many, bulk_tokens, secret_key))
+    report(f"decrypt_many, {args.workers} processes", args.bulk,
+           timed(decrypt_many, bulk_tokens, secret_key, args.workers))
+
+
+if __name__ == '__main__':
+    main()
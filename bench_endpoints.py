@@ -0,0 +1,250 @@
+"""
+Load test for /search, /retrieve and /upload against a generated corpus.
+
+    python bench_endpoints.py --requests 300 --concurrency 8
+    python bench_endpoints.py --endpoints search,retrieve --delivery download --json result.json
+
+Runs offline: the app is driven through Flask's test client, MySQL is replaced
+by the SQLite stand-in in fake_db.py, and a reproducible corpus (--seed) is
+written across several fake SEARCH_PATHS roots in a temporary directory.
+Per-stage latencies come from the Server-Timing header, so the report shows
+where time goes (lookup, decrypt, find, zip, save, ...) next to the latency
+the client saw. Compare the --json output of two runs to catch regressions.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography.fernet import Fernet
+
+from config import Config
+from db import ConnectionPool, SURAT_INSERT_SQL
+from fake_db import create_database
+
+ENDPOINTS = ('search', 'retrieve', 'upload')
+PERCENTILES = (50, 95, 99)
+
+
+def configure(workdir: str, roots: list, args):
+    """
+    Points Config at the benchmark sandbox. Must run before app is imported,
+    because app builds its singletons from Config at import time.
+    """
+    Config.SEARCH_PATHS = roots
+    Config.STAGING_DIR = os.path.join(workdir, 'staging')
+    Config.SECRET_KEY = Fernet.generate_key().decode()
+    Config.SERVER_TIMING_ENABLED = True
+    Config.LOG_LEVEL = 'WARNING'
+    Config.ZIP_CACHE_ENABLED = not args.no_zip_cache
+    Config.LOOKUP_CACHE_ENABLED = not args.no_lookup_cache
+    # The suggest index loader thread would add background database load to the timings
+    Config.SUGGEST_ENABLED = False
+    # Temporary directories can sit on small filesystems
+    Config.PLACEMENT_MIN_FREE_BYTES = 0
+    Config.PLACEMENT_MIN_FREE_RATIO = 0
+
+
+def file_content(rng: random.Random, extension: str, size: int) -> bytes:
+    # Scans are incompressible, text attachments compress well
+    if extension == '.pdf':
+        return rng.randbytes(size)
+    line = f"Surat keputusan nomor {rng.randint(1, 10 ** 6)} tentang penetapan anggaran.\n".encode()
+    return (line * (size // len(line) + 1))[:size]
+
+
+def generate_corpus(rng: random.Random, roots: list, surat_count: int, files_per_surat: int, file_size: int,
+                    connect) -> list:
+    """
+    Writes the corpus files and surat rows. Returns [(no_surat, encrip)].
+    """
+    from utils import encrypt_many
+
+    entries = []
+    for i in range(surat_count):
+        root = roots[i % len(roots)]
+        names = []
+        for j in range(files_per_surat):
+            extension = '.pdf' if j % 2 == 0 else '.txt'
+            name = f"surat_{i:05d}_{j}{extension}"
+            with open(os.path.join(root, name), 'wb') as f:
+                f.write(file_content(rng, extension, file_size))
+            names.append(name)
+        entries.append((f"BENCH/{i:05d}/{rng.randint(1000, 9999)}", root, names))
+
+    keys = encrypt_many([names for _, _, names in entries], Config.SECRET_KEY)
+    rows = [(no_surat, root, key) for (no_surat, root, _), key in zip(entries, keys)]
+    conn = connect()
+    try:
+        conn.cursor().executemany(SURAT_INSERT_SQL, rows)
+        conn.commit()
+    finally:
+        conn.close()
+    return [(no_surat, key) for no_surat, _, key in rows]
+
+
+def parse_server_timing(header) -> dict:
+    """
+    'lookup;dur=1.2, zip;dur=30.5' -> {'lookup': 1.2, 'zip': 30.5}
+    """
+    stages = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if params.startswith('dur='):
+            stages[name] = stages.get(name, 0.0) + float(params[4:])
+    return stages
+
+
+def percentile(values: list, p: float) -> float:
+    # Nearest-rank percentile over sorted values
+    if not values:
+        return float('nan')
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def summarize(name: str, results: list, wall_seconds: float, concurrency: int) -> dict:
+    statuses = {}
+    samples = {'request': []}
+    for status, elapsed_ms, stages in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        samples['request'].append(elapsed_ms)
+        for stage, duration in stages.items():
+            samples.setdefault(stage, []).append(duration)
+
+    stages = {}
+    for stage, values in samples.items():
+        values.sort()
+        stages[stage] = {f"p{p}": round(percentile(values, p), 3) for p in PERCENTILES}
+        stages[stage]['max'] = round(values[-1], 3)
+        stages[stage]['count'] = len(values)
+    return {
+        "endpoint": name,
+        "requests": len(results),
+        "concurrency": concurrency,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput": round(len(results) / wall_seconds, 2) if wall_seconds else None,
+        "statuses": statuses,
+        "stages_ms": stages
+    }
+
+
+def run_load(flask_app, name: str, make_request, count: int, concurrency: int, warmup: int) -> dict:
+    """
+    Sends count requests from concurrency threads, each with its own test client.
+    """
+    local = threading.local()
+
+    def one(i):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = flask_app.test_client()
+        started = time.perf_counter()
+        response = make_request(client, i)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        return response.status_code, elapsed_ms, parse_server_timing(response.headers.get('Server-Timing'))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(-warmup, 0)))
+        started = time.perf_counter()
+        results = list(pool.map(one, range(count)))
+        wall_seconds = time.perf_counter() - started
+    return summarize(name, results, wall_seconds, concurrency)
+
+
+def print_report(report: dict):
+    print(f"\n{report['endpoint']}: {report['requests']} requests, concurrency {report['concurrency']}, "
+          f"{report['throughput']} req/s, statuses {report['statuses']}")
+    print(f"  {'stage':<10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'count':>6}")
+    # Client-observed latency first, then server stages in pipeline order
+    for stage, row in report['stages_ms'].items():
+        print(f"  {stage:<10} {row['p50']:>9.2f} {row['p95']:>9.2f} {row['p99']:>9.2f} {row['max']:>9.2f} "
+              f"{row['count']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help="comma separated subset of search,retrieve,upload")
+    parser.add_argument('--requests', type=int, default=200, help="measured requests per endpoint")
+    parser.add_argument('--warmup', type=int, default=20, help="unmeasured requests per endpoint")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--roots', type=int, default=3, help="fake storage roots")
+    parser.add_argument('--surat', type=int, default=200, help="surat rows in the corpus")
+    parser.add_argument('--files', type=int, default=3, help="files per surat")
+    parser.add_argument('--file-size', type=int, default=256 * 1024, help="bytes per corpus and upload file")
+    parser.add_argument('--delivery', choices=['scp', 'download'], default='scp')
+    parser.add_argument('--no-zip-cache', action='store_true', help="build every archive from scratch")
+    parser.add_argument('--no-lookup-cache', action='store_true', help="send every lookup to the database")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="also write the report to this file")
+    parser.add_argument('--keep', action='store_true', help="keep the generated sandbox directory")
+    args = parser.parse_args()
+
+    endpoints = [name.strip() for name in args.endpoints.split(',') if name.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix='filedo_bench_')
+    roots = [os.path.join(workdir, f'files{i + 1}', 'surat') for i in range(args.roots)]
+    for root in roots:
+        os.makedirs(root)
+
+    try:
+        configure(workdir, roots, args)
+        connect = create_database(os.path.join(workdir, 'surat.sqlite'))
+        started = time.perf_counter()
+        corpus = generate_corpus(rng, roots, args.surat, args.files, args.file_size, connect)
+        print(f"Corpus: {args.surat} surat x {args.files} files of {args.file_size} bytes across {args.roots} roots "
+              f"in {workdir} ({time.perf_counter() - started:.1f}s)")
+
+        # Imported late so its singletons pick up the sandbox Config
+        import app as app_module
+        app_module.db_pool = ConnectionPool(connect, size=Config.MYSQL_POOL_SIZE, timeout=Config.MYSQL_POOL_TIMEOUT)
+
+        upload_payload = [file_content(rng, '.pdf' if j % 2 == 0 else '.txt', args.file_size) for j in range(args.files)]
+
+        def search(client, i):
+            no_surat = corpus[i % len(corpus)][0]
+            return client.post('/search', json={"filename": no_surat, "delivery": args.delivery})
+
+        def retrieve(client, i):
+            key = corpus[i % len(corpus)][1]
+            return client.get('/retrieve', query_string={"key": key, "delivery": args.delivery})
+
+        def upload(client, i):
+            files = [(io.BytesIO(content), f"upload_{i}_{j}{'.pdf' if j % 2 == 0 else '.txt'}")
+                     for j, content in enumerate(upload_payload)]
+            return client.post('/upload', data={"nomor_surat": f"BENCH/UPLOAD/{i}", "file": files},
+                               content_type='multipart/form-data')
+
+        requests = {'search': search, 'retrieve': retrieve, 'upload': upload}
+        reports = []
+        for name in endpoints:
+            report = run_load(app_module.app, name, requests[name], args.requests, args.concurrency, args.warmup)
+            print_report(report)
+            reports.append(report)
+
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump({"args": vars(args), "reports": reports}, f, indent=2)
+    finally:
+        if args.keep:
+            print(f"\nSandbox kept at {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    failed = sum(count for report in reports for status, count in report['statuses'].items() if int(status) >= 500)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
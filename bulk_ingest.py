@@ -0,0 +1,261 @@
+"""
+Bulk ingest of many surat from a manifest, for nightly migrations of scanned letters.
+
+    python bulk_ingest.py manifest.jsonl --workers 8 --batch-size 500 --report report.jsonl
+    python bulk_ingest.py manifest.jsonl --resume    # skip surat already in the database
+
+Each manifest line is a JSON object:
+    {"nomor_surat": "SK-001/PLZ/I/2026", "files": ["/scans/SK-001_a.pdf", "/scans/SK-001_b.pdf"]}
+
+Files of every surat are copied in parallel into one storage root chosen by the
+placement engine. A file never replaces one already in the root: when two
+surat have a file of the same name, the later copy gets a numeric suffix
+(scan.pdf, scan_1.pdf, ...). Rows are inserted with executemany in batched
+transactions; a failing batch is retried row by row so one bad item does not
+abort the others, and a failed item's copies are removed again. One report
+line is written per item.
+
+With --resume, items whose nomor_surat already has a surat row are reported
+as 'skipped' without copying anything, so an interrupted run can simply be
+started again on the same manifest.
+"""
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import mysql.connector
+
+from config import Config
+from db import SURAT_INSERT_SQL, checksum_rows, insert_checksums
+from placement import PlacementEngine
+from utils import encrypt_data, save_stream_to_dir
+
+EXISTING_SQL = "SELECT no_surat FROM surat WHERE no_surat IN ({})"
+
+
+def read_manifest(path: str):
+    """
+    Yields (line_number, item, error) for every non-empty manifest line.
+    """
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(item, dict) or not item.get('nomor_surat') or not item.get('files'):
+                yield line_number, None, "Expected nomor_surat and a non-empty files list"
+                continue
+            yield line_number, item, None
+
+
+def store_item(item: dict, placement: PlacementEngine, roots: list, secret_key: str) -> dict:
+    """
+    Copies the item's files into one storage root and prepares its surat row.
+    """
+    target_dir = placement.choose(roots)
+    if not target_dir:
+        return {"status": "error", "error": "No storage volume is available with enough free space"}
+
+    saved = []
+    checksums = []
+    written_bytes = 0
+    try:
+        for source in item['files']:
+            with open(source, 'rb') as src:
+                full_path, digest, size = save_stream_to_dir(src, os.path.basename(source), target_dir,
+                                                             unique=True)
+            saved.append(full_path)
+            checksums.append((os.path.basename(full_path), size, digest))
+            written_bytes += size
+    except OSError as e:
+        remove_files(saved)
+        return {"status": "error", "error": f"File copy failed: {e}"}
+    placement.record_write(target_dir, written_bytes)
+
+    filenames = [os.path.basename(path) for path in saved]
+    encrypted_key = encrypt_data(filenames, secret_key)
+    if not encrypted_key:
+        remove_files(saved)
+        return {"status": "error", "error": "Encryption failed"}
+
+    return {
+        "status": "stored",
+        "row": (item['nomor_surat'], target_dir, encrypted_key),
+        "stored_path": target_dir,
+        "filenames": filenames,
+        "checksums": checksums,
+        "saved": saved
+    }
+
+
+def remove_files(paths: list):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def insert_batch(conn, batch: list):
+    """
+    Inserts a batch of stored items in one transaction.
+    If the batch fails, rows are retried one by one and failures are marked per item.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.executemany(SURAT_INSERT_SQL, [result['row'] for result in batch])
+        record_checksums(cursor, batch)
+        conn.commit()
+        for result in batch:
+            result['status'] = 'ok'
+        return
+    except Exception as e:
+        conn.rollback()
+        print(f"Batch insert failed, retrying rows individually: {e}", file=sys.stderr)
+
+    for result in batch:
+        try:
+            cursor.execute(SURAT_INSERT_SQL, result['row'])
+            record_checksums(cursor, [result])
+            conn.commit()
+            result['status'] = 'ok'
+        except Exception as e:
+            conn.rollback()
+            remove_files(result['saved'])
+            result['status'] = 'error'
+            result['error'] = f"Database insert failed: {e}"
+
+
+def record_checksums(cursor, batch: list):
+    rows = [row for result in batch for row in checksum_rows(result['row'][2], result['checksums'])]
+    if not insert_checksums(cursor, rows):
+        print("Checksums not recorded, run 'python db_check.py migrate' to create surat_file", file=sys.stderr)
+
+
+def write_report(report, line_number: int, nomor_surat, result: dict):
+    entry = {"line": line_number, "nomor_surat": nomor_surat, "status": result['status']}
+    if result['status'] == 'ok':
+        entry["stored_path"] = result['stored_path']
+        entry["filenames"] = result['filenames']
+    elif result['status'] == 'error':
+        entry["error"] = result.get('error')
+    report.write(json.dumps(entry) + "\n")
+
+
+def existing_surat(cursor, numbers: list) -> set:
+    """
+    Returns the nomor surat among numbers that already have a surat row.
+    """
+    if not numbers:
+        return set()
+    cursor.execute(EXISTING_SQL.format(', '.join(['%s'] * len(numbers))), tuple(numbers))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def ingest(manifest: str, report, conn, placement: PlacementEngine, roots: list, secret_key: str,
+           workers: int = 8, batch_size: int = 500, resume: bool = False) -> dict:
+    """
+    Ingests every manifest item and writes one report line per item.
+    At most 2 * workers items are copied or waiting for their turn at once.
+    Returns the totals per status.
+    """
+    totals = {"ok": 0, "error": 0, "skipped": 0}
+    pending = []
+
+    def flush():
+        if pending:
+            insert_batch(conn, [result for _, _, result in pending])
+        for line_number, nomor_surat, result in pending:
+            totals[result['status']] += 1
+            write_report(report, line_number, nomor_surat, result)
+        pending.clear()
+
+    def run(entry, skip):
+        line_number, item, error = entry
+        if error:
+            return line_number, None, {"status": "error", "error": error}
+        if skip:
+            return line_number, item['nomor_surat'], {"status": "skipped"}
+        try:
+            return line_number, item['nomor_surat'], store_item(item, placement, roots, secret_key)
+        except Exception as e:
+            return line_number, item['nomor_surat'], {"status": "error", "error": str(e)}
+
+    def collect(future):
+        line_number, nomor_surat, result = future.result()
+        if result['status'] == 'stored':
+            pending.append((line_number, nomor_surat, result))
+            if len(pending) >= batch_size:
+                flush()
+        else:
+            totals[result['status']] += 1
+            write_report(report, line_number, nomor_surat, result)
+
+    entries = read_manifest(manifest)
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            chunk = list(islice(entries, batch_size))
+            if not chunk:
+                break
+            numbers = [item['nomor_surat'] for _, item, _ in chunk if item]
+            done = existing_surat(conn.cursor(), numbers) if resume else set()
+            for entry in chunk:
+                item = entry[1]
+                in_flight.append(pool.submit(run, entry, item is not None and item['nomor_surat'] in done))
+                # Results are collected in manifest order; a bounded window keeps
+                # the whole manifest from being queued in memory at once
+                while len(in_flight) >= 2 * workers:
+                    collect(in_flight.popleft())
+        while in_flight:
+            collect(in_flight.popleft())
+    flush()
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('manifest', help="JSON lines manifest of surat to ingest")
+    parser.add_argument('--workers', type=int, default=8, help="parallel file copies")
+    parser.add_argument('--batch-size', type=int, default=500, help="rows per insert transaction")
+    parser.add_argument('--report', help="write the per-item report here instead of stdout")
+    parser.add_argument('--resume', action='store_true', help="skip surat that already have a database row")
+    args = parser.parse_args()
+
+    placement = PlacementEngine(
+        strategy=Config.PLACEMENT_STRATEGY,
+        min_free_bytes=Config.PLACEMENT_MIN_FREE_BYTES,
+        min_free_ratio=Config.PLACEMENT_MIN_FREE_RATIO,
+        stat_ttl=Config.PLACEMENT_STAT_TTL,
+        write_window=Config.PLACEMENT_WRITE_WINDOW,
+        weights=Config.PLACEMENT_WEIGHTS
+    )
+    conn = mysql.connector.connect(
+        host=Config.MYSQL_HOST,
+        user=Config.MYSQL_USER,
+        password=Config.MYSQL_PASSWORD,
+        database=Config.MYSQL_DB
+    )
+    report = open(args.report, 'a' if args.resume else 'w', encoding='utf-8') if args.report else sys.stdout
+    try:
+        totals = ingest(args.manifest, report, conn, placement, Config.SEARCH_PATHS, Config.SECRET_KEY,
+                        workers=args.workers, batch_size=args.batch_size, resume=args.resume)
+    finally:
+        conn.close()
+        if args.report:
+            report.close()
+    print(f"Ingested {totals['ok']} surat, {totals['skipped']} skipped, {totals['error']} failed", file=sys.stderr)
+    sys.exit(1 if totals['error'] else 0)
+
+
+if __name__ == '__main__':
+    main()
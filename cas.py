@@ -0,0 +1,267 @@
+"""
+Content-addressed storage for uploaded files.
+
+    python cas.py stats           # blobs, bytes and references per storage root
+    python cas.py gc [--dry-run]  # delete blobs no surat references any more
+
+In 'cas' STORAGE_MODE every uploaded file is stored once per content, as
+<root>/.cas/ab/cd/<sha256>, whatever its name or the surat it belongs to.
+The surat's encrip then lists {"name": original name, "sha256": digest} entries
+instead of plain filenames. Reference counts live in <root>/.cas/refs.sqlite,
+one row per blob, so identical attachments share one copy and a blob is only
+deleted by gc once nothing references it.
+"""
+import argparse
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CAS_DIRNAME = '.cas'
+REFS_FILENAME = 'refs.sqlite'
+
+
+def is_blob_entry(entry) -> bool:
+    return isinstance(entry, dict) and 'sha256' in entry
+
+
+def blob_path(root: str, digest: str, dirname: str = CAS_DIRNAME) -> str:
+    return os.path.join(root, dirname, digest[:2], digest[2:4], digest)
+
+
+class ContentStore:
+    """
+    Blobs and reference counts across the storage roots.
+    A blob already present in any root is referenced there instead of being
+    written again, so content is deduplicated across volumes too.
+    """
+
+    def __init__(self, roots: list, dirname: str = CAS_DIRNAME, chunk_size: int = 1024 * 1024):
+        self.roots = list(roots)
+        self.dirname = dirname
+        self.chunk_size = chunk_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {'stored': 0, 'deduplicated': 0, 'bytes_saved': 0}
+
+    def blob_path(self, root: str, digest: str) -> str:
+        return blob_path(root, digest, self.dirname)
+
+    def locate(self, digest: str, prefer=()):
+        """
+        Returns the blob's path, checking the preferred roots first, or None.
+        """
+        seen = set()
+        for root in list(prefer) + self.roots:
+            if root in seen:
+                continue
+            seen.add(root)
+            path = self.blob_path(root, digest)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def store(self, stream, root: str):
+        """
+        Copies a stream into the store, hashing it on the way.
+        Returns (digest, size, path).
+        """
+        tmp_dir = os.path.join(root, self.dirname, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                    hasher.update(chunk)
+                    size += len(chunk)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        digest = hasher.hexdigest()
+        return digest, size, self.adopt(tmp_path, root, digest, size)
+
+    def adopt(self, path: str, root: str, digest: str, size: int = None) -> str:
+        """
+        Moves an already hashed file into the store and takes a reference.
+        If the content is stored already the file is deleted instead.
+        Returns the blob path.
+        """
+        if size is None:
+            size = os.path.getsize(path)
+        existing = self.locate(digest, prefer=[root])
+        if existing:
+            existing_root = self._root_of(existing)
+            self.addref(existing_root, digest, size)
+            # gc() may have removed the unreferenced blob after locate(): once our
+            # reference is committed it cannot, so check before dropping our copy
+            if os.path.isfile(existing):
+                os.remove(path)
+                with self._lock:
+                    self._stats['deduplicated'] += 1
+                    self._stats['bytes_saved'] += size
+                return existing
+            self._unref(existing_root, digest)
+
+        # Referenced before it is moved in, so gc() never takes it for garbage
+        target = self.blob_path(root, digest)
+        self.addref(root, digest, size)
+        try:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+        except OSError:
+            self._unref(root, digest)
+            raise
+        with self._lock:
+            self._stats['stored'] += 1
+        return target
+
+    def _root_of(self, path: str) -> str:
+        # <root>/<dirname>/ab/cd/<digest>
+        return os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(path))))
+
+    def _conn(self, root: str) -> sqlite3.Connection:
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        conn = connections.get(root)
+        if conn is None:
+            directory = os.path.join(root, self.dirname)
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(directory, REFS_FILENAME), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER, refs INTEGER)")
+            conn.commit()
+            connections[root] = conn
+        return conn
+
+    def addref(self, root: str, digest: str, size: int):
+        conn = self._conn(root)
+        conn.execute(
+            "INSERT INTO blobs (digest, size, refs) VALUES (?, ?, 1) "
+            "ON CONFLICT(digest) DO UPDATE SET refs = refs + 1",
+            (digest, size)
+        )
+        conn.commit()
+
+    def release(self, digest: str, prefer=()):
+        """
+        Drops one reference to a blob, e.g. when the surat row could not be saved.
+        The file itself is removed by gc().
+        """
+        path = self.locate(digest, prefer)
+        if path is None:
+            return
+        self._unref(self._root_of(path), digest)
+
+    def _unref(self, root: str, digest: str):
+        conn = self._conn(root)
+        conn.execute("UPDATE blobs SET refs = refs - 1 WHERE digest = ? AND refs > 0", (digest,))
+        conn.commit()
+
+    def refs(self, digest: str) -> int:
+        path = self.locate(digest)
+        if path is None:
+            return 0
+        row = self._conn(self._root_of(path)).execute("SELECT refs FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        return row[0] if row else 0
+
+    def gc(self, dry_run: bool = False) -> list:
+        """
+        Deletes unreferenced blobs in every root. Returns their paths.
+        """
+        removed = []
+        for root in self.roots:
+            if not os.path.isdir(os.path.join(root, self.dirname)):
+                continue
+            conn = self._conn(root)
+            for digest, in conn.execute("SELECT digest FROM blobs WHERE refs <= 0").fetchall():
+                path = self.blob_path(root, digest)
+                if dry_run:
+                    removed.append(path)
+                    continue
+                # Claim the row and remove the file in one transaction: an addref()
+                # racing with us waits for the commit and then finds the blob gone
+                if conn.execute("DELETE FROM blobs WHERE digest = ? AND refs <= 0", (digest,)).rowcount != 1:
+                    conn.rollback()
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    conn.rollback()
+                    logger.warning("CAS gc: cannot remove %s: %s", path, e)
+                    continue
+                conn.commit()
+                removed.append(path)
+            removed += self._remove_stale_tmp(root, dry_run)
+        return removed
+
+    def _remove_stale_tmp(self, root: str, dry_run: bool, max_age: float = 24 * 3600) -> list:
+        # Temp files left behind by interrupted uploads
+        tmp_dir = os.path.join(root, self.dirname, 'tmp')
+        cutoff = time.time() - max_age
+        removed = []
+        try:
+            entries = list(os.scandir(tmp_dir))
+        except OSError:
+            return removed
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    if not dry_run:
+                        os.remove(entry.path)
+                    removed.append(entry.path)
+            except OSError:
+                continue
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        roots = {}
+        for root in self.roots:
+            if not os.path.exists(os.path.join(root, self.dirname, REFS_FILENAME)):
+                continue
+            blobs, size, refs = self._conn(root).execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(refs), 0) FROM blobs WHERE refs > 0"
+            ).fetchone()
+            roots[root] = {"blobs": blobs, "bytes": size, "references": refs}
+        stats['roots'] = roots
+        return stats
+
+
+def main():
+    from config import Config
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('command', choices=['stats', 'gc'])
+    parser.add_argument('--dry-run', action='store_true', help="gc: only list what would be deleted")
+    args = parser.parse_args()
+
+    store = ContentStore(Config.SEARCH_PATHS, Config.CAS_DIRNAME)
+    if args.command == 'stats':
+        for root, root_stats in store.stats()['roots'].items():
+            print(f"{root}: {root_stats['blobs']} blobs, {root_stats['bytes'] / 1024 ** 2:.1f} MiB, "
+                  f"{root_stats['references']} references")
+        return
+
+    removed = store.gc(dry_run=args.dry_run)
+    for path in removed:
+        print(f"{'Would remove' if args.dry_run else 'Removed'}: {path}")
+    print(f"{len(removed)} unreferenced blobs")
+
+
+if __name__ == '__main__':
+    main()
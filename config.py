@@ -5,6 +5,9 @@ class Config:
     # IN PRODUCTION: Retrieve this from environment variables!
     # generate one via: python -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"
     SECRET_KEY = os.environ.get('SECRET_KEY', 'AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA=')
+
+    # Debug mode for the dev server (python app.py); never enable it in production
+    DEBUG = os.environ.get('FILEDO_DEBUG') == '1'
     
     # Locations where the files might be stored
     SEARCH_PATHS = [
@@ -25,3 +28,160 @@ class Config:
     MYSQL_USER = 'root'
     MYSQL_PASSWORD = ''
     MYSQL_DB = 'lfdeo'
+
+    # Look up encrip keys through the indexed encrip_digest column added by
+    # `python db_check.py migrate`. None checks once whether the column exists and
+    # logs an error if it does not; True/False skip the check.
+    SURAT_DIGEST_LOOKUP = None
+
+    # Database connection pool
+    MYSQL_POOL_SIZE = 10        # maximum open connections per process
+    MYSQL_POOL_TIMEOUT = 5      # seconds to wait for a free connection
+    MYSQL_POOL_RECYCLE = 300    # close connections idle longer than this (seconds)
+    MYSQL_POOL_PRE_PING = True  # ping idle connections before reuse
+
+    # Reuse staged archives when the same unchanged files are requested again.
+    # The limits bound what is remembered; staged files are removed by the
+    # staging sweeper (STAGING_TTL, STAGING_QUOTA_BYTES), never by the cache.
+    ZIP_CACHE_ENABLED = True
+    ZIP_CACHE_MAX_ENTRIES = 512
+    ZIP_CACHE_MAX_BYTES = 5 * 1024 ** 3  # total size of remembered archives
+    ZIP_CACHE_MAX_AGE = 6 * 3600         # seconds before a cached archive is rebuilt
+
+    # How /search and /retrieve hand out archives:
+    # 'scp' stages a zip in STAGING_DIR and returns an scp command,
+    # 'download' returns a /download link that streams the zip over HTTP,
+    # 'http' stages a zip like 'scp' and returns an /archive link to it that
+    # supports Range/If-Range, so interrupted downloads resume.
+    # Clients can override per request with the 'delivery' parameter.
+    DELIVERY_MODE = 'scp'
+    STREAM_CHUNK_SIZE = 1024 * 1024  # bytes read per file chunk when streaming
+
+    # Zip compression policy: 'adaptive' stores already-compressed files and
+    # deflates the rest, 'deflate' always deflates, 'store' never compresses
+    ZIP_COMPRESSION = 'adaptive'
+    ZIP_COMPRESSLEVEL = 6
+    ZIP_STORE_EXTENSIONS = [
+        '.pdf', '.jpg', '.jpeg', '.png', '.gif', '.webp', '.tif', '.tiff',
+        '.zip', '.gz', '.7z', '.rar', '.docx', '.xlsx', '.pptx', '.mp3', '.mp4',
+    ]
+    ZIP_SAMPLE_BYTES = 64 * 1024  # bytes sampled to test compressibility of other files
+    ZIP_MIN_SAVING = 0.05         # store files whose sample shrinks by less than this
+
+    # In-memory filename -> storage root index used instead of probing every SEARCH_PATHS entry
+    PATH_INDEX_ENABLED = True
+    PATH_INDEX_RESCAN_INTERVAL = 300        # seconds between rescans of changed roots
+    PATH_INDEX_NEGATIVE_CACHE_SIZE = 10000  # remembered misses
+    PATH_INDEX_NEGATIVE_TTL = 60            # seconds a miss is trusted before checking disk again
+
+    # Parallel archive building: members of large bundles are compressed on a shared
+    # thread pool (1 disables it). Smaller bundles are zipped on the request thread.
+    ZIP_WORKERS = os.cpu_count() or 1
+    ZIP_PARALLEL_MIN_BYTES = 16 * 1024 * 1024
+
+    # Background retrieval jobs ('async' flag on /search and /retrieve)
+    JOB_WORKERS = 4        # concurrent jobs per process
+    JOB_RETENTION = 3600   # seconds a finished job's result stays available
+
+    # Resumable streaming uploads (/upload/sessions). Sessions are kept in the
+    # worker's memory: an upload can be resumed across dropped connections, but
+    # not across a worker restart. Part files left by a restart are removed from
+    # <root>/.uploads once they are older than UPLOAD_SESSION_TTL.
+    UPLOAD_CHUNK_SIZE = 1024 * 1024   # bytes read from the request body per write
+    UPLOAD_SESSION_TTL = 24 * 3600    # idle sessions and their part files are dropped after this
+
+    # Storage placement for uploads: 'most_free', 'least_recent_write',
+    # 'weighted_round_robin' or 'random'. Roots must exist: a missing directory
+    # (e.g. an unmounted volume) is skipped, never created.
+    PLACEMENT_STRATEGY = 'most_free'
+    PLACEMENT_MIN_FREE_BYTES = 1024 ** 3  # volumes with less free space are skipped
+    PLACEMENT_MIN_FREE_RATIO = 0.02       # ... as are volumes below this free fraction
+    PLACEMENT_STAT_TTL = 10               # seconds a disk usage sample is reused
+    PLACEMENT_WRITE_WINDOW = 300          # seconds of write history for least_recent_write
+    PLACEMENT_WEIGHTS = {}                # root -> weight for weighted_round_robin (default 1)
+
+    # Cache for no_surat / encrip lookups. Rows are write-once; /upload invalidates
+    # the keys it inserts. Set LOOKUP_CACHE_SHARED_PATH to a local SQLite file to
+    # share entries between worker processes on the same host.
+    LOOKUP_CACHE_ENABLED = True
+    LOOKUP_CACHE_MAX_ENTRIES = 10000
+    LOOKUP_CACHE_TTL = 600           # seconds a found row is cached
+    LOOKUP_CACHE_NEGATIVE_TTL = 30   # seconds a "no such row" answer is cached
+    LOOKUP_CACHE_SHARED_PATH = None  # e.g. '/var/cache/filedo/lookup.sqlite'
+    LOOKUP_CACHE_PURGE_EVERY = 1000  # shared writes between purges of expired rows
+
+    # Staging dir lifecycle: archives are sharded into two-character subdirectories
+    # and swept by a background thread (or 'python staging.py' from cron)
+    STAGING_GC_ENABLED = True
+    STAGING_GC_INTERVAL = 300             # seconds between sweeps
+    STAGING_TTL = 6 * 3600                # remove archives not accessed for this long
+    STAGING_MAX_AGE = 48 * 3600           # ... and any archive older than this
+    STAGING_QUOTA_BYTES = 50 * 1024 ** 3  # least recently used archives are evicted above this
+    STAGING_MIN_AGE = 300                 # never evict archives younger than this for quota
+
+    # Observability: /metrics is always served; logs go to stderr
+    LOG_LEVEL = 'INFO'
+    LOG_JSON = True                # one JSON object per log line
+    SERVER_TIMING_ENABLED = False  # add a Server-Timing header with per-stage durations
+
+    # /search/batch: most surat accepted in one request
+    BATCH_MAX_SURAT = 500
+
+    # Storage layout for new uploads. 'cas' stores each distinct file once as
+    # <root>/.cas/ab/cd/<sha256> with reference counts; encrip then lists
+    # {"name", "sha256"} entries. Existing plain-filename rows keep working in
+    # either mode. Unreferenced blobs are removed by 'python cas.py gc'.
+    STORAGE_MODE = 'files'   # 'files' or 'cas'
+    CAS_DIRNAME = '.cas'
+
+    # Serving staged archives on /archive. Full responses go out through the
+    # WSGI file wrapper (sendfile() under gunicorn). Behind nginx, point
+    # ARCHIVE_ACCEL_REDIRECT at an internal location aliased to STAGING_DIR,
+    # e.g. '/_staging/', to let nginx send the file; USE_X_SENDFILE does the
+    # same for Apache/lighttpd.
+    ARCHIVE_ACCEL_REDIRECT = None
+    USE_X_SENDFILE = False
+
+    # Search-as-you-type on /suggest: every no_surat is held in memory, reloaded
+    # from the DB periodically and updated at once by this process's uploads
+    SUGGEST_ENABLED = True
+    SUGGEST_RELOAD_INTERVAL = 600  # seconds; picks up rows inserted elsewhere
+    SUGGEST_MAX_RESULTS = 10
+    SUGGEST_MIN_SIMILARITY = 0.5   # share of the query's trigrams a close match must contain
+
+    # Storage scrubber (python scrub.py): checks stored files against the size and
+    # SHA-256 recorded at upload in surat_file (created by 'db_check.py migrate')
+    SCRUB_BATCH_SIZE = 500                    # surat rows per checkpoint
+    SCRUB_MAX_BYTES_PER_SEC = 50 * 1024 ** 2  # read rate per storage root, 0 = unthrottled
+    SCRUB_CHECKPOINT = 'scrub_checkpoint.json'
+
+    # Local copies of hot source files from slow storage roots (network or archival
+    # mounts). Staged archive builds read a file from HOT_CACHE_DIR once it has been
+    # requested HOT_CACHE_ADMIT_AFTER times; a copy is only used while the source's
+    # size and mtime still match.
+    HOT_CACHE_ENABLED = False
+    HOT_CACHE_DIR = '/var/cache/filedo/hot'
+    HOT_CACHE_MAX_BYTES = 20 * 1024 ** 3        # per worker process
+    HOT_CACHE_ROOTS = None                      # roots to cache, e.g. ['/files3/surat']; None = every root
+    HOT_CACHE_ADMIT_AFTER = 2                   # requests before a file is copied
+    HOT_CACHE_MAX_FILE_BYTES = 2 * 1024 ** 3    # larger files are always read from the source
+
+    # Admission control on /search, /retrieve, /search/batch, the streaming
+    # downloads and uploads. Over-limit requests are answered at once: 429 when
+    # a client exceeds its request rate, 503 when the server is saturated, both
+    # with Retry-After. Limits are per worker process.
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMIT_PER_MINUTE = 60       # sustained requests per client
+    RATE_LIMIT_BURST = 20            # requests a client may make back to back
+    # Behind a reverse proxy every peer address is the proxy's. A proxy on the same
+    # host (loopback peer) is trusted to name the client in X-Real-IP or
+    # X-Forwarded-For. A proxy on another host must have its header set here,
+    # otherwise all of its clients share one bucket. Of a comma separated list
+    # only the last entry, the one the proxy appended, is used. RATE_LIMIT_EXEMPT
+    # applies to peer addresses only, never to an address from a header.
+    RATE_LIMIT_CLIENT_HEADER = None  # e.g. 'X-Real-IP'; default is the peer address
+    RATE_LIMIT_EXEMPT = ['127.0.0.1', '::1']  # clients never rate limited (local scripts, health checks)
+    MAX_CONCURRENT_ZIP_BUILDS = max(2, os.cpu_count() or 1)  # archives built or streamed at once, 0 = unlimited
+    ZIP_BUILD_WAIT = 2               # seconds a request may queue for a build slot; queued jobs always wait
+    MAX_UPLOAD_BYTES_IN_FLIGHT = 2 * 1024 ** 3  # upload bodies being received at once, 0 = unlimited
+    BUSY_RETRY_AFTER = 5             # Retry-After seconds of a 503
@@ -0,0 +1,261 @@
+import hashlib
+import threading
+import time
+from collections import deque
+
+SURAT_INSERT_SQL = "INSERT INTO surat (no_surat, path, encrip) VALUES (%s, %s, %s)"
+
+# encrip_digest is a stored generated column, SHA2(encrip, 256); see db_check.py migrate
+PATH_BY_DIGEST_SQL = "SELECT path FROM surat WHERE encrip_digest = %s AND encrip = %s LIMIT 1"
+PATH_BY_ENCRIP_SQL = "SELECT path FROM surat WHERE encrip = %s LIMIT 1"
+DIGEST_COLUMN_PROBE_SQL = "SELECT encrip_digest FROM surat LIMIT 0"
+NO_SURAT_ALL_SQL = "SELECT no_surat FROM surat"
+
+# Size and SHA-256 of every stored file, recorded at upload for scrub.py; see db_check.py migrate
+SURAT_FILE_INSERT_SQL = "INSERT INTO surat_file (encrip_digest, filename, size, sha256) VALUES (%s, %s, %s, %s)"
+
+
+def encrip_digest(encrypted_key) -> str:
+    """
+    Hex SHA-256 of an encrip token, matching MySQL's SHA2(encrip, 256).
+    """
+    if isinstance(encrypted_key, str):
+        encrypted_key = encrypted_key.encode()
+    return hashlib.sha256(encrypted_key).hexdigest()
+
+
+def checksum_rows(encrypted_key, checksums: list) -> list:
+    """
+    surat_file rows for [(filename, size, sha256)] of the surat with this encrip.
+    """
+    digest = encrip_digest(encrypted_key)
+    return [(digest, name, size, sha256) for name, size, sha256 in checksums]
+
+
+# MySQL's ER_NO_SUCH_TABLE and ER_BAD_FIELD_ERROR
+NO_SUCH_TABLE_ERRNO = 1146
+NO_SUCH_COLUMN_ERRNO = 1054
+
+
+def is_missing_table(error: Exception) -> bool:
+    # mysql.connector sets errno; the SQLite stand-in only has the message
+    return getattr(error, 'errno', None) == NO_SUCH_TABLE_ERRNO or 'no such table' in str(error)
+
+
+def is_missing_column(error: Exception) -> bool:
+    return getattr(error, 'errno', None) == NO_SUCH_COLUMN_ERRNO or 'no such column' in str(error)
+
+
+def insert_checksums(cursor, rows: list) -> bool:
+    """
+    Inserts surat_file rows. Returns False when surat_file does not exist yet,
+    so the caller's transaction can still commit the surat rows. Any other error
+    is raised: after a deadlock or lock wait timeout MySQL has already rolled
+    the whole transaction back, and committing would silently store nothing.
+    """
+    try:
+        cursor.executemany(SURAT_FILE_INSERT_SQL, rows)
+        return True
+    except Exception as e:
+        if is_missing_table(e):
+            return False
+        raise
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the checkout timeout."""
+
+
+class PooledConnection:
+    """
+    Proxy around a pooled connection.
+    close() hands the connection back to the pool instead of dropping the socket,
+    so call sites written for plain connections keep working unchanged.
+    """
+
+    def __init__(self, pool, conn, generation=0):
+        self._pool = pool
+        self._conn = conn
+        self._generation = generation
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise RuntimeError("Connection already returned to the pool")
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool._release(conn, self._generation)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of database connections.
+    connect: zero-argument callable that opens a new connection.
+    size: maximum number of open connections (idle + checked out).
+    timeout: seconds get() waits for a free connection before raising PoolTimeout.
+    recycle: connections idle longer than this many seconds are closed instead of reused.
+    pre_ping: ping idle connections before handing them out.
+    """
+
+    def __init__(self, connect, size=10, timeout=5.0, recycle=300, pre_ping=True):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        self._idle = deque()  # (conn, last_used), most recently used on the right
+        self._open = 0
+        self._generation = 0  # bumped by close_all(); older checkouts are closed on release
+        self._cond = threading.Condition()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'errors': 0,
+            'recycled': 0,
+        }
+
+    def get(self) -> PooledConnection:
+        """
+        Checks out a connection, reusing an idle one when possible.
+        """
+        deadline = time.monotonic() + self.timeout
+        waited = False
+
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    if self._idle:
+                        conn, last_used = self._idle.pop()
+                        break
+                    if self._open < self.size:
+                        # Reserve a slot, the connection is opened outside the lock
+                        self._open += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                    if not waited:
+                        self._stats['waits'] += 1
+                        waited = True
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                return self._open_new()
+
+            if self._is_usable(conn, last_used):
+                with self._cond:
+                    self._stats['hits'] += 1
+                    generation = self._generation
+                return PooledConnection(self, conn, generation)
+
+            # Stale connection was dropped; its slot is free again, try once more
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+
+    def _open_new(self) -> PooledConnection:
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._stats['errors'] += 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats['misses'] += 1
+            generation = self._generation
+        return PooledConnection(self, conn, generation)
+
+    def _is_usable(self, conn, last_used: float) -> bool:
+        if self.recycle and time.monotonic() - last_used > self.recycle:
+            with self._cond:
+                self._stats['recycled'] += 1
+            self._discard(conn)
+            return False
+        if self.pre_ping:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                with self._cond:
+                    self._stats['errors'] += 1
+                self._discard(conn)
+                return False
+        return True
+
+    def _release(self, conn, generation=0):
+        with self._cond:
+            stale = generation != self._generation
+            if stale:
+                self._open -= 1
+                self._cond.notify()
+        if stale:
+            # Checked out before close_all()
+            self._discard(conn)
+            return
+
+        try:
+            # End any open transaction so the next user gets a fresh snapshot
+            conn.rollback()
+        except Exception:
+            self._discard(conn)
+            with self._cond:
+                self._open -= 1
+                self._stats['errors'] += 1
+                self._cond.notify()
+            return
+
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            self._idle.append((conn, now))
+            # Reap connections that sat idle at the bottom of the stack for too long
+            while self.recycle and self._idle and now - self._idle[0][1] > self.recycle:
+                expired.append(self._idle.popleft()[0])
+                self._open -= 1
+                self._stats['recycled'] += 1
+            self._cond.notify()
+
+        for old in expired:
+            self._discard(old)
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        """
+        Closes every idle connection. Checked-out connections are closed when released.
+        """
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._open -= len(idle)
+            self._generation += 1
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['open'] = self._open
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._open - len(self._idle)
+        return stats
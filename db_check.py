@@ -1,22 +1,221 @@
+"""
+Database check and migration tool for the surat table.
+
+    python db_check.py            # connection check (default)
+    python db_check.py verify     # report missing columns/indexes and query plans
+    python db_check.py migrate    # create the digest column and indexes (idempotent)
+
+The migration adds 'encrip_digest', a stored generated column holding
+SHA2(encrip, 256). MySQL computes it for existing and future rows, so every
+writer keeps it populated, and /retrieve can look keys up through a short
+indexed value instead of comparing the long Fernet token.
+
+It also creates 'surat_file', which holds the size and SHA-256 of every file
+recorded at upload time, keyed by the surat's encrip_digest. scrub.py checks
+stored files against it.
+"""
+import argparse
+import sys
+
 from config import Config
+from db import encrip_digest
 import mysql.connector
 
+TABLE = 'surat'
+
+COLUMNS = {
+    'encrip_digest': (
+        "ALTER TABLE surat ADD COLUMN encrip_digest CHAR(64) CHARACTER SET ascii "
+        "AS (SHA2(encrip, 256)) STORED"
+    ),
+}
+
+TABLES = {
+    'surat_file': (
+        "CREATE TABLE surat_file ("
+        "encrip_digest CHAR(64) CHARACTER SET ascii NOT NULL, "
+        "filename VARCHAR(255) NOT NULL, "
+        "size BIGINT NOT NULL, "
+        "sha256 CHAR(64) CHARACTER SET ascii NOT NULL, "
+        "PRIMARY KEY (encrip_digest, filename))"
+    ),
+}
+
+# name -> (columns, DDL); no_surat gets a prefix index when it is a TEXT column
+INDEXES = {
+    'idx_surat_no_surat': (['no_surat'], "CREATE INDEX idx_surat_no_surat ON surat ({no_surat})"),
+    'idx_surat_encrip_digest': (['encrip_digest'], "CREATE INDEX idx_surat_encrip_digest ON surat (encrip_digest)"),
+}
+
+LOOKUP_QUERIES = {
+    'search by no_surat': ("SELECT encrip, path FROM surat WHERE no_surat = %s LIMIT 1", ('SK/EXPLAIN',)),
+    'retrieve by digest': (
+        "SELECT path FROM surat WHERE encrip_digest = %s AND encrip = %s LIMIT 1",
+        (encrip_digest('EXPLAIN'), 'EXPLAIN')
+    ),
+}
+
+
+def connect():
+    return mysql.connector.connect(
+        host=Config.MYSQL_HOST,
+        user=Config.MYSQL_USER,
+        password=Config.MYSQL_PASSWORD,
+        database=Config.MYSQL_DB
+    )
+
+
 def check_db():
     print(f"Config Host: {Config.MYSQL_HOST}")
     print(f"Config User: {Config.MYSQL_USER}")
     print(f"Config DB: {Config.MYSQL_DB}")
-    
+
     try:
-        conn = mysql.connector.connect(
-            host=Config.MYSQL_HOST,
-            user=Config.MYSQL_USER,
-            password=Config.MYSQL_PASSWORD,
-            database=Config.MYSQL_DB
-        )
+        conn = connect()
         print("Connection Success!")
         conn.close()
     except Exception as e:
         print(f"Connection Failed: {e}")
 
+
+def get_columns(cursor) -> dict:
+    cursor.execute(
+        "SELECT COLUMN_NAME, DATA_TYPE FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (TABLE,)
+    )
+    return {name: data_type for name, data_type in cursor.fetchall()}
+
+
+def get_tables(cursor) -> set:
+    cursor.execute(
+        "SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()"
+    )
+    return {name for name, in cursor.fetchall()}
+
+
+def get_indexes(cursor) -> dict:
+    """
+    Returns index name -> list of indexed columns, in order.
+    """
+    cursor.execute(
+        "SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY INDEX_NAME, SEQ_IN_INDEX",
+        (TABLE,)
+    )
+    indexes = {}
+    for name, column in cursor.fetchall():
+        indexes.setdefault(name, []).append(column)
+    return indexes
+
+
+def has_index_on(indexes: dict, columns: list) -> bool:
+    # Any index whose leading columns match serves the lookup
+    return any(cols[:len(columns)] == columns for cols in indexes.values())
+
+
+def migrate(conn):
+    cursor = conn.cursor()
+    columns = get_columns(cursor)
+    if not columns:
+        print(f"Table '{TABLE}' not found in database {Config.MYSQL_DB}")
+        return False
+
+    for name, ddl in COLUMNS.items():
+        if name in columns:
+            print(f"Column {name}: present")
+            continue
+        print(f"Column {name}: adding (rewrites the table, may take a while)")
+        cursor.execute(ddl)
+    columns = get_columns(cursor)
+
+    indexes = get_indexes(cursor)
+    for name, (index_columns, ddl) in INDEXES.items():
+        if has_index_on(indexes, index_columns):
+            print(f"Index on {index_columns}: present")
+            continue
+        # TEXT/BLOB columns can only be indexed by prefix
+        no_surat = 'no_surat(191)' if columns.get('no_surat') in ('text', 'mediumtext', 'longtext', 'blob') else 'no_surat'
+        print(f"Index on {index_columns}: creating {name}")
+        cursor.execute(ddl.format(no_surat=no_surat))
+
+    tables = get_tables(cursor)
+    for name, ddl in TABLES.items():
+        if name in tables:
+            print(f"Table {name}: present")
+            continue
+        print(f"Table {name}: creating")
+        cursor.execute(ddl)
+    conn.commit()
+    return True
+
+
+def verify(conn) -> bool:
+    cursor = conn.cursor()
+    columns = get_columns(cursor)
+    if not columns:
+        print(f"Table '{TABLE}' not found in database {Config.MYSQL_DB}")
+        return False
+
+    ok = True
+    for name in COLUMNS:
+        present = name in columns
+        ok = ok and present
+        print(f"Column {name}: {'OK' if present else 'MISSING'}")
+
+    indexes = get_indexes(cursor)
+    for name, (index_columns, _) in INDEXES.items():
+        present = has_index_on(indexes, index_columns)
+        ok = ok and present
+        print(f"Index on {index_columns}: {'OK' if present else 'MISSING'}")
+
+    tables = get_tables(cursor)
+    for name in TABLES:
+        present = name in tables
+        ok = ok and present
+        print(f"Table {name}: {'OK' if present else 'MISSING'}")
+
+    if 'encrip_digest' in columns:
+        cursor.execute("SELECT COUNT(*) FROM surat WHERE encrip IS NOT NULL AND encrip_digest IS NULL")
+        missing = cursor.fetchone()[0]
+        ok = ok and missing == 0
+        print(f"Rows without digest: {missing}")
+
+        for label, (sql, params) in LOOKUP_QUERIES.items():
+            cursor.execute("EXPLAIN " + sql, params)
+            plan = cursor.fetchall()
+            names = [d[0] for d in cursor.description]
+            keys = [dict(zip(names, row)).get('key') for row in plan]
+            uses_index = any(keys)
+            ok = ok and uses_index
+            print(f"Plan for {label}: {'index ' + ', '.join(k for k in keys if k) if uses_index else 'FULL SCAN'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('command', nargs='?', default='check', choices=['check', 'verify', 'migrate'])
+    args = parser.parse_args()
+
+    if args.command == 'check':
+        check_db()
+        return
+
+    try:
+        conn = connect()
+    except Exception as e:
+        print(f"Connection Failed: {e}")
+        sys.exit(2)
+
+    try:
+        if args.command == 'migrate':
+            ok = migrate(conn) and verify(conn)
+        else:
+            ok = verify(conn)
+    finally:
+        conn.close()
+    sys.exit(0 if ok else 1)
+
+
 if __name__ == "__main__":
-    check_db()
+    main()
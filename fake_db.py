@@ -0,0 +1,101 @@
+"""
+SQLite stand-in for the MySQL 'surat' table, for benchmarks and tests that
+must run without a database server.
+
+Connections speak just enough of the mysql.connector API for this app:
+%s placeholders, cursor()/commit()/rollback()/ping()/close(), and a SHA2()
+function so the generated encrip_digest column behaves like MySQL's.
+"""
+import hashlib
+import sqlite3
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS surat ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+    "no_surat TEXT, "
+    "path TEXT, "
+    "encrip TEXT, "
+    "encrip_digest TEXT AS (SHA2(encrip, 256)) STORED)",
+    "CREATE INDEX IF NOT EXISTS idx_surat_no_surat ON surat (no_surat)",
+    "CREATE INDEX IF NOT EXISTS idx_surat_encrip_digest ON surat (encrip_digest)",
+    "CREATE TABLE IF NOT EXISTS surat_file ("
+    "encrip_digest TEXT NOT NULL, "
+    "filename TEXT NOT NULL, "
+    "size INTEGER NOT NULL, "
+    "sha256 TEXT NOT NULL, "
+    "PRIMARY KEY (encrip_digest, filename))",
+)
+
+
+def _sha2(value, bits):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.encode()
+    return hashlib.sha256(value).hexdigest()
+
+
+class FakeCursor:
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, sql: str, params=()):
+        self._cursor.execute(sql.replace('%s', '?'), params)
+
+    def executemany(self, sql: str, rows):
+        self._cursor.executemany(sql.replace('%s', '?'), rows)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+
+class FakeConnection:
+
+    def __init__(self, path: str):
+        # Connections are handed between threads by the pool, one user at a time
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.create_function('SHA2', 2, _sha2, deterministic=True)
+
+    def cursor(self):
+        return FakeCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def ping(self, reconnect=False):
+        self._conn.execute("SELECT 1")
+
+    def close(self):
+        self._conn.close()
+
+
+def create_database(path: str):
+    """
+    Creates the surat table at path and returns a connect() callable for ConnectionPool.
+    """
+    conn = FakeConnection(path)
+    conn._conn.execute("PRAGMA journal_mode=WAL")
+    for statement in SCHEMA:
+        conn._conn.execute(statement)
+    conn.commit()
+    conn.close()
+    return lambda: FakeConnection(path)
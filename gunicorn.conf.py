@@ -0,0 +1,54 @@
+"""
+Gunicorn settings for wsgi:app. Every value can be overridden from the environment.
+
+Handlers spend most of their time in MySQL, disk I/O and zlib, which release the
+GIL, so one process with many threads uses every core while keeping the
+in-process state shared: background jobs (/jobs/<id>), resumable upload
+sessions, the zip/lookup caches and the path index all live in the worker
+that created them. Only raise FILEDO_WORKERS above 1 behind a load balancer
+with sticky sessions, or when async jobs and /upload/sessions are not used;
+each worker then keeps its own caches and database pool (MYSQL_POOL_SIZE each).
+"""
+import multiprocessing
+import os
+import sys
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = os.environ.get('FILEDO_BIND', '0.0.0.0:5000')
+worker_class = 'gthread'
+workers = int(os.environ.get('FILEDO_WORKERS', 1))
+# Concurrent requests per worker; scales with cores since blocking work releases the GIL
+threads = int(os.environ.get('FILEDO_THREADS', max(8, 4 * cpu_count)))
+
+# Building a large archive can take a while; uploads stream large bodies
+timeout = int(os.environ.get('FILEDO_TIMEOUT', 300))
+graceful_timeout = 30
+keepalive = 5
+# Whole staged archives on /archive are sent with sendfile(); ranged responses are copied
+sendfile = True
+
+# Background threads (path index, staging GC, job pool) are started when app is
+# imported, so the app must be loaded in each worker, not in the master before fork
+preload_app = False
+
+# The app writes one structured log line per request itself
+accesslog = None
+errorlog = '-'
+loglevel = os.environ.get('FILEDO_LOG_LEVEL', 'info')
+
+
+def worker_exit(server, worker):
+    # Gunicorn may call this hook from the master, which never loaded the app
+    app_module = sys.modules.get('app')
+    if app_module is None:
+        return
+    if app_module.path_index:
+        app_module.path_index.stop()
+    if app_module.hot_cache:
+        app_module.hot_cache.stop()
+    if app_module.suggest_index:
+        app_module.suggest_index.stop()
+    if app_module.staging_manager:
+        app_module.staging_manager.stop()
+    app_module.db_pool.close_all()
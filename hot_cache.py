@@ -0,0 +1,260 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from utils import archive_member
+
+logger = logging.getLogger(__name__)
+
+FILL_PREFIX = '.fill_'
+
+
+class HotFileCache:
+    """
+    Read-through copies of frequently retrieved source files on fast local disk,
+    for storage roots on slow network or archival mounts.
+
+    A cached copy is named after its source path, size and mtime, so a changed
+    source never matches its old copy. A file is copied in the background once it
+    has been requested admit_after times; later archive builds read the local copy.
+    Eviction is an LRU/LFU hybrid: the least frequently requested of the
+    eviction_sample least recently used copies goes first, and a newcomer is only
+    admitted if it is requested more often than what it would evict. Request
+    counts are halved every frequency_window requests so old popularity fades.
+
+    The index is kept per process; copies found in the directory at startup are
+    adopted, so a restart keeps the cache warm.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, roots=None, admit_after=2, max_file_bytes=None,
+                 eviction_sample=8, frequency_window=10000, fill_workers=1):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.roots = [os.path.normpath(root) for root in roots] if roots else None
+        self.admit_after = admit_after
+        self.max_file_bytes = max_file_bytes if max_file_bytes is not None else max_bytes // 10
+        self.eviction_sample = eviction_sample
+        self.frequency_window = frequency_window
+
+        self._entries = OrderedDict()  # cache name -> (source key, size), least recently used first
+        self._by_source = {}           # source key -> cache name
+        self._freq = {}                # source key -> recent request count
+        self._requests = 0
+        self._bytes = 0
+        self._reserved = 0
+        self._pins = {}                # cache name -> builds reading it
+        self._filling = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=fill_workers, thread_name_prefix='hot-cache')
+        self._stats = {'hits': 0, 'misses': 0, 'admitted': 0, 'rejected': 0, 'evicted': 0, 'stale': 0,
+                       'fill_errors': 0}
+        os.makedirs(directory, exist_ok=True)
+        self._adopt_existing()
+
+    @staticmethod
+    def _source_key(path: str) -> str:
+        return hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+
+    @staticmethod
+    def _name(key: str, st: os.stat_result, path: str) -> str:
+        # The extension is kept so the compression policy treats the copy like its source
+        return f"{key}-{st.st_size}-{st.st_mtime_ns}{os.path.splitext(path)[1].lower()}"
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name[:2], name)
+
+    def _adopt_existing(self):
+        found = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if filename.startswith(FILL_PREFIX):
+                    # Interrupted copy
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found.append((st.st_atime, filename, st.st_size))
+        for _, name, size in sorted(found):
+            key = name.split('-', 1)[0]
+            self._entries[name] = (key, size)
+            self._by_source[key] = name
+            self._bytes += size
+
+    def _cacheable(self, path: str) -> bool:
+        if self.roots is None:
+            return True
+        path = os.path.normpath(path)
+        return any(path.startswith(root + os.sep) for root in self.roots)
+
+    @contextmanager
+    def pinned(self, source_file_paths: list):
+        """
+        Yields the archive members with valid cached copies substituted, as
+        (path, arcname) pairs. Copies are not evicted until the block exits.
+        """
+        members = []
+        pinned = []
+        for entry in source_file_paths:
+            path, arcname = archive_member(entry)
+            name = self._lookup(path) if self._cacheable(path) else None
+            if name:
+                pinned.append(name)
+                path = self._path(name)
+            members.append((path, arcname))
+        try:
+            yield members
+        finally:
+            with self._lock:
+                for name in pinned:
+                    self._pins[name] -= 1
+                    if not self._pins[name]:
+                        del self._pins[name]
+
+    def _lookup(self, path: str):
+        """
+        Returns the name of a valid, now pinned copy of path, or None.
+        Schedules a copy when the file has become popular enough.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        key = self._source_key(path)
+        name = self._name(key, st, path)
+
+        with self._lock:
+            freq = self._count_request(key)
+            current = self._by_source.get(key)
+            if current is not None and current != name:
+                # Source was modified since it was copied
+                self._stats['stale'] += 1
+                self._remove(current)
+            if name in self._entries and os.path.exists(self._path(name)):
+                self._entries.move_to_end(name)
+                self._pins[name] = self._pins.get(name, 0) + 1
+                self._stats['hits'] += 1
+                return name
+            if name in self._entries:
+                # Removed behind our back, e.g. by another worker
+                self._remove(name)
+            self._stats['misses'] += 1
+            if freq < self.admit_after or st.st_size > self.max_file_bytes or key in self._filling:
+                return None
+            self._filling.add(key)
+        self._executor.submit(self._fill, path, key, name, st.st_size)
+        return None
+
+    def _count_request(self, key: str) -> int:
+        self._freq[key] = self._freq.get(key, 0) + 1
+        self._requests += 1
+        if self._requests >= self.frequency_window:
+            self._freq = {k: count // 2 for k, count in self._freq.items() if count > 1}
+            self._requests = 0
+        return self._freq.get(key, 0)
+
+    def _make_room(self, key: str, size: int) -> bool:
+        """
+        Evicts copies until size more bytes fit. Returns False, evicting nothing,
+        when the newcomer is requested less often than a copy it would displace.
+        """
+        victims = []
+        needed = self._bytes + self._reserved + size - self.max_bytes
+        candidates = [name for name in self._entries if name not in self._pins]
+        freq = self._freq.get(key, 0)
+        while needed > 0:
+            sample = [name for name in candidates if name not in victims][:self.eviction_sample]
+            if not sample:
+                return False
+            victim = min(sample, key=lambda name: self._freq.get(self._entries[name][0], 0))
+            if self._freq.get(self._entries[victim][0], 0) > freq:
+                return False
+            victims.append(victim)
+            needed -= self._entries[victim][1]
+        for victim in victims:
+            self._remove(victim)
+            self._stats['evicted'] += 1
+        return True
+
+    def _remove(self, name: str):
+        key, size = self._entries.pop(name, (None, 0))
+        self._bytes -= size
+        if key is not None and self._by_source.get(key) == name:
+            del self._by_source[key]
+        try:
+            os.remove(self._path(name))
+        except OSError:
+            pass
+
+    def _fill(self, path: str, key: str, name: str, size: int):
+        try:
+            with self._lock:
+                admitted = self._make_room(key, size)
+                if admitted:
+                    self._reserved += size
+                else:
+                    self._stats['rejected'] += 1
+            if not admitted:
+                return
+
+            target = self._path(name)
+            tmp_path = None
+            try:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(prefix=FILL_PREFIX, dir=os.path.dirname(target))
+                os.close(fd)
+                shutil.copyfile(path, tmp_path)
+                # Same mtime as the source, so zip entries carry the same timestamp
+                shutil.copystat(path, tmp_path)
+                st = os.stat(path)
+                if self._name(key, st, path) != name:
+                    raise OSError("source changed while it was copied")
+                os.replace(tmp_path, target)
+                tmp_path = None
+            except OSError as e:
+                logger.warning("Hot cache: cannot copy %s: %s", path, e)
+                with self._lock:
+                    self._reserved -= size
+                    self._stats['fill_errors'] += 1
+                return
+            finally:
+                if tmp_path is not None and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+            with self._lock:
+                self._reserved -= size
+                self._entries[name] = (key, size)
+                self._by_source[key] = name
+                self._bytes += size
+                self._stats['admitted'] += 1
+        finally:
+            with self._lock:
+                self._filling.discard(key)
+
+    def wait(self):
+        """
+        Blocks until the copies queued so far are done (for tests and benchmarks).
+        """
+        self._executor.submit(lambda: None).result()
+
+    def stop(self):
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+            stats['max_bytes'] = self.max_bytes
+        return stats
@@ -1,12 +1,13 @@
 import mysql.connector
+from config import Config
 
 def inspect_db():
     try:
         # Connect to MySQL Server (no db selected yet)
         conn = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password=""
+            host=Config.MYSQL_HOST,
+            user=Config.MYSQL_USER,
+            password=Config.MYSQL_PASSWORD
         )
         cursor = conn.cursor()
         
@@ -33,6 +34,13 @@ def inspect_db():
                         cursor.execute(f"DESCRIBE {table}")
                         columns = [f"{col[0]} ({col[1]})" for col in cursor.fetchall()]
                         print(f"    {columns}")
+
+                        # Indexes decide whether lookups are scans (see db_check.py verify)
+                        cursor.execute(f"SHOW INDEX FROM {table}")
+                        indexes = {}
+                        for row in cursor.fetchall():
+                            indexes.setdefault(row[2], []).append(row[4])
+                        print(f"    Indexes: {indexes}")
                         
                         # Peek at data
                         try:
@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """
+    A queued retrieval. fn(job) returns (payload, http_status) and may call
+    job.set_progress() while it runs.
+    """
+
+    def __init__(self, key: str):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = 'queued'
+        self.stage = None
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.http_status = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def set_progress(self, stage: str, done: int = 0, total: int = 0):
+        with self._lock:
+            self.stage = stage
+            self.done = done
+            self.total = total
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "progress": {"stage": self.stage, "done": self.done, "total": self.total},
+                "result": self.result,
+                "error": self.error,
+                "created": self.created,
+                "finished": self.finished
+            }
+
+
+class JobManager:
+    """
+    Runs retrievals on a local worker pool so endpoints can answer immediately.
+    Jobs with the same key share one run while it is queued or running.
+    Finished jobs are kept for `retention` seconds so clients can poll the result.
+    """
+
+    def __init__(self, workers=4, retention=3600):
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._jobs = {}      # job id -> Job
+        self._inflight = {}  # key -> Job
+        self._lock = threading.Lock()
+        self._stats = {'submitted': 0, 'deduplicated': 0, 'succeeded': 0, 'failed': 0}
+
+    def submit(self, key: str, fn):
+        """
+        Queues fn under key. Returns (job, created); created is False when an
+        identical job was already in flight and is reused.
+        """
+        with self._lock:
+            self._purge()
+            job = self._inflight.get(key)
+            if job is not None:
+                self._stats['deduplicated'] += 1
+                return job, False
+            job = Job(key)
+            self._jobs[job.id] = job
+            self._inflight[key] = job
+            self._stats['submitted'] += 1
+
+        self._executor.submit(self._run, job, fn)
+        return job, True
+
+    def _run(self, job: Job, fn):
+        with job._lock:
+            job.status = 'running'
+        try:
+            payload, http_status = fn(job)
+            failed = http_status >= 400
+            with job._lock:
+                job.result = payload
+                job.http_status = http_status
+                job.status = 'failed' if failed else 'done'
+                if failed:
+                    job.error = payload.get('error')
+        except Exception:
+            logger.exception("Job failed", extra={"job_id": job.id, "job_key": job.key})
+            failed = True
+            with job._lock:
+                job.status = 'failed'
+                job.error = "Internal error while processing the job"
+        finally:
+            with job._lock:
+                job.finished = time.time()
+            with self._lock:
+                self._inflight.pop(job.key, None)
+                self._stats['failed' if failed else 'succeeded'] += 1
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _purge(self):
+        cutoff = time.time() - self.retention
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.finished < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['tracked'] = len(self._jobs)
+            stats['in_flight'] = len(self._inflight)
+        return stats
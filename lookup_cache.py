@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteCacheBackend:
+    """
+    Cache shared by every worker process on one host, stored in a local SQLite file.
+    Values must be JSON serialisable. Expired rows are purged once every
+    purge_every writes, so the file does not grow with every key ever cached.
+    """
+
+    def __init__(self, path: str, purge_every: int = 1000):
+        self.path = path
+        self.purge_every = purge_every
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS lookup_cache (k TEXT PRIMARY KEY, v TEXT, expires REAL)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        """
+        Returns (found, value, seconds until the entry expires).
+        """
+        row = self._conn().execute("SELECT v, expires FROM lookup_cache WHERE k = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return False, None, 0
+        return True, json.loads(row[0]), row[1] - time.time()
+
+    def set(self, key: str, value, ttl: float):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO lookup_cache (k, v, expires) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl)
+        )
+        conn.commit()
+        with self._writes_lock:
+            self._writes += 1
+            due = self.purge_every and self._writes % self.purge_every == 0
+        if due:
+            self.purge_expired()
+
+    def delete(self, key: str):
+        conn = self._conn()
+        conn.execute("DELETE FROM lookup_cache WHERE k = ?", (key,))
+        conn.commit()
+
+    def purge_expired(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM lookup_cache WHERE expires < ?", (time.time(),))
+        conn.commit()
+
+
+class LookupCache:
+    """
+    In-process LRU cache with TTL in front of surat lookups, optionally backed by
+    a shared host-local backend so worker processes reuse each other's lookups.
+    A value of None records that no row exists; it is kept for negative_ttl only,
+    and /upload invalidates the key when it inserts the row.
+    """
+
+    def __init__(self, max_entries=10000, ttl=600, negative_ttl=30, backend=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.backend = backend
+
+        self._entries = OrderedDict()  # key -> (value, expires)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'invalidations': 0, 'backend_errors': 0}
+
+    @staticmethod
+    def _key(namespace: str, key: str) -> str:
+        return f"{namespace}:{key}"
+
+    def get(self, namespace: str, key: str):
+        """
+        Returns (found, value); found is False on a miss.
+        """
+        cache_key = self._key(namespace, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                if entry[1] >= time.monotonic():
+                    self._entries.move_to_end(cache_key)
+                    self._stats['hits'] += 1
+                    return True, entry[0]
+                del self._entries[cache_key]
+
+        if self.backend is not None:
+            try:
+                found, value, remaining = self.backend.get(cache_key)
+            except Exception as e:
+                logger.warning("Lookup cache backend error: %s", e)
+                found = False
+                with self._lock:
+                    self._stats['backend_errors'] += 1
+            if found:
+                # Keep the shared entry's expiry rather than starting a fresh TTL
+                self._store_local(cache_key, value, remaining)
+                with self._lock:
+                    self._stats['shared_hits'] += 1
+                return True, value
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return False, None
+
+    def set(self, namespace: str, key: str, value):
+        cache_key = self._key(namespace, key)
+        self._store_local(cache_key, value)
+        if self.backend is not None:
+            try:
+                self.backend.set(cache_key, value, self._ttl_for(value))
+            except Exception as e:
+                logger.warning("Lookup cache backend error: %s", e)
+                with self._lock:
+                    self._stats['backend_errors'] += 1
+
+    def invalidate(self, namespace: str, key: str):
+        cache_key = self._key(namespace, key)
+        with self._lock:
+            self._entries.pop(cache_key, None)
+            self._stats['invalidations'] += 1
+        if self.backend is not None:
+            try:
+                self.backend.delete(cache_key)
+            except Exception as e:
+                logger.warning("Lookup cache backend error: %s", e)
+                with self._lock:
+                    self._stats['backend_errors'] += 1
+
+    def _ttl_for(self, value) -> float:
+        return self.negative_ttl if value is None else self.ttl
+
+    def _store_local(self, cache_key: str, value, ttl=None):
+        if ttl is None:
+            ttl = self._ttl_for(value)
+        with self._lock:
+            self._entries[cache_key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+            stats['hit_rate'] = round((stats['hits'] + stats['shared_hits']) / lookups, 4) if lookups else None
+        return stats
@@ -0,0 +1,209 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class PathIndex:
+    """
+    In-memory map of filename -> storage roots that hold it.
+    Filled by a full scan of every root, then kept fresh by a background thread
+    that rescans only roots whose directory mtime changed.
+    Files missing from the index are checked on disk once and the miss is kept
+    in a bounded negative cache, so repeated lookups of absent files do not
+    stat slow mounts either.
+    """
+
+    def __init__(self, roots: list, rescan_interval=300, negative_cache_size=10000, negative_ttl=60):
+        self.roots = [self._norm(root) for root in roots]
+        self.rescan_interval = rescan_interval
+        self.negative_cache_size = negative_cache_size
+        self.negative_ttl = negative_ttl
+
+        self._locations = {}   # filename -> set of roots
+        self._root_mtimes = {}  # root -> directory mtime at last scan
+        self._negative = OrderedDict()  # (root, filename) -> expiry time
+        self._ready = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {'hits': 0, 'misses': 0, 'probes': 0, 'negative_hits': 0, 'scans': 0, 'last_scan_seconds': 0.0}
+
+    @staticmethod
+    def _norm(path: str) -> str:
+        return os.path.normpath(path)
+
+    @staticmethod
+    def _list_files(root: str) -> list:
+        try:
+            with os.scandir(root) as entries:
+                return [entry.name for entry in entries if entry.is_file()]
+        except OSError as e:
+            logger.warning("Path index: cannot scan %s: %s", root, e)
+            return []
+
+    def start(self):
+        """
+        Runs the initial scan and periodic rescans in a daemon thread.
+        Until the first scan finishes, lookups fall back to probing the filesystem.
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='path-index', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        self.scan()
+        while not self._stop.wait(self.rescan_interval):
+            self.refresh()
+
+    def scan(self):
+        """
+        Rebuilds the index from every root.
+        """
+        self._rescan(self.roots)
+
+    def refresh(self):
+        """
+        Rescans roots whose directory mtime changed since the last scan.
+        """
+        changed = []
+        for root in self.roots:
+            try:
+                mtime = os.stat(root).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime is None or mtime != self._root_mtimes.get(root):
+                changed.append(root)
+        if changed:
+            self._rescan(changed)
+
+    def _rescan(self, roots: list):
+        start = time.monotonic()
+        listings = {}
+        mtimes = {}
+        for root in roots:
+            try:
+                mtimes[root] = os.stat(root).st_mtime_ns
+            except OSError:
+                mtimes[root] = None
+            listings[root] = self._list_files(root)
+
+        with self._lock:
+            locations = {}
+            for filename, holders in self._locations.items():
+                kept = holders.difference(roots)
+                if kept:
+                    locations[filename] = kept
+            for root, names in listings.items():
+                for filename in names:
+                    locations.setdefault(filename, set()).add(root)
+            self._locations = locations
+            self._root_mtimes.update(mtimes)
+            self._negative.clear()
+            self._ready = True
+            self._stats['scans'] += 1
+            self._stats['last_scan_seconds'] = round(time.monotonic() - start, 3)
+
+    def add(self, filename: str, root: str):
+        """
+        Records a file written by this process, e.g. after an upload.
+        """
+        root = self._norm(root)
+        with self._lock:
+            self._locations.setdefault(filename, set()).add(root)
+            self._negative.pop((root, filename), None)
+
+    def discard(self, filename: str, root: str):
+        root = self._norm(root)
+        with self._lock:
+            holders = self._locations.get(filename)
+            if holders:
+                holders.discard(root)
+                if not holders:
+                    del self._locations[filename]
+
+    def find(self, filename: str, search_paths: list):
+        """
+        Returns the full path of filename in the first search path that holds it, or None.
+        Only bare file names are looked up; anything with a directory part is None.
+        """
+        if filename in ('', '.', '..') or '/' in filename or '\\' in filename:
+            return None
+        if not self._ready:
+            return self._probe_all(filename, search_paths)
+
+        holders = self._locations.get(filename, ())
+        unverified = []
+        for path in search_paths:
+            root = self._norm(path)
+            if root not in self._root_mtimes:
+                # Not an indexed root (e.g. a path only known to the DB)
+                full_path = os.path.join(path, filename)
+                if self._probe(full_path):
+                    return full_path
+            elif root in holders:
+                with self._lock:
+                    self._stats['hits'] += 1
+                return os.path.join(path, filename)
+            else:
+                unverified.append((path, root))
+
+        # The file may have been written since the last scan: check each root once
+        for path, root in unverified:
+            if self._negative_hit(root, filename):
+                continue
+            full_path = os.path.join(path, filename)
+            if self._probe(full_path):
+                self.add(filename, root)
+                return full_path
+            self._remember_miss(root, filename)
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def _probe_all(self, filename: str, search_paths: list):
+        for path in search_paths:
+            full_path = os.path.join(path, filename)
+            if self._probe(full_path):
+                return full_path
+        return None
+
+    def _probe(self, full_path: str) -> bool:
+        with self._lock:
+            self._stats['probes'] += 1
+        return os.path.exists(full_path)
+
+    def _negative_hit(self, root: str, filename: str) -> bool:
+        key = (root, filename)
+        with self._lock:
+            expires = self._negative.get(key)
+            if expires is None:
+                return False
+            if expires < time.monotonic():
+                del self._negative[key]
+                return False
+            self._stats['negative_hits'] += 1
+            return True
+
+    def _remember_miss(self, root: str, filename: str):
+        with self._lock:
+            self._negative[(root, filename)] = time.monotonic() + self.negative_ttl
+            self._negative.move_to_end((root, filename))
+            while len(self._negative) > self.negative_cache_size:
+                self._negative.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['ready'] = self._ready
+            stats['files'] = len(self._locations)
+            stats['negative_entries'] = len(self._negative)
+        return stats
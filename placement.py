@@ -0,0 +1,177 @@
+import os
+import random
+import shutil
+import threading
+import time
+from collections import deque
+
+# name -> strategy(engine, candidates) returning the chosen VolumeSample
+STRATEGIES = {}
+
+
+def register_strategy(name: str):
+    """
+    Decorator adding a placement strategy under `name`.
+    A strategy receives the engine and the list of eligible VolumeSample objects.
+    """
+    def decorator(fn):
+        STRATEGIES[name] = fn
+        return fn
+    return decorator
+
+
+class VolumeSample:
+
+    def __init__(self, root: str, free_bytes=0, total_bytes=0, healthy=False, error=None):
+        self.root = root
+        self.free_bytes = free_bytes
+        self.total_bytes = total_bytes
+        self.healthy = healthy
+        self.error = error
+        self.sampled = time.monotonic()
+
+    @property
+    def free_ratio(self) -> float:
+        return self.free_bytes / self.total_bytes if self.total_bytes else 0.0
+
+
+class PlacementEngine:
+    """
+    Picks the storage root for new uploads.
+    Volumes that are missing, not writable, or below min_free_bytes / min_free_ratio
+    are excluded; the configured strategy chooses among the rest.
+    Disk usage samples are cached for stat_ttl seconds so uploads do not stat
+    every mount on each request.
+    """
+
+    def __init__(self, strategy='most_free', min_free_bytes=0, min_free_ratio=0.0, stat_ttl=10,
+                 write_window=300, weights=None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown placement strategy: {strategy}")
+        self.strategy = strategy
+        self.min_free_bytes = min_free_bytes
+        self.min_free_ratio = min_free_ratio
+        self.stat_ttl = stat_ttl
+        self.write_window = write_window
+        self.weights = {os.path.normpath(root): weight for root, weight in (weights or {}).items()}
+
+        self._samples = {}  # root -> VolumeSample
+        self._writes = {}   # root -> deque of (time, bytes)
+        self._chosen = {}   # root -> placements
+        self._rr_current = {}  # smooth weighted round robin state
+        self._lock = threading.Lock()
+
+    def choose(self, roots: list):
+        """
+        Returns the root to write to, or None if no volume is eligible.
+        """
+        candidates = [sample for sample in (self._sample(root) for root in roots) if self._eligible(sample)]
+        if not candidates:
+            return None
+        with self._lock:
+            chosen = STRATEGIES[self.strategy](self, candidates)
+            self._chosen[chosen.root] = self._chosen.get(chosen.root, 0) + 1
+        return chosen.root
+
+    def record_write(self, root: str, nbytes: int):
+        """
+        Accounts bytes written to a root; used by least_recent_write and for metrics.
+        """
+        now = time.monotonic()
+        with self._lock:
+            writes = self._writes.setdefault(root, deque())
+            writes.append((now, nbytes))
+            self._trim(writes, now)
+            sample = self._samples.get(root)
+            if sample is not None:
+                # Keep the cached free space roughly right until the next sample
+                sample.free_bytes = max(0, sample.free_bytes - nbytes)
+
+    def recent_write_bytes(self, root: str) -> int:
+        now = time.monotonic()
+        writes = self._writes.get(root)
+        if not writes:
+            return 0
+        self._trim(writes, now)
+        return sum(nbytes for _, nbytes in writes)
+
+    def _trim(self, writes: deque, now: float):
+        while writes and now - writes[0][0] > self.write_window:
+            writes.popleft()
+
+    def _sample(self, root: str) -> VolumeSample:
+        with self._lock:
+            sample = self._samples.get(root)
+        if sample is not None and time.monotonic() - sample.sampled < self.stat_ttl:
+            return sample
+
+        try:
+            if not os.path.isdir(root):
+                # Never created here: an unmounted mount point would put uploads on the OS disk
+                sample = VolumeSample(root, healthy=False, error="missing")
+            else:
+                usage = shutil.disk_usage(root)
+                if not os.access(root, os.W_OK):
+                    sample = VolumeSample(root, usage.free, usage.total, healthy=False, error="not writable")
+                else:
+                    sample = VolumeSample(root, usage.free, usage.total, healthy=True)
+        except OSError as e:
+            sample = VolumeSample(root, healthy=False, error=str(e))
+
+        with self._lock:
+            self._samples[root] = sample
+        return sample
+
+    def _eligible(self, sample: VolumeSample) -> bool:
+        return (
+            sample.healthy
+            and sample.free_bytes >= self.min_free_bytes
+            and sample.free_ratio >= self.min_free_ratio
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            volumes = {}
+            for root, sample in self._samples.items():
+                volumes[root] = {
+                    "free_bytes": sample.free_bytes,
+                    "total_bytes": sample.total_bytes,
+                    "healthy": sample.healthy,
+                    "eligible": self._eligible(sample),
+                    "error": sample.error,
+                    "recent_write_bytes": self.recent_write_bytes(root),
+                    "placements": self._chosen.get(root, 0)
+                }
+        return {"strategy": self.strategy, "volumes": volumes}
+
+
+@register_strategy('random')
+def _random(engine, candidates):
+    return random.choice(candidates)
+
+
+@register_strategy('most_free')
+def _most_free(engine, candidates):
+    return max(candidates, key=lambda sample: sample.free_bytes)
+
+
+@register_strategy('least_recent_write')
+def _least_recent_write(engine, candidates):
+    # Ties (e.g. right after startup) go to the volume with more free space
+    return min(candidates, key=lambda sample: (engine.recent_write_bytes(sample.root), -sample.free_bytes))
+
+
+@register_strategy('weighted_round_robin')
+def _weighted_round_robin(engine, candidates):
+    # Smooth weighted round robin: spreads picks evenly in proportion to weight
+    total = 0
+    best = None
+    for sample in candidates:
+        weight = engine.weights.get(os.path.normpath(sample.root), 1)
+        current = engine._rr_current.get(sample.root, 0) + weight
+        engine._rr_current[sample.root] = current
+        total += weight
+        if best is None or current > engine._rr_current[best.root]:
+            best = sample
+    engine._rr_current[best.root] -= total
+    return best
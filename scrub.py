@@ -0,0 +1,272 @@
+"""
+Storage scrubber: checks every surat's files against the checksums recorded at upload.
+
+    python scrub.py --report scrub.jsonl            # full pass
+    python scrub.py --resume --report scrub.jsonl   # continue after the last checkpoint
+    python scrub.py --quick                         # existence and size only, no hashing
+    python scrub.py --backfill                      # record checksums of files that have none
+
+Rows are read in encrip_digest order (run 'python db_check.py migrate' first)
+and their filename lists decrypted in bulk. The files of a batch are checked
+in parallel with one worker per storage root, so each volume is read
+sequentially and no faster than --rate bytes per second. After every batch the
+last digest is written to the checkpoint file, so an interrupted scrub resumes
+there. One report line is written per problem:
+
+    missing        not at the recorded path nor in any other storage root
+    moved          not at the recorded path but in another root (find_files_in_paths fallback)
+    corrupted      size or SHA-256 differs from the checksum recorded at upload
+    unreadable     the file exists but could not be read
+    undecryptable  the row's encrip does not decrypt with SECRET_KEY
+
+Files stored before surat_file existed have no checksum and count as
+'unverified'; content-addressed blobs are checked against their own name.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import mysql.connector
+
+from cas import blob_path, is_blob_entry
+from config import Config
+from db import insert_checksums
+from utils import decrypt_many, entry_name
+
+ROWS_AFTER_SQL = (
+    "SELECT encrip_digest, no_surat, path, encrip FROM surat "
+    "WHERE encrip_digest > %s ORDER BY encrip_digest LIMIT %s"
+)
+CHECKSUMS_SQL = "SELECT encrip_digest, filename, size, sha256 FROM surat_file WHERE encrip_digest IN ({})"
+
+STATUSES = ('ok', 'unverified', 'missing', 'moved', 'corrupted', 'unreadable', 'undecryptable')
+PROBLEMS = ('missing', 'moved', 'corrupted', 'unreadable', 'undecryptable')
+
+
+class Throttle:
+    """
+    Limits reads from one storage root to rate bytes per second (0 = unlimited).
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._next = time.monotonic()
+
+    def consume(self, nbytes: int):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self._next = max(self._next, now) + nbytes / self.rate
+        if self._next > now:
+            time.sleep(self._next - now)
+
+
+def hash_file(path: str, throttle: Throttle, chunk_size: int = 1024 * 1024):
+    """
+    Returns (sha256 hex digest, size) of a file, reading at the throttle's rate.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            size += len(chunk)
+            throttle.consume(len(chunk))
+    return hasher.hexdigest(), size
+
+
+def check_entry(entry, root: str, expected, search_paths: list, throttle: Throttle, quick: bool = False) -> dict:
+    """
+    Checks one encrip entry of a surat stored under root.
+    expected: (size, sha256) recorded at upload, or None.
+    Returns {"status", "file", "path", ...}.
+    """
+    name = entry_name(entry)
+    others = [path for path in search_paths if os.path.normpath(path) != os.path.normpath(root)]
+    if is_blob_entry(entry):
+        # Blobs are deduplicated across roots and named by their own checksum
+        expected = (expected[0] if expected else None, entry['sha256'])
+        path = next((p for p in (blob_path(r, entry['sha256']) for r in [root] + others) if os.path.isfile(p)), None)
+        if path is None:
+            return {"status": "missing", "file": name, "path": blob_path(root, entry['sha256'])}
+    else:
+        path = os.path.join(root, name)
+        if not os.path.isfile(path):
+            found = next((p for p in (os.path.join(r, name) for r in others) if os.path.isfile(p)), None)
+            if found:
+                return {"status": "moved", "file": name, "path": path, "found": found}
+            return {"status": "missing", "file": name, "path": path}
+
+    result = {"file": name, "path": path}
+    try:
+        size = os.path.getsize(path)
+        if expected and expected[0] is not None and size != expected[0]:
+            return dict(result, status="corrupted", reason="size", expected_size=expected[0], size=size)
+        if quick:
+            return dict(result, status="ok" if expected else "unverified")
+        digest, size = hash_file(path, throttle)
+    except OSError as e:
+        return dict(result, status="unreadable", error=str(e))
+
+    if expected is None:
+        return dict(result, status="unverified", size=size, sha256=digest)
+    if digest != expected[1]:
+        return dict(result, status="corrupted", reason="sha256", expected_sha256=expected[1], sha256=digest)
+    return dict(result, status="ok")
+
+
+def load_checksums(cursor, digests: list) -> dict:
+    """
+    Returns {(encrip_digest, filename): (size, sha256)} for the given rows.
+    """
+    if not digests:
+        return {}
+    try:
+        cursor.execute(CHECKSUMS_SQL.format(', '.join(['%s'] * len(digests))), tuple(digests))
+    except Exception as e:
+        # surat_file not created yet: everything is unverified
+        print(f"Cannot read checksums: {e}", file=sys.stderr)
+        return {}
+    return {(digest, filename): (size, sha256) for digest, filename, size, sha256 in cursor.fetchall()}
+
+
+def scrub_batch(rows: list, checksums: dict, secret_key: str, search_paths: list, pool, throttles: dict,
+                rate: float, quick: bool) -> list:
+    """
+    Checks every file of a batch of (encrip_digest, no_surat, path, encrip) rows,
+    one sequential worker per storage root. Returns [(row, result)] in row order.
+    """
+    filename_lists = decrypt_many([row[3] for row in rows], secret_key)
+    slots = []
+    per_root = {}
+    for row, entries in zip(rows, filename_lists):
+        if not entries:
+            slots.append((row, {"status": "undecryptable"}))
+            continue
+        root = row[2] or ''
+        for entry in entries:
+            slots.append((row, None))
+            expected = checksums.get((row[0], entry_name(entry)))
+            per_root.setdefault(os.path.normpath(root), []).append((len(slots) - 1, entry, root, expected))
+
+    def run(root_key, tasks):
+        throttle = throttles.setdefault(root_key, Throttle(rate))
+        return [(i, check_entry(entry, root, expected, search_paths, throttle, quick))
+                for i, entry, root, expected in tasks]
+
+    futures = [pool.submit(run, root_key, tasks) for root_key, tasks in per_root.items()]
+    for future in futures:
+        for i, result in future.result():
+            slots[i] = (slots[i][0], result)
+    return slots
+
+
+def load_checkpoint(path: str):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_checkpoint(path: str, last_digest: str, totals: dict):
+    # Written to a temporary file first so a crash never leaves half a checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"last_digest": last_digest, "totals": totals, "updated": time.time()}, f)
+    os.replace(tmp_path, path)
+
+
+def scrub(conn, report, search_paths: list, secret_key: str, checkpoint: str = None, resume: bool = False,
+          workers: int = 4, rate: float = 0, batch_size: int = 500, quick: bool = False,
+          backfill: bool = False) -> dict:
+    """
+    Scrubs every surat row after the checkpoint and writes problems to report.
+    Returns the totals per status.
+    """
+    state = load_checkpoint(checkpoint) if resume and checkpoint else None
+    last_digest = state['last_digest'] if state else ''
+    totals = dict.fromkeys(STATUSES, 0)
+    if state:
+        totals.update(state['totals'])
+
+    cursor = conn.cursor()
+    throttles = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            cursor.execute(ROWS_AFTER_SQL, (last_digest, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            checksums = load_checksums(cursor, [row[0] for row in rows])
+            results = scrub_batch(rows, checksums, secret_key, search_paths, pool, throttles, rate, quick)
+
+            recorded = []
+            for (digest, no_surat, path, _), result in results:
+                totals[result['status']] += 1
+                if result['status'] in PROBLEMS:
+                    report.write(json.dumps(dict(result, nomor_surat=no_surat, stored_path=path)) + "\n")
+                elif backfill and result['status'] == 'unverified' and 'sha256' in result:
+                    recorded.append((digest, result['file'], result['size'], result['sha256']))
+            if recorded:
+                try:
+                    if insert_checksums(cursor, recorded):
+                        conn.commit()
+                    else:
+                        conn.rollback()
+                        print("Backfill failed, run 'python db_check.py migrate' to create surat_file",
+                              file=sys.stderr)
+                except Exception as e:
+                    # e.g. a deadlock; these rows stay unverified until the next backfill
+                    conn.rollback()
+                    print(f"Backfill of this batch failed: {e}", file=sys.stderr)
+            report.flush()
+
+            last_digest = rows[-1][0]
+            if checkpoint:
+                save_checkpoint(checkpoint, last_digest, totals)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--report', help="append problems here as JSON lines instead of stdout")
+    parser.add_argument('--checkpoint', default=Config.SCRUB_CHECKPOINT, help="progress file")
+    parser.add_argument('--resume', action='store_true', help="continue after the saved checkpoint")
+    parser.add_argument('--workers', type=int, default=len(Config.SEARCH_PATHS) or 1,
+                        help="storage roots checked in parallel")
+    parser.add_argument('--rate', type=float, default=Config.SCRUB_MAX_BYTES_PER_SEC,
+                        help="read limit per storage root in bytes per second, 0 = unlimited")
+    parser.add_argument('--batch-size', type=int, default=Config.SCRUB_BATCH_SIZE, help="rows per checkpoint")
+    parser.add_argument('--quick', action='store_true', help="check existence and size only")
+    parser.add_argument('--backfill', action='store_true', help="record checksums of files that have none")
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(
+        host=Config.MYSQL_HOST,
+        user=Config.MYSQL_USER,
+        password=Config.MYSQL_PASSWORD,
+        database=Config.MYSQL_DB
+    )
+    report = open(args.report, 'a' if args.resume else 'w', encoding='utf-8') if args.report else sys.stdout
+    try:
+        totals = scrub(conn, report, Config.SEARCH_PATHS, Config.SECRET_KEY, checkpoint=args.checkpoint,
+                       resume=args.resume, workers=args.workers, rate=args.rate, batch_size=args.batch_size,
+                       quick=args.quick, backfill=args.backfill)
+    finally:
+        conn.close()
+        if args.report:
+            report.close()
+    print(", ".join(f"{count} {status}" for status, count in totals.items()), file=sys.stderr)
+    sys.exit(1 if any(totals[status] for status in PROBLEMS) else 0)
+
+
+if __name__ == '__main__':
+    main()
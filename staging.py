@@ -0,0 +1,278 @@
+"""
+Lifecycle management for archives in STAGING_DIR.
+
+    python staging.py              # one sweep using Config settings
+    python staging.py --dry-run    # report what would be removed
+
+Archives live in two-character shard subdirectories (ab/secure_files_ab....zip)
+so no single directory grows huge. An archive's mtime is its creation time and
+its atime is its last access: the app touches archives whenever it hands one
+out again, since storage mounts are often noatime. A sweep removes archives idle
+longer than the TTL or older than the max age, then evicts least recently used
+archives until the total size fits the quota.
+
+Batch lists (ab/batch_<sha256>.json) hold the nomor surat of a streamed batch
+download, so its link carries a short name instead of the whole list. They are
+swept like archives.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PREFIX = 'secure_files_'
+BATCH_LIST_PREFIX = 'batch_'
+TEMP_PREFIXES = ('.member_', '.batch_')
+BATCH_LIST_NAME = re.compile(r'^[0-9a-f]{2}/' + BATCH_LIST_PREFIX + r'[0-9a-f]{64}\.json$')
+
+
+def new_archive_name(staging_dir: str) -> str:
+    """
+    Returns a fresh sharded archive name relative to staging_dir ('ab/secure_files_ab...zip')
+    and creates its shard directory.
+    """
+    unique_id = str(uuid.uuid4())
+    shard = unique_id[:2]
+    os.makedirs(os.path.join(staging_dir, shard), exist_ok=True)
+    return f"{shard}/{ARCHIVE_PREFIX}{unique_id}.zip"
+
+
+def archive_path(staging_dir: str, zip_filename: str) -> str:
+    return os.path.join(staging_dir, *zip_filename.split('/'))
+
+
+def save_batch_list(staging_dir: str, no_surats: list) -> str:
+    """
+    Stores a list of nomor surat in staging_dir and returns its name relative to
+    staging_dir. The name is the list's digest, so repeating a batch reuses the file.
+    """
+    data = json.dumps(no_surats, ensure_ascii=False).encode()
+    digest = hashlib.sha256(data).hexdigest()
+    name = f"{digest[:2]}/{BATCH_LIST_PREFIX}{digest}.json"
+    path = archive_path(staging_dir, name)
+    if os.path.exists(path):
+        touch(path)
+        return name
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.batch_', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return name
+
+
+def is_batch_list_name(name) -> bool:
+    return isinstance(name, str) and bool(BATCH_LIST_NAME.match(name))
+
+
+def load_batch_list(staging_dir: str, name: str):
+    """
+    Returns the list stored under name by save_batch_list, or None once it has
+    been swept (or if name is not a batch list name).
+    """
+    if not is_batch_list_name(name):
+        return None
+    path = archive_path(staging_dir, name)
+    try:
+        with open(path, encoding='utf-8') as f:
+            no_surats = json.load(f)
+    except (OSError, ValueError):
+        return None
+    touch(path)
+    return no_surats
+
+
+def touch(path: str):
+    """
+    Records an access to an archive by moving its atime to now (mtime is kept).
+    """
+    try:
+        st = os.stat(path)
+        os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))
+    except OSError:
+        pass
+
+
+class StagingManager:
+    """
+    Expires and evicts staged archives.
+    ttl: seconds since last access after which an archive is removed.
+    max_age: seconds since creation after which an archive is removed regardless of use.
+    quota_bytes: total size budget; least recently used archives go first.
+    min_age: archives younger than this are never evicted for quota, so a link
+             that was just handed out stays valid.
+    """
+
+    def __init__(self, staging_dir: str, ttl=6 * 3600, max_age=48 * 3600, quota_bytes=50 * 1024 ** 3,
+                 min_age=300, interval=300):
+        self.staging_dir = staging_dir
+        self.ttl = ttl
+        self.max_age = max_age
+        self.quota_bytes = quota_bytes
+        self.min_age = min_age
+        self.interval = interval
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {'sweeps': 0, 'expired': 0, 'evicted': 0, 'temp_removed': 0, 'files': 0, 'bytes': 0,
+                       'last_sweep': None}
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='staging-gc', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        # Sweep right away so a restart clears whatever piled up while the app was down
+        while True:
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Staging sweep error")
+            if self._stop.wait(self.interval):
+                return
+
+    def _scan(self):
+        """
+        Returns (archives, temp_files); archives are (path, size, created, last_access)
+        and include batch lists.
+        """
+        archives = []
+        temp_files = []
+        directories = [self.staging_dir]
+        try:
+            with os.scandir(self.staging_dir) as entries:
+                directories += [entry.path for entry in entries if entry.is_dir() and len(entry.name) == 2]
+        except OSError:
+            return archives, temp_files
+
+        for directory in directories:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if not entry.is_file():
+                            continue
+                        st = entry.stat()
+                        if (entry.name.startswith(ARCHIVE_PREFIX) and entry.name.endswith('.zip')
+                                or entry.name.startswith(BATCH_LIST_PREFIX) and entry.name.endswith('.json')):
+                            archives.append((entry.path, st.st_size, st.st_mtime, max(st.st_atime, st.st_mtime)))
+                        elif entry.name.startswith(TEMP_PREFIXES):
+                            temp_files.append((entry.path, st.st_mtime))
+            except OSError:
+                continue
+        return archives, temp_files
+
+    def sweep(self, dry_run: bool = False) -> dict:
+        """
+        Runs one expiry + quota pass. Returns what was (or would be) removed.
+        """
+        now = time.time()
+        archives, temp_files = self._scan()
+        expired = []
+        kept = []
+        for archive in archives:
+            path, size, created, last_access = archive
+            if now - last_access > self.ttl or now - created > self.max_age:
+                expired.append(archive)
+            else:
+                kept.append(archive)
+
+        evicted = []
+        total = sum(archive[1] for archive in kept)
+        if total > self.quota_bytes:
+            for archive in sorted(kept, key=lambda a: a[3]):
+                if total <= self.quota_bytes:
+                    break
+                if now - archive[2] < self.min_age:
+                    continue
+                evicted.append(archive)
+                total -= archive[1]
+
+        # Leftover spool files from interrupted parallel builds
+        stale_temp = [path for path, mtime in temp_files if now - mtime > self.ttl]
+
+        removed_bytes = 0
+        if not dry_run:
+            for path, size, _, _ in expired + evicted:
+                if self._remove(path):
+                    removed_bytes += size
+            for path in stale_temp:
+                self._remove(path)
+
+        result = {
+            'expired': [a[0] for a in expired],
+            'evicted': [a[0] for a in evicted],
+            'temp_removed': stale_temp,
+            'remaining_files': len(archives) - len(expired) - len(evicted),
+            'remaining_bytes': total,
+            'removed_bytes': removed_bytes
+        }
+        if not dry_run:
+            with self._lock:
+                self._stats['sweeps'] += 1
+                self._stats['expired'] += len(expired)
+                self._stats['evicted'] += len(evicted)
+                self._stats['temp_removed'] += len(stale_temp)
+                self._stats['files'] = result['remaining_files']
+                self._stats['bytes'] = total
+                self._stats['last_sweep'] = now
+        return result
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+def main():
+    from config import Config
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dry-run', action='store_true', help="only report what would be removed")
+    args = parser.parse_args()
+
+    manager = StagingManager(
+        Config.STAGING_DIR,
+        ttl=Config.STAGING_TTL,
+        max_age=Config.STAGING_MAX_AGE,
+        quota_bytes=Config.STAGING_QUOTA_BYTES,
+        min_age=Config.STAGING_MIN_AGE
+    )
+    result = manager.sweep(dry_run=args.dry_run)
+    verb = "Would remove" if args.dry_run else "Removed"
+    for path in result['expired']:
+        print(f"{verb} (expired): {path}")
+    for path in result['evicted']:
+        print(f"{verb} (quota): {path}")
+    for path in result['temp_removed']:
+        print(f"{verb} (stale temp file): {path}")
+    print(f"Staging: {result['remaining_files']} archives, {result['remaining_bytes'] / 1024 ** 2:.1f} MiB remaining")
+
+
+if __name__ == '__main__':
+    main()
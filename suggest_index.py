@@ -0,0 +1,190 @@
+import bisect
+import logging
+import math
+import threading
+import time
+from array import array
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text: str) -> str:
+    return ' '.join(text.casefold().split())
+
+
+def trigrams(text: str) -> set:
+    """
+    Trigrams of a normalized string, padded like pg_trgm so short inputs still have some.
+    """
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SuggestIndex:
+    """
+    In-memory search-as-you-type index over no_surat values.
+    Prefix matches come from a sorted array of normalized values (bisect), close
+    matches for typos and partial numbers from trigram postings. The whole set is
+    loaded by a background thread and reloaded periodically, so rows inserted by
+    other workers or bulk_ingest show up; add() makes this process's own
+    uploads visible at once.
+    """
+
+    def __init__(self, load, reload_interval=600, min_similarity=0.5, max_candidates=1000):
+        self.load = load
+        self.reload_interval = reload_interval
+        self.min_similarity = min_similarity
+        self.max_candidates = max_candidates
+
+        self._values = []     # id -> original no_surat
+        self._keys = []       # id -> normalized no_surat
+        self._ids = {}        # normalized value -> id
+        self._sorted = []     # (normalized value, id), sorted
+        self._postings = {}   # trigram -> array of ids, ascending
+        self._loading = None  # values added while a reload is running
+        self._ready = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {'queries': 0, 'loads': 0, 'load_errors': 0, 'last_load_seconds': 0.0}
+
+    def start(self):
+        """
+        Loads the index and reloads it every reload_interval seconds in a daemon thread.
+        Until the first load finishes, suggest() returns no matches.
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='suggest-index', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        self.reload()
+        while not self._stop.wait(self.reload_interval):
+            self.reload()
+
+    def reload(self):
+        """
+        Rebuilds the index from load(). Keeps the current index if loading fails.
+        """
+        start = time.monotonic()
+        with self._lock:
+            self._loading = []
+        try:
+            values = list(self.load())
+        except Exception as e:
+            logger.warning("Suggest index: load failed: %s", e)
+            with self._lock:
+                self._loading = None
+                self._stats['load_errors'] += 1
+            return
+
+        built = {'values': [], 'keys': [], 'ids': {}, 'postings': {}}
+        for value in values:
+            self._insert(built, value)
+        ordered = sorted((key, i) for key, i in built['ids'].items())
+
+        with self._lock:
+            self._values = built['values']
+            self._keys = built['keys']
+            self._ids = built['ids']
+            self._postings = built['postings']
+            self._sorted = ordered
+            # Uploads that finished while the rows were being read
+            for value in self._loading:
+                self._add_locked(value)
+            self._loading = None
+            self._ready = True
+            self._stats['loads'] += 1
+            self._stats['last_load_seconds'] = round(time.monotonic() - start, 3)
+
+    @staticmethod
+    def _insert(built: dict, value):
+        if not value:
+            return None
+        key = normalize(value)
+        if key in built['ids']:
+            return None
+        i = len(built['values'])
+        built['values'].append(value)
+        built['keys'].append(key)
+        built['ids'][key] = i
+        for gram in trigrams(key):
+            built['postings'].setdefault(gram, array('I')).append(i)
+        return key, i
+
+    def add(self, value: str):
+        """
+        Records a no_surat inserted by this process, e.g. after an upload.
+        """
+        with self._lock:
+            if self._loading is not None:
+                self._loading.append(value)
+            self._add_locked(value)
+
+    def _add_locked(self, value: str):
+        built = {'values': self._values, 'keys': self._keys, 'ids': self._ids, 'postings': self._postings}
+        inserted = self._insert(built, value)
+        if inserted:
+            bisect.insort(self._sorted, inserted)
+
+    def suggest(self, query: str, limit: int = 10) -> list:
+        """
+        Returns up to limit no_surat values: prefix matches in sorted order, then
+        the closest trigram matches.
+        """
+        key = normalize(query)
+        if not key or limit <= 0:
+            return []
+        with self._lock:
+            self._stats['queries'] += 1
+            results = self._prefix_matches(key, limit)
+            if len(results) < limit:
+                seen = set(results)
+                results += [i for i in self._fuzzy_matches(key, limit) if i not in seen][:limit - len(results)]
+            return [self._values[i] for i in results]
+
+    def _prefix_matches(self, key: str, limit: int) -> list:
+        start = bisect.bisect_left(self._sorted, (key,))
+        ids = []
+        for candidate, i in self._sorted[start:start + limit]:
+            if not candidate.startswith(key):
+                break
+            ids.append(i)
+        return ids
+
+    def _fuzzy_matches(self, key: str, limit: int) -> list:
+        query_grams = trigrams(key)
+        # A match shares at least `needed` of the query's trigrams, so it appears
+        # in one of the rarest len - needed + 1 postings
+        needed = max(1, math.ceil(self.min_similarity * len(query_grams)))
+        postings = sorted((self._postings.get(gram, ()) for gram in query_grams), key=len)
+        candidates = set()
+        for ids in postings[:len(postings) - needed + 1]:
+            # Very common trigrams are cut to their newest ids to bound the latency
+            candidates.update(ids[-(self.max_candidates - len(candidates)):])
+            if len(candidates) >= self.max_candidates:
+                break
+
+        scored = []
+        for i in candidates:
+            grams = trigrams(self._keys[i])
+            shared = len(query_grams & grams)
+            # How much of the query is found, then how close the whole value is
+            coverage = shared / len(query_grams)
+            if coverage >= self.min_similarity:
+                similarity = shared / (len(query_grams) + len(grams) - shared)
+                scored.append((-coverage, -similarity, self._values[i], i))
+        scored.sort()
+        return [i for *_, i in scored[:limit]]
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['ready'] = self._ready
+            stats['entries'] = len(self._values)
+            stats['trigrams'] = len(self._postings)
+        return stats
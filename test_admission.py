@@ -0,0 +1,176 @@
+import io
+import threading
+import time
+import unittest
+
+import app as app_module
+from admission import ByteBudget, ConcurrencyLimit, RateLimiter
+from app import app
+from app_test_case import AppTestCase
+
+
+class TestLimits(unittest.TestCase):
+
+    def test_token_bucket_allows_burst_then_refills(self):
+        limiter = RateLimiter(rate=100, burst=3)
+        self.assertEqual([limiter.acquire('a') for _ in range(3)], [0, 0, 0])
+        wait = limiter.acquire('a')
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 0.01)
+        # Other clients have their own bucket
+        self.assertEqual(limiter.acquire('b'), 0)
+        time.sleep(0.02)
+        self.assertEqual(limiter.acquire('a'), 0)
+
+    def test_least_recently_seen_clients_are_forgotten(self):
+        limiter = RateLimiter(rate=1, burst=1, max_clients=2)
+        for client in ('a', 'b', 'c'):
+            limiter.acquire(client)
+        self.assertEqual(limiter.stats()['clients'], 2)
+        self.assertEqual(limiter.acquire('a'), 0)
+
+    def test_concurrency_limit_waits_then_gives_up(self):
+        limit = ConcurrencyLimit(1)
+        self.assertTrue(limit.acquire(0))
+        self.assertFalse(limit.acquire(0.01))
+
+        threading.Timer(0.05, limit.release).start()
+        self.assertTrue(limit.acquire(2))
+        limit.release()
+        self.assertEqual(limit.stats()['in_flight'], 0)
+        self.assertEqual(limit.stats()['rejected'], 1)
+
+    def test_byte_budget(self):
+        budget = ByteBudget(100)
+        self.assertTrue(budget.reserve(60))
+        self.assertFalse(budget.reserve(60))
+        budget.release(60)
+        # A body larger than the budget still gets in when nothing else is in flight
+        self.assertTrue(budget.reserve(500))
+        budget.release(500)
+        self.assertEqual(budget.in_flight, 0)
+
+
+class TestAdmissionControl(AppTestCase):
+
+    swapped = AppTestCase.swapped + ('rate_limiter', 'zip_builds', 'upload_budget')
+
+    def setUp(self):
+        super().setUp()
+        self.root, = self.make_roots('files')
+        self.write_files(self.root, {'scan.pdf': b'scan'})
+        self.encrypted_key = self.insert_surat('SK/ADM/1', self.root, ['scan.pdf'])
+        app_module.rate_limiter = RateLimiter(rate=0.5, burst=2)
+        app_module.zip_builds = ConcurrencyLimit(1)
+        app_module.upload_budget = ByteBudget(1024)
+        app.config['ZIP_BUILD_WAIT'] = 0
+
+    def search(self, remote_addr='10.0.0.5'):
+        return self.client.post('/search', json={'filename': 'SK/ADM/1', 'delivery': 'download'},
+                                environ_base={'REMOTE_ADDR': remote_addr})
+
+    def test_client_over_its_rate_gets_429(self):
+        self.assertEqual([self.search().status_code for _ in range(2)], [200, 200])
+        response = self.search()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '2')
+        self.assertIn('error', response.get_json())
+
+        self.assertEqual(self.search('10.0.0.6').status_code, 200)
+        # Local clients are exempt
+        for _ in range(3):
+            self.assertEqual(self.search('127.0.0.1').status_code, 200)
+
+    def test_client_header_identifies_clients_behind_a_proxy(self):
+        app.config['RATE_LIMIT_CLIENT_HEADER'] = 'X-Real-IP'
+
+        def download(client):
+            response = self.client.get('/download', query_string={'key': self.encrypted_key},
+                                       headers={'X-Real-IP': client})
+            response.close()
+            return response.status_code
+
+        # All requests come from the proxy's loopback address
+        self.assertEqual([download('192.0.2.1') for _ in range(3)], [200, 200, 429])
+        self.assertEqual(download('192.0.2.2'), 200)
+
+    def test_saturated_zip_builds_get_503(self):
+        self.assertTrue(app_module.zip_builds.acquire(0))
+        try:
+            response = self.client.post('/search', json={'filename': 'SK/ADM/1'})
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.headers['Retry-After'], str(app.config['BUSY_RETRY_AFTER']))
+            response = self.client.get('/download', query_string={'key': self.encrypted_key})
+            self.assertEqual(response.status_code, 503)
+        finally:
+            app_module.zip_builds.release()
+        self.assertEqual(self.client.post('/search', json={'filename': 'SK/ADM/1'}).status_code, 200)
+
+    def test_local_proxy_names_the_client(self):
+        # nginx on the same host: the peer is loopback, the client is in X-Real-IP
+        def search(headers):
+            return self.client.post('/search', json={'filename': 'SK/ADM/1', 'delivery': 'download'},
+                                    headers=headers, environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code
+
+        self.assertEqual([search({'X-Real-IP': '192.0.2.1'}) for _ in range(3)], [200, 200, 429])
+        self.assertEqual(search({'X-Forwarded-For': '10.0.0.1, 192.0.2.2'}), 200)
+        # A remote peer cannot pick its own bucket
+        for _ in range(2):
+            self.search('10.0.0.7')
+        response = self.client.post('/search', json={'filename': 'SK/ADM/1', 'delivery': 'download'},
+                                    headers={'X-Real-IP': '192.0.2.3'}, environ_base={'REMOTE_ADDR': '10.0.0.7'})
+        self.assertEqual(response.status_code, 429)
+
+    def test_forwarded_for_cannot_be_spoofed(self):
+        # nginx appends the real address after whatever the client sent
+        def search(sent):
+            return self.client.post('/search', json={'filename': 'SK/ADM/1', 'delivery': 'download'},
+                                    headers={'X-Forwarded-For': f'{sent}, 203.0.113.9'},
+                                    environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code
+
+        # Neither an exempt address nor a fresh one per request escapes the limit
+        self.assertEqual([search('127.0.0.1'), search('198.51.100.1'), search('198.51.100.2')], [200, 200, 429])
+        # An exempt address in a header is limited like any other
+        app.config['RATE_LIMIT_CLIENT_HEADER'] = 'X-Real-IP'
+        statuses = [self.client.post('/search', json={'filename': 'SK/ADM/1', 'delivery': 'download'},
+                                     headers={'X-Real-IP': '127.0.0.1'}).status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+    def test_cached_archive_needs_no_build_slot(self):
+        app.config['DELIVERY_MODE'] = 'http'
+        self.assertEqual(self.client.post('/search', json={'filename': 'SK/ADM/1'}).status_code, 200)
+        self.assertTrue(app_module.zip_builds.acquire(0))
+        try:
+            self.assertEqual(self.client.post('/search', json={'filename': 'SK/ADM/1'}).status_code, 200)
+        finally:
+            app_module.zip_builds.release()
+
+    def test_streamed_download_holds_its_slot_until_closed(self):
+        response = self.client.get('/download', query_string={'key': self.encrypted_key})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(app_module.zip_builds.in_flight, 1)
+        response.close()
+        self.assertEqual(app_module.zip_builds.in_flight, 0)
+
+    def test_uploads_beyond_the_byte_budget_get_503(self):
+        self.assertTrue(app_module.upload_budget.reserve(1000))
+        try:
+            response = self.client.post('/upload', data={
+                'nomor_surat': 'SK/ADM/2',
+                'file': [(io.BytesIO(b'x' * 100), 'big.pdf')]
+            }, content_type='multipart/form-data')
+            self.assertEqual(response.status_code, 503)
+            self.assertIn('Retry-After', response.headers)
+        finally:
+            app_module.upload_budget.release(1000)
+
+        response = self.client.post('/upload', data={
+            'nomor_surat': 'SK/ADM/2',
+            'file': [(io.BytesIO(b'x' * 100), 'big.pdf')]
+        }, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(app_module.upload_budget.in_flight, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import io
+import os
+import unittest
+import zipfile
+from urllib.parse import parse_qs, urlsplit
+
+from app import app
+from app_test_case import AppTestCase
+from staging import archive_path
+from utils import decrypt_data, encrypt_data
+
+
+class TestArchiveDownload(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.root, = self.make_roots('files')
+        with open(os.path.join(self.root, 'scan.bin'), 'wb') as f:
+            f.write(os.urandom(64 * 1024))
+        self.insert_surat('SK/ARC/1', self.root, ['scan.bin'])
+
+    def archive_link(self):
+        response = self.client.post('/search', json={'filename': 'SK/ARC/1', 'delivery': 'http'})
+        self.assertEqual(response.status_code, 200)
+        url = response.get_json()['download_url']
+        return url[url.index('/archive'):]
+
+    def test_full_and_resumed_download(self):
+        link = self.archive_link()
+        full = self.client.get(link)
+        self.assertEqual(full.status_code, 200)
+        self.assertEqual(full.headers['Accept-Ranges'], 'bytes')
+        etag = full.headers['ETag']
+        with zipfile.ZipFile(io.BytesIO(full.data)) as zf:
+            self.assertIsNone(zf.testzip())
+
+        # Resume after the first 1000 bytes, as long as the archive is unchanged
+        resumed = self.client.get(link, headers={'Range': 'bytes=1000-', 'If-Range': etag})
+        self.assertEqual(resumed.status_code, 206)
+        self.assertEqual(resumed.data, full.data[1000:])
+        self.assertEqual(resumed.headers['Content-Range'], f'bytes 1000-{len(full.data) - 1}/{len(full.data)}')
+
+        # A stale validator gets the whole archive again
+        stale = self.client.get(link, headers={'Range': 'bytes=1000-', 'If-Range': '"other"'})
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(len(stale.data), len(full.data))
+
+        self.assertEqual(self.client.get(link, headers={'If-None-Match': etag}).status_code, 304)
+
+    def test_repeat_search_reuses_the_staged_archive(self):
+        first, second = self.archive_link(), self.archive_link()
+        self.assertEqual(self.client.get(first).headers['ETag'], self.client.get(second).headers['ETag'])
+
+    def test_expired_archive(self):
+        link = self.archive_link()
+        zip_filename = decrypt_data(parse_qs(urlsplit(link).query)['key'][0], self.key)[0]
+        os.remove(archive_path(self.staging_dir, zip_filename))
+        self.assertEqual(self.client.get(link).status_code, 410)
+
+    def test_invalid_key(self):
+        self.assertEqual(self.client.get('/archive').status_code, 400)
+        self.assertEqual(self.client.get('/archive?key=nope').status_code, 400)
+        # A surat key decrypts fine but names no staged archive
+        surat_key = encrypt_data(['scan.bin'], self.key)
+        self.assertEqual(self.client.get('/archive', query_string={'key': surat_key}).status_code, 400)
+
+    def test_accel_redirect(self):
+        app.config['ARCHIVE_ACCEL_REDIRECT'] = '/_staging/'
+        response = self.client.get(self.archive_link())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['X-Accel-Redirect'].startswith('/_staging/'))
+        self.assertTrue(response.headers['X-Accel-Redirect'].endswith('.zip'))
+        self.assertEqual(response.data, b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
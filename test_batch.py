@@ -0,0 +1,105 @@
+import io
+import json
+import os
+import shutil
+import unittest
+import zipfile
+
+from app import app
+from app_test_case import AppTestCase
+from staging import archive_path
+from utils import encrypt_data, find_files_batch
+
+
+class TestBatchSearch(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.roots = self.make_roots('files1', 'files2')
+        # SK/1 lives in the first root, SK/2 in the second with one file gone missing
+        self.add_surat('SK/1', self.roots[0], {'a.pdf': b'letter one', 'shared.txt': b'one'})
+        self.add_surat('SK/2', self.roots[1], {'shared.txt': b'two'}, missing=['lost.pdf'])
+        self.add_surat('SK/3', self.roots[1], {}, missing=['gone.pdf'])
+
+    def add_surat(self, no_surat, root, files, missing=()):
+        self.write_files(root, files)
+        self.insert_surat(no_surat, root, list(files) + list(missing))
+
+    def test_batch_archive_has_folders_and_manifest(self):
+        response = self.client.post('/search/batch', json={
+            'nomor_surat': ['SK/1', 'SK/2', 'SK/3', 'SK/404', 'SK/1'],
+            'delivery': 'scp'
+        })
+        self.assertEqual(response.status_code, 200)
+        payload = response.get_json()
+        zip_filename = payload['download_command'].split(self.staging_dir + '/')[1].split()[0]
+
+        with zipfile.ZipFile(archive_path(self.staging_dir, zip_filename)) as zf:
+            self.assertEqual(sorted(zf.namelist()), ['MANIFEST.json', 'SK_1/a.pdf', 'SK_1/shared.txt', 'SK_2/shared.txt'])
+            self.assertEqual(zf.read('SK_2/shared.txt'), b'two')
+            manifest = json.loads(zf.read('MANIFEST.json'))
+
+        self.assertEqual(manifest['requested'], 4)
+        self.assertEqual(manifest['found'][1]['missing_files'], ['lost.pdf'])
+        self.assertEqual(
+            [(entry['nomor_surat'], entry['reason']) for entry in manifest['missing']],
+            [('SK/3', 'files_missing'), ('SK/404', 'not_in_database')]
+        )
+
+    def test_batch_download_streams_same_layout(self):
+        response = self.client.post('/search/batch', json={'nomor_surat': ['SK/1', 'SK/2'], 'delivery': 'download'})
+        self.assertEqual(response.status_code, 200)
+        url = response.get_json()['download_url']
+
+        download = self.client.get(url[url.index('/search/batch/download'):])
+        self.assertEqual(download.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(download.data)) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertIn('SK_1/a.pdf', zf.namelist())
+            self.assertIn('MANIFEST.json', zf.namelist())
+
+    def test_download_link_stays_short_at_the_batch_limit(self):
+        limit = app.config['BATCH_MAX_SURAT']
+        numbers = ['SK/1'] + [f'ND-{i:05d}/KEU/III/2024' for i in range(limit - 1)]
+        response = self.client.post('/search/batch', json={'nomor_surat': numbers, 'delivery': 'download'})
+        self.assertEqual(response.status_code, 200)
+        url = response.get_json()['download_url']
+        # gunicorn refuses request lines over limit_request_line (4094 by default)
+        request_line = f"GET {url[url.index('/search/batch/download'):]} HTTP/1.1"
+        self.assertLess(len(request_line), 1024)
+
+        download = self.client.get(url[url.index('/search/batch/download'):])
+        self.assertEqual(download.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(download.data)) as zf:
+            manifest = json.loads(zf.read('MANIFEST.json'))
+        self.assertEqual(manifest['requested'], limit)
+
+    def test_expired_batch_link(self):
+        response = self.client.post('/search/batch', json={'nomor_surat': ['SK/1'], 'delivery': 'download'})
+        url = response.get_json()['download_url']
+        shutil.rmtree(self.staging_dir)
+        self.assertEqual(self.client.get(url[url.index('/search/batch/download'):]).status_code, 410)
+
+    def test_other_signed_tokens_are_not_batch_links(self):
+        # e.g. a surat's encrip key, or a list of numbers
+        for names in (['shared.txt'], ['SK/1', 'SK/2']):
+            token = encrypt_data(names, self.key)
+            download = self.client.get('/search/batch/download', query_string={'key': token})
+            self.assertEqual(download.status_code, 400)
+
+    def test_nothing_found(self):
+        response = self.client.post('/search/batch', json={'nomor_surat': ['SK/404']})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.get_json()['missing'][0]['reason'], 'not_in_database')
+
+    def test_invalid_input(self):
+        self.assertEqual(self.client.post('/search/batch', json={'nomor_surat': 'SK/1'}).status_code, 400)
+        self.assertEqual(self.client.post('/search/batch', json={'nomor_surat': []}).status_code, 400)
+
+    def test_find_files_batch_without_index(self):
+        found = find_files_batch([(['a.pdf', 'nope.pdf'], None), (['shared.txt'], self.roots[1])], self.roots)
+        self.assertEqual(found, [[os.path.join(self.roots[0], 'a.pdf')], [os.path.join(self.roots[1], 'shared.txt')]])
+
+
+if __name__ == '__main__':
+    unittest.main()
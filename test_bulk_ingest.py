@@ -0,0 +1,109 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from cryptography.fernet import Fernet
+
+from bulk_ingest import ingest
+from fake_db import create_database
+from placement import PlacementEngine
+from utils import decrypt_data
+
+
+class TestBulkIngest(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.test_dir, 'files', 'surat')
+        os.makedirs(self.root)
+        self.scans = os.path.join(self.test_dir, 'scans')
+        self.key = Fernet.generate_key().decode()
+        self.conn = create_database(os.path.join(self.test_dir, 'surat.sqlite'))()
+        self.placement = PlacementEngine(min_free_bytes=0, min_free_ratio=0)
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.test_dir)
+
+    def scan(self, relative_path, content):
+        path = os.path.join(self.scans, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def run_ingest(self, items, **kwargs):
+        manifest = os.path.join(self.test_dir, 'manifest.jsonl')
+        with open(manifest, 'w') as f:
+            for item in items:
+                f.write(json.dumps(item) + "\n")
+        report = io.StringIO()
+        totals = ingest(manifest, report, self.conn, self.placement, [self.root], self.key, workers=2,
+                        batch_size=2, **kwargs)
+        return totals, [json.loads(line) for line in report.getvalue().splitlines()]
+
+    def stored(self, no_surat):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT encrip FROM surat WHERE no_surat = %s", (no_surat,))
+        rows = cursor.fetchall()
+        self.assertEqual(len(rows), 1)
+        files = {}
+        for name in decrypt_data(rows[0][0], self.key):
+            with open(os.path.join(self.root, name), 'rb') as f:
+                files[name] = f.read()
+        return files
+
+    def test_same_basename_in_different_surat_is_kept_apart(self):
+        items = [{"nomor_surat": f"SK/{i}", "files": [self.scan(f'{i}/scan.pdf', b'letter %d' % i)]} for i in range(3)]
+        totals, report = self.run_ingest(items)
+        self.assertEqual(totals['ok'], 3)
+        # Copies run concurrently, so which surat gets which suffix varies
+        names = sorted(name for entry in report for name in entry['filenames'])
+        self.assertEqual(names, ['scan.pdf', 'scan_1.pdf', 'scan_2.pdf'])
+        for i in range(3):
+            self.assertEqual(list(self.stored(f'SK/{i}').values()), [b'letter %d' % i])
+
+    def test_failed_insert_removes_only_that_items_files(self):
+        # The database refuses one row in the middle of a batch
+        self.conn.cursor().execute(
+            "CREATE TRIGGER refuse_bad BEFORE INSERT ON surat WHEN NEW.no_surat = 'SK/BAD' "
+            "BEGIN SELECT RAISE(ABORT, 'refused'); END")
+        items = [
+            {"nomor_surat": "SK/1", "files": [self.scan('1/scan.pdf', b'one')]},
+            {"nomor_surat": "SK/BAD", "files": [self.scan('bad/scan.pdf', b'bad'), self.scan('bad/extra.pdf', b'x')]},
+            {"nomor_surat": "SK/3", "files": [self.scan('3/scan.pdf', b'three')]},
+        ]
+        totals, report = self.run_ingest(items)
+        self.assertEqual((totals['ok'], totals['error']), (2, 1))
+        self.assertIn('refused', report[1]['error'])
+
+        kept = {**self.stored('SK/1'), **self.stored('SK/3')}
+        self.assertEqual(sorted(kept.values()), [b'one', b'three'])
+        self.assertEqual(sorted(os.listdir(self.root)), sorted(kept))
+
+    def test_resume_skips_ingested_surat(self):
+        items = [{"nomor_surat": f"SK/{i}", "files": [self.scan(f'{i}/scan.pdf', b'%d' % i)]} for i in range(4)]
+        # An earlier run stopped after the first two items
+        self.run_ingest(items[:2])
+
+        totals, report = self.run_ingest(items, resume=True)
+        self.assertEqual((totals['skipped'], totals['ok']), (2, 2))
+        self.assertEqual([entry['status'] for entry in report], ['skipped', 'skipped', 'ok', 'ok'])
+        self.assertEqual(len(os.listdir(self.root)), 4)
+        self.assertEqual(list(self.stored('SK/0').values()), [b'0'])
+
+    def test_invalid_lines_and_missing_files_are_reported(self):
+        totals, report = self.run_ingest([
+            {"nomor_surat": "SK/1"},
+            {"nomor_surat": "SK/2", "files": [os.path.join(self.scans, 'nope.pdf')]},
+        ])
+        self.assertEqual(totals['error'], 2)
+        self.assertEqual([entry['line'] for entry in report], [1, 2])
+        self.assertEqual(os.listdir(self.root), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+import app as app_module
+from app import app
+from app_test_case import AppTestCase
+from cas import ContentStore
+from staging import archive_path
+from utils import decrypt_data, find_files_in_paths, process_file_retrieval
+
+
+class TestContentStore(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.roots = [os.path.join(self.test_dir, f'files{i}', 'surat') for i in (1, 2)]
+        for root in self.roots:
+            os.makedirs(root)
+        self.store = ContentStore(self.roots)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_identical_content_is_stored_once(self):
+        digest, size, path = self.store.store(io.BytesIO(b'same scan'), self.roots[0])
+        # The second root finds the blob in the first instead of writing it again
+        digest2, _, path2 = self.store.store(io.BytesIO(b'same scan'), self.roots[1])
+        self.assertEqual(digest, digest2)
+        self.assertEqual(path, path2)
+        self.assertEqual(size, 9)
+        self.assertEqual(self.store.refs(digest), 2)
+        self.assertEqual(self.store.stats()['deduplicated'], 1)
+        self.assertEqual(os.listdir(os.path.join(self.roots[1], '.cas', 'tmp')), [])
+
+    def test_gc_removes_only_unreferenced_blobs(self):
+        kept, _, kept_path = self.store.store(io.BytesIO(b'kept'), self.roots[0])
+        dropped, _, dropped_path = self.store.store(io.BytesIO(b'dropped'), self.roots[0])
+        self.store.release(dropped)
+
+        self.assertEqual(self.store.gc(dry_run=True), [dropped_path])
+        self.assertTrue(os.path.exists(dropped_path))
+        self.assertEqual(self.store.gc(), [dropped_path])
+        self.assertFalse(os.path.exists(dropped_path))
+        self.assertTrue(os.path.exists(kept_path))
+        self.assertEqual(self.store.refs(kept), 1)
+
+    def test_upload_racing_gc_keeps_its_content(self):
+        digest, _, path = self.store.store(io.BytesIO(b'scan'), self.roots[0])
+        self.store.release(digest)
+        locate = self.store.locate
+
+        def locate_then_gc(*args, **kwargs):
+            # gc runs between the upload finding the unreferenced blob and referencing it
+            found = locate(*args, **kwargs)
+            self.store.gc()
+            return found
+
+        self.store.locate = locate_then_gc
+        _, _, stored_path = self.store.store(io.BytesIO(b'scan'), self.roots[0])
+        self.store.locate = locate
+
+        self.assertEqual(stored_path, path)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'scan')
+        self.assertEqual(self.store.refs(digest), 1)
+        self.assertEqual(self.store.gc(), [])
+
+    def test_blob_entries_keep_their_names_in_the_zip(self):
+        digest, _, path = self.store.store(io.BytesIO(b'letter'), self.roots[1])
+        found = find_files_in_paths([{'name': 'letter.pdf', 'sha256': digest}], self.roots, store=self.store)
+        self.assertEqual(found, [(path, 'letter.pdf')])
+
+        staging_dir = os.path.join(self.test_dir, 'staging')
+        zip_name = process_file_retrieval(found, staging_dir)
+        with zipfile.ZipFile(archive_path(staging_dir, zip_name)) as zf:
+            self.assertEqual(zf.namelist(), ['letter.pdf'])
+            self.assertEqual(zf.read('letter.pdf'), b'letter')
+
+
+class TestUploadInCasMode(AppTestCase):
+
+    swapped = AppTestCase.swapped + ('content_store',)
+
+    def setUp(self):
+        super().setUp()
+        self.root, = self.make_roots('files')
+        app.config['STORAGE_MODE'] = 'cas'
+        app_module.content_store = ContentStore([self.root])
+
+    def upload(self, nomor_surat, files):
+        return self.client.post('/upload', data={
+            'nomor_surat': nomor_surat,
+            'file': [(io.BytesIO(content), name) for name, content in files]
+        }, content_type='multipart/form-data')
+
+    def test_shared_attachment_is_stored_once_and_retrievable(self):
+        self.assertEqual(self.upload('SK/1', [('a.pdf', b'letter one'), ('lampiran.pdf', b'shared')]).status_code, 200)
+        response = self.upload('SK/2', [('copy of lampiran.pdf', b'shared')])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['filenames'], ['copy_of_lampiran.pdf'])
+        self.assertEqual(app_module.content_store.stats()['roots'][self.root]['blobs'], 2)
+
+        # The encrip lists names with digests, not bare filenames
+        with app_module.db_pool.get() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT encrip FROM surat WHERE no_surat = %s", ('SK/2',))
+            entries = decrypt_data(cursor.fetchone()[0], self.key)
+        self.assertEqual(entries, [{'name': 'copy_of_lampiran.pdf', 'sha256': hashlib.sha256(b'shared').hexdigest()}])
+        self.assertEqual(app_module.content_store.refs(entries[0]['sha256']), 2)
+
+        search = self.client.post('/search', json={'filename': 'SK/2', 'delivery': 'download'})
+        self.assertEqual(search.status_code, 200)
+        self.assertEqual(search.get_json()['original_filenames'], ['copy_of_lampiran.pdf'])
+        url = search.get_json()['download_url']
+        download = self.client.get(url[url.index('/download'):])
+        with zipfile.ZipFile(io.BytesIO(download.data)) as zf:
+            self.assertEqual(zf.read('copy_of_lampiran.pdf'), b'shared')
+
+    def test_names_that_sanitize_alike_are_kept_apart(self):
+        response = self.upload('SK/3', [('a b.pdf', b'first'), ('a_b.pdf', b'second'), ('a b.pdf', b'first')])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['filenames'], ['a_b.pdf', 'a_b_1.pdf', 'a_b_2.pdf'])
+        url = self.client.post('/search', json={'filename': 'SK/3', 'delivery': 'download'}).get_json()['download_url']
+        download = self.client.get(url[url.index('/download'):])
+        with zipfile.ZipFile(io.BytesIO(download.data)) as zf:
+            self.assertEqual([zf.read(name) for name in zf.namelist()], [b'first', b'second', b'first'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from utils import CompressionPolicy, process_file_retrieval
+
+
+class TestCompressionPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.staging_dir = os.path.join(self.test_dir, 'staging')
+        self.scan = self._write('scan.pdf', os.urandom(128 * 1024))
+        self.text = self._write('notes.txt', b'nomor surat perihal lampiran\n' * 4000)
+        self.blob = self._write('export.bin', os.urandom(128 * 1024))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _write(self, name, content):
+        path = os.path.join(self.test_dir, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def test_adaptive_choices(self):
+        policy = CompressionPolicy(store_extensions=['.pdf'], level=3)
+        self.assertEqual(policy.choose(self.scan), (zipfile.ZIP_STORED, None))
+        self.assertEqual(policy.choose(self.text), (zipfile.ZIP_DEFLATED, 3))
+        # Unknown extension, rejected by the sample test
+        self.assertEqual(policy.choose(self.blob), (zipfile.ZIP_STORED, None))
+
+    def test_fixed_modes(self):
+        self.assertEqual(CompressionPolicy('deflate').choose(self.scan)[0], zipfile.ZIP_DEFLATED)
+        self.assertEqual(CompressionPolicy('store').choose(self.text)[0], zipfile.ZIP_STORED)
+        with self.assertRaises(ValueError):
+            CompressionPolicy('brotli')
+
+    def test_archive_uses_per_file_method(self):
+        policy = CompressionPolicy(store_extensions=['.pdf'])
+        zip_filename = process_file_retrieval([self.scan, self.text], self.staging_dir, policy=policy)
+        with zipfile.ZipFile(os.path.join(self.staging_dir, zip_filename)) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.getinfo('scan.pdf').compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(zf.getinfo('notes.txt').compress_type, zipfile.ZIP_DEFLATED)
+
+
+if __name__ == '__main__':
+    unittest.main()
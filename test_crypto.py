@@ -0,0 +1,37 @@
+import unittest
+
+from cryptography.fernet import Fernet
+
+from utils import decrypt_data, decrypt_many, encrypt_data, encrypt_many, get_fernet
+
+
+class TestCrypto(unittest.TestCase):
+
+    def setUp(self):
+        self.key = Fernet.generate_key().decode()
+
+    def test_cipher_is_cached_per_key(self):
+        self.assertIs(get_fernet(self.key), get_fernet(self.key))
+        self.assertIsNot(get_fernet(self.key), get_fernet(Fernet.generate_key().decode()))
+
+    def test_round_trip(self):
+        token = encrypt_data(['a.pdf', 'b.pdf'], self.key)
+        self.assertEqual(decrypt_data(token, self.key), ['a.pdf', 'b.pdf'])
+        self.assertIsNone(decrypt_data('not-a-token', self.key))
+
+    def test_bulk_results_stay_aligned(self):
+        items = [[f"surat_{i}.pdf"] for i in range(25)]
+        tokens = encrypt_many(items, self.key, chunk_size=10)
+        tokens[3] = 'corrupted'
+        results = decrypt_many(tokens, self.key, chunk_size=10)
+        self.assertIsNone(results[3])
+        self.assertEqual(results[:3] + results[4:], items[:3] + items[4:])
+
+    def test_bulk_on_process_pool(self):
+        items = [[f"surat_{i}.pdf"] for i in range(12)]
+        tokens = encrypt_many(items, self.key, workers=2, chunk_size=4)
+        self.assertEqual(decrypt_many(tokens, self.key, workers=2, chunk_size=4), items)
+
+
+if __name__ == '__main__':
+    unittest.main()
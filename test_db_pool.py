@@ -0,0 +1,121 @@
+import threading
+import time
+import unittest
+
+from db import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.healthy = True
+        self.rollbacks = 0
+
+    def ping(self, reconnect=False):
+        if not self.healthy:
+            raise ConnectionError("gone away")
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.opened = []
+
+        def connect():
+            conn = FakeConnection()
+            self.opened.append(conn)
+            return conn
+
+        self.connect = connect
+
+    def test_reuses_released_connection(self):
+        pool = ConnectionPool(self.connect, size=2)
+        with pool.get():
+            pass
+        with pool.get():
+            pass
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(self.opened[0].rollbacks, 2)
+        stats = pool.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['in_use'], 0)
+
+    def test_checkout_timeout(self):
+        pool = ConnectionPool(self.connect, size=1, timeout=0.05)
+        held = pool.get()
+        with self.assertRaises(PoolTimeout):
+            pool.get()
+        held.close()
+        stats = pool.stats()
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['waits'], 1)
+
+    def test_waiter_gets_released_connection(self):
+        pool = ConnectionPool(self.connect, size=1, timeout=2)
+        held = pool.get()
+        threading.Timer(0.05, held.close).start()
+        with pool.get():
+            pass
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(pool.stats()['waits'], 1)
+
+    def test_pre_ping_replaces_dead_connection(self):
+        pool = ConnectionPool(self.connect, size=1)
+        with pool.get():
+            pass
+        self.opened[0].healthy = False
+        with pool.get():
+            pass
+        self.assertEqual(len(self.opened), 2)
+        self.assertTrue(self.opened[0].closed)
+        self.assertEqual(pool.stats()['open'], 1)
+
+    def test_idle_connections_are_recycled(self):
+        pool = ConnectionPool(self.connect, size=1, recycle=0.01)
+        with pool.get():
+            pass
+        time.sleep(0.05)
+        with pool.get():
+            pass
+        self.assertEqual(len(self.opened), 2)
+        self.assertTrue(self.opened[0].closed)
+        self.assertGreaterEqual(pool.stats()['recycled'], 1)
+
+    def test_connect_error_frees_slot(self):
+        def failing():
+            raise ConnectionError("refused")
+
+        pool = ConnectionPool(failing, size=1, timeout=0.05)
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                pool.get()
+        stats = pool.stats()
+        self.assertEqual(stats['errors'], 2)
+        self.assertEqual(stats['open'], 0)
+
+
+    def test_close_all_closes_checked_out_connections_on_release(self):
+        pool = ConnectionPool(self.connect, size=2)
+        with pool.get():
+            pass
+        held = pool.get()
+        pool.close_all()
+        self.assertFalse(held._conn.closed)
+        held.close()
+        self.assertTrue(self.opened[0].closed)
+        self.assertEqual(pool.stats()['open'], 0)
+        # The pool keeps working with fresh connections
+        with pool.get():
+            pass
+        self.assertEqual(len(self.opened), 2)
+        self.assertEqual(pool.stats()['idle'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
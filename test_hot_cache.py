@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from hot_cache import HotFileCache
+from staging import archive_path
+from utils import process_file_retrieval
+
+
+class TestHotFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.slow_root = os.path.join(self.test_dir, 'files3', 'surat')
+        self.fast_root = os.path.join(self.test_dir, 'files1', 'surat')
+        os.makedirs(self.slow_root)
+        os.makedirs(self.fast_root)
+        self.cache_dir = os.path.join(self.test_dir, 'hot')
+        self.staging_dir = os.path.join(self.test_dir, 'staging')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write(self, root, name, content):
+        path = os.path.join(root, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def request(self, cache, paths):
+        with cache.pinned(paths) as members:
+            resolved = [path for path, _ in members]
+        cache.wait()
+        return resolved
+
+    def test_popular_file_is_served_from_local_copy(self):
+        cache = HotFileCache(self.cache_dir, 1024 * 1024, roots=[self.slow_root])
+        path = self.write(self.slow_root, 'scan.pdf', b'letter' * 100)
+
+        self.assertEqual(self.request(cache, [path]), [path])
+        # Second request admits it; the copy is used from the third on
+        self.assertEqual(self.request(cache, [path]), [path])
+        local = self.request(cache, [path])[0]
+        self.assertNotEqual(local, path)
+        self.assertTrue(local.startswith(self.cache_dir))
+        self.assertTrue(local.endswith('.pdf'))
+        self.assertEqual(os.stat(local).st_mtime_ns, os.stat(path).st_mtime_ns)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_changed_source_is_not_served_stale(self):
+        cache = HotFileCache(self.cache_dir, 1024 * 1024, admit_after=1)
+        path = self.write(self.slow_root, 'scan.pdf', b'v1')
+        self.request(cache, [path])
+        self.assertNotEqual(self.request(cache, [path]), [path])
+
+        self.write(self.slow_root, 'scan.pdf', b'version 2')
+        self.assertEqual(self.request(cache, [path]), [path])
+        self.assertEqual(cache.stats()['stale'], 1)
+
+    def test_only_configured_roots_are_cached(self):
+        cache = HotFileCache(self.cache_dir, 1024 * 1024, roots=[self.slow_root], admit_after=1)
+        path = self.write(self.fast_root, 'local.pdf', b'fast')
+        for _ in range(3):
+            self.assertEqual(self.request(cache, [path]), [path])
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_rarely_requested_file_does_not_displace_hot_ones(self):
+        cache = HotFileCache(self.cache_dir, 250, admit_after=1, max_file_bytes=100)
+        hot = [self.write(self.slow_root, f'hot{i}.pdf', bytes(100)) for i in range(2)]
+        for _ in range(3):
+            self.request(cache, hot)
+        self.assertEqual(cache.stats()['entries'], 2)
+
+        cold = self.write(self.slow_root, 'cold.pdf', bytes(100))
+        self.assertEqual(self.request(cache, [cold]), [cold])
+        self.assertEqual(cache.stats()['rejected'], 1)
+
+        # Once it is requested more often than a cached file, it replaces the least popular one
+        for _ in range(4):
+            self.request(cache, [cold, hot[1]])
+        self.assertEqual(cache.stats()['evicted'], 1)
+        self.assertNotEqual(self.request(cache, [cold]), [cold])
+        self.assertEqual(self.request(cache, [hot[0]]), [hot[0]])
+
+    def test_restart_adopts_existing_copies(self):
+        cache = HotFileCache(self.cache_dir, 1024 * 1024, admit_after=1)
+        path = self.write(self.slow_root, 'scan.pdf', b'warm')
+        self.request(cache, [path])
+
+        restarted = HotFileCache(self.cache_dir, 1024 * 1024, admit_after=1)
+        self.assertEqual(restarted.stats()['entries'], 1)
+        self.assertNotEqual(self.request(restarted, [path]), [path])
+
+    def test_archive_from_cache_matches_archive_from_source(self):
+        cache = HotFileCache(self.cache_dir, 1024 * 1024, admit_after=1)
+        paths = [self.write(self.slow_root, f'{i}.txt', f'surat {i} '.encode() * 50) for i in range(2)]
+        self.request(cache, paths)
+
+        def members(zip_filename):
+            with zipfile.ZipFile(archive_path(self.staging_dir, zip_filename)) as zf:
+                return [(info.filename, info.date_time, zf.read(info)) for info in zf.infolist()]
+
+        direct = process_file_retrieval(paths, self.staging_dir)
+        cached = process_file_retrieval(paths, self.staging_dir, source_cache=cache)
+        self.assertEqual(members(cached), members(direct))
+        self.assertEqual(cache.stats()['hits'], 2)
+
+    def test_copy_removed_during_build_falls_back_to_source(self):
+        cache = HotFileCache(self.cache_dir, 1024 * 1024, admit_after=1)
+        paths = [self.write(self.slow_root, f'{i}.txt', b'data %d' % i) for i in range(2)]
+        self.request(cache, paths)
+        local = self.request(cache, paths)
+        self.assertTrue(local[1].startswith(self.cache_dir))
+
+        def remove_second_copy(done, total):
+            # Another worker evicting the copy while this build runs
+            if os.path.exists(local[1]):
+                os.remove(local[1])
+
+        zip_filename = process_file_retrieval(paths, self.staging_dir, source_cache=cache,
+                                              progress=remove_second_copy)
+        with zipfile.ZipFile(archive_path(self.staging_dir, zip_filename)) as zf:
+            self.assertEqual(zf.read('1.txt'), b'data 1')
+        self.assertTrue(os.path.exists(paths[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import threading
+import time
+import unittest
+
+from jobs import JobManager
+
+
+class TestJobManager(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = JobManager(workers=2, retention=60)
+
+    def _wait(self, job, timeout=2):
+        deadline = time.time() + timeout
+        while job.to_dict()['status'] in ('queued', 'running') and time.time() < deadline:
+            time.sleep(0.01)
+        return job.to_dict()
+
+    def test_job_reports_result_and_progress(self):
+        def work(job):
+            job.set_progress('zip', 3, 3)
+            return {"download_command": "scp ..."}, 200
+
+        job, created = self.manager.submit('search:SK/1', work)
+        self.assertTrue(created)
+        state = self._wait(job)
+        self.assertEqual(state['status'], 'done')
+        self.assertEqual(state['progress'], {'stage': 'zip', 'done': 3, 'total': 3})
+        self.assertEqual(state['result'], {"download_command": "scp ..."})
+        self.assertIs(self.manager.get(job.id), job)
+
+    def test_same_key_is_deduplicated_while_in_flight(self):
+        release = threading.Event()
+        calls = []
+
+        def work(job):
+            calls.append(1)
+            release.wait(2)
+            return {}, 200
+
+        first, _ = self.manager.submit('search:SK/2', work)
+        second, created = self.manager.submit('search:SK/2', work)
+        self.assertFalse(created)
+        self.assertIs(first, second)
+        release.set()
+        self._wait(first)
+        self.assertEqual(len(calls), 1)
+
+        # Once finished, the same key runs again
+        third, created = self.manager.submit('search:SK/2', work)
+        self.assertTrue(created)
+        self.assertIsNot(third, first)
+        self._wait(third)
+
+    def test_error_status_and_exceptions_fail_the_job(self):
+        not_found, _ = self.manager.submit('a', lambda job: ({"error": "Files not found in storage"}, 404))
+        broken, _ = self.manager.submit('b', lambda job: 1 / 0)
+        self.assertEqual(self._wait(not_found)['error'], "Files not found in storage")
+        self.assertEqual(self._wait(broken)['status'], 'failed')
+        self.assertEqual(self.manager.stats()['failed'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,81 +1,125 @@
 import unittest
 import os
-import shutil
-import tempfile
 from cryptography.fernet import Fernet
 # Import functions to test
-from utils import decrypt_filename, find_file, process_file_retrieval
-from app import app
+import app as app_module
+from app_test_case import AppTestCase
+from db import ConnectionPool, SURAT_INSERT_SQL
+from fake_db import FakeConnection
+from staging import archive_path
+from utils import decrypt_data, encrypt_data, find_files_in_paths, process_file_retrieval
+
+class TestFileRetrieval(AppTestCase):
 
-class TestFileRetrieval(unittest.TestCase):
-    
     def setUp(self):
-        # Create a temporary directory structure for testing
-        self.test_dir = tempfile.mkdtemp()
-        
+        # Temporary directory, key, staging directory and database come from AppTestCase
+        super().setUp()
+
         # Create mock search directories
-        self.dir1 = os.path.join(self.test_dir, 'files', 'surat')
-        self.dir2 = os.path.join(self.test_dir, 'files2', 'surat')
-        os.makedirs(self.dir1)
-        os.makedirs(self.dir2)
-        
-        # Create a staging directory
-        self.staging_dir = os.path.join(self.test_dir, 'home', 'scpkan')
-        
+        self.dir1, self.dir2 = self.make_roots('files', 'files2')
+
         # Create a dummy file in dir2 (simulating it's not in the first path)
         self.filename = "secret_report.pdf"
         self.file_path = os.path.join(self.dir2, self.filename)
         with open(self.file_path, 'w') as f:
             f.write("This is a secret report content.")
-            
-        # Setup Encryption
-        self.key = Fernet.generate_key()
-        self.fernet = Fernet(self.key)
-        self.encrypted_name = self.fernet.encrypt(self.filename.encode())
-        
-        # Configure App for testing
-        app.config['SECRET_KEY'] = self.key
-        app.config['SEARCH_PATHS'] = [self.dir1, self.dir2] # Use our temp dirs
-        app.config['STAGING_DIR'] = self.staging_dir
-        
-        self.app = app.test_client()
-
-    def tearDown(self):
-        # Cleanup
-        shutil.rmtree(self.test_dir)
+
+        # SQLite stand-in for MySQL, holding the surat row of the dummy file
+        self.encrypted_key = self.insert_surat('SK/TEST/001', self.dir2, [self.filename])
+        self.app = self.client
 
     def test_decryption(self):
         # Test if decryption works
-        decrypted = decrypt_filename(self.encrypted_name, self.key)
-        self.assertEqual(decrypted, self.filename)
+        decrypted = decrypt_data(self.encrypted_key, self.key)
+        self.assertEqual(decrypted, [self.filename])
+
+    def test_decryption_wrong_key(self):
+        self.assertIsNone(decrypt_data(self.encrypted_key, Fernet.generate_key().decode()))
 
     def test_find_file(self):
         # Test finding the file
         paths = [self.dir1, self.dir2]
-        found_path = find_file(self.filename, paths)
-        self.assertIsNotNone(found_path)
-        self.assertEqual(found_path, self.file_path)
-        
+        found_paths = find_files_in_paths([self.filename], paths)
+        self.assertEqual(found_paths, [self.file_path])
+
     def test_find_file_not_exist(self):
         # Test finding a non-existent file
-        found_path = find_file("nope.txt", [self.dir1, self.dir2])
-        self.assertIsNone(found_path)
+        found_paths = find_files_in_paths(["nope.txt"], [self.dir1, self.dir2])
+        self.assertEqual(found_paths, [])
 
     def test_process_file(self):
         # Test zipping logic
-        zip_name = process_file_retrieval(self.file_path, self.staging_dir)
+        zip_name = process_file_retrieval([self.file_path], self.staging_dir)
         self.assertIsNotNone(zip_name)
         self.assertTrue(zip_name.endswith('.zip'))
-        self.assertTrue(os.path.exists(os.path.join(self.staging_dir, zip_name)))
+        self.assertTrue(os.path.exists(archive_path(self.staging_dir, zip_name)))
 
     def test_endpoint(self):
         # Test the full endpoint flow
-        response = self.app.get(f'/retrieve?key={self.encrypted_name.decode()}')
+        response = self.app.get('/retrieve', query_string={'key': self.encrypted_key, 'delivery': 'scp'})
         self.assertEqual(response.status_code, 200)
         json_data = response.get_json()
-        self.assertEqual(json_data['original_filename'], self.filename)
-        self.assertIn("scp user@", json_data['download_command'])
-        self.assertIn(".zip", json_data['download_command'])
+        self.assertEqual(json_data['data'], [self.filename])
+        self.assertIn("scp user@", json_data['scp_command'])
+        self.assertIn(".zip", json_data['scp_command'])
+
+    def test_search_endpoint(self):
+        response = self.app.post('/search', json={'filename': 'SK/TEST/001', 'delivery': 'scp'})
+        self.assertEqual(response.status_code, 200)
+        json_data = response.get_json()
+        self.assertEqual(json_data['original_filenames'], [self.filename])
+        self.assertIn(self.staging_dir, json_data['download_command'])
+
+    def test_find_file_ignores_paths(self):
+        traversal = os.path.join('..', '..', 'files2', 'surat', self.filename)
+        self.assertEqual(find_files_in_paths([traversal, self.file_path], [self.dir1]), [])
+
+    def test_search_by_filename(self):
+        response = self.app.post('/search', json={'filename': self.filename, 'delivery': 'download'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['original_filenames'], [self.filename])
+
+    def test_search_rejects_paths_outside_the_roots(self):
+        # No surat row matches, so the query would be used as a filename
+        traversal = os.path.relpath(self.file_path, self.dir1)
+        for name in (traversal, self.file_path, '..'):
+            for delivery in ('download', 'http', 'scp'):
+                response = self.app.post('/search', json={'filename': name, 'delivery': delivery})
+                self.assertEqual(response.status_code, 400, (name, delivery))
+                self.assertNotIn('download_url', response.get_json())
+
+
+class TestUnmigratedDatabase(AppTestCase):
+
+    swapped = AppTestCase.swapped + ('digest_lookup',)
+
+    def setUp(self):
+        super().setUp()
+        # A surat table from before 'db_check.py migrate' added encrip_digest
+        path = os.path.join(self.test_dir, 'legacy.sqlite')
+        conn = FakeConnection(path)
+        conn.cursor().execute("CREATE TABLE surat (id INTEGER PRIMARY KEY, no_surat TEXT, path TEXT, encrip TEXT)")
+        conn.commit()
+        conn.close()
+        app_module.db_pool.close_all()
+        app_module.db_pool = ConnectionPool(lambda: FakeConnection(path), size=2)
+        app_module.digest_lookup = None
+
+        # Stored outside SEARCH_PATHS, so only the database can tell where it is
+        self.make_roots('files')
+        self.archive_root = os.path.join(self.test_dir, 'archive')
+        os.makedirs(self.archive_root)
+        self.write_files(self.archive_root, {'old.pdf': b'old letter'})
+        self.encrypted_key = encrypt_data(['old.pdf'], self.key)
+        with app_module.db_pool.get() as conn:
+            conn.cursor().execute(SURAT_INSERT_SQL, ('SK/OLD/1', self.archive_root, self.encrypted_key))
+            conn.commit()
+
+    def test_key_lookup_falls_back_to_the_encrip_column(self):
+        with self.assertLogs('filedo', 'ERROR'):
+            response = self.client.get('/retrieve', query_string={'key': self.encrypted_key, 'delivery': 'scp'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIs(app_module.digest_lookup, False)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from lookup_cache import LookupCache, SQLiteCacheBackend
+
+
+class TestLookupCache(unittest.TestCase):
+
+    def test_hit_miss_and_invalidate(self):
+        cache = LookupCache()
+        self.assertEqual(cache.get('no_surat', 'SK/1'), (False, None))
+        cache.set('no_surat', 'SK/1', ['token', '/files/surat/'])
+        self.assertEqual(cache.get('no_surat', 'SK/1'), (True, ['token', '/files/surat/']))
+        cache.invalidate('no_surat', 'SK/1')
+        self.assertEqual(cache.get('no_surat', 'SK/1'), (False, None))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_negative_entries_expire_sooner(self):
+        cache = LookupCache(ttl=60, negative_ttl=0.01)
+        cache.set('no_surat', 'SK/2', None)
+        self.assertEqual(cache.get('no_surat', 'SK/2'), (True, None))
+        time.sleep(0.03)
+        self.assertEqual(cache.get('no_surat', 'SK/2'), (False, None))
+
+    def test_lru_bound(self):
+        cache = LookupCache(max_entries=2)
+        for key in ('a', 'b', 'c'):
+            cache.set('encrip', key, key)
+        self.assertFalse(cache.get('encrip', 'a')[0])
+        self.assertEqual(cache.stats()['entries'], 2)
+
+    def test_shared_backend_between_instances(self):
+        test_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(test_dir, 'lookup.sqlite')
+            worker_a = LookupCache(backend=SQLiteCacheBackend(path))
+            worker_b = LookupCache(backend=SQLiteCacheBackend(path))
+            worker_a.set('encrip', 'token', '/files2/surat/')
+            self.assertEqual(worker_b.get('encrip', 'token'), (True, '/files2/surat/'))
+            self.assertEqual(worker_b.stats()['shared_hits'], 1)
+            worker_a.invalidate('encrip', 'token')
+            self.assertFalse(SQLiteCacheBackend(path).get('encrip:token')[0])
+        finally:
+            shutil.rmtree(test_dir)
+
+    def test_shared_hit_keeps_the_remaining_ttl(self):
+        test_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(test_dir, 'lookup.sqlite')
+            worker_a = LookupCache(ttl=0.05, backend=SQLiteCacheBackend(path))
+            worker_b = LookupCache(ttl=60, backend=SQLiteCacheBackend(path))
+            worker_a.set('encrip', 'token', '/files/surat/')
+            time.sleep(0.03)
+            self.assertEqual(worker_b.get('encrip', 'token'), (True, '/files/surat/'))
+            time.sleep(0.03)
+            # The local copy expires with the shared entry, not 60 seconds later
+            self.assertEqual(worker_b.get('encrip', 'token'), (False, None))
+        finally:
+            shutil.rmtree(test_dir)
+
+    def test_expired_rows_are_purged_on_writes(self):
+        test_dir = tempfile.mkdtemp()
+        try:
+            backend = SQLiteCacheBackend(os.path.join(test_dir, 'lookup.sqlite'), purge_every=3)
+            backend.set('old', 1, -1)
+            backend.set('new', 2, 60)
+
+            def rows():
+                return backend._conn().execute("SELECT k FROM lookup_cache ORDER BY k").fetchall()
+            self.assertEqual(rows(), [('new',), ('old',)])
+            backend.set('newer', 3, 60)
+            self.assertEqual(rows(), [('new',), ('newer',)])
+        finally:
+            shutil.rmtree(test_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
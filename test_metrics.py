@@ -0,0 +1,74 @@
+import json
+import logging
+import unittest
+
+from logs import JsonFormatter
+from metrics import Registry, StageTimer
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_counter_and_gauge_exposition(self):
+        registry = Registry()
+        errors = registry.counter('filedo_errors_total', 'Errors by cause', ['cause'])
+        registry.gauge('filedo_free_bytes', 'Free bytes', fn=lambda: 1024)
+        errors.inc(cause='db')
+        errors.inc(2, cause='zip')
+
+        text = registry.render()
+
+        self.assertIn('# TYPE filedo_errors_total counter', text)
+        self.assertIn('filedo_errors_total{cause="db"} 1', text)
+        self.assertIn('filedo_errors_total{cause="zip"} 2', text)
+        self.assertIn('filedo_free_bytes 1024', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        histogram = registry.histogram('filedo_stage_seconds', 'Stage time', ['stage'], buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, stage='zip')
+
+        lines = registry.render().splitlines()
+
+        self.assertIn('filedo_stage_seconds_bucket{stage="zip",le="0.1"} 1', lines)
+        self.assertIn('filedo_stage_seconds_bucket{stage="zip",le="1"} 2', lines)
+        self.assertIn('filedo_stage_seconds_bucket{stage="zip",le="+Inf"} 3', lines)
+        self.assertIn('filedo_stage_seconds_count{stage="zip"} 3', lines)
+        self.assertIn('filedo_stage_seconds_sum{stage="zip"} 5.55', lines)
+
+    def test_wrong_labels_are_rejected(self):
+        counter = Registry().counter('filedo_bytes_total', 'Bytes', ['kind'])
+        with self.assertRaises(ValueError):
+            counter.inc(delivery='scp')
+
+    def test_failing_gauge_does_not_break_scrape(self):
+        registry = Registry()
+        registry.gauge('filedo_broken', 'Raises', fn=lambda: 1 / 0)
+        registry.counter('filedo_ok_total', 'Fine').inc()
+        self.assertIn('filedo_ok_total 1', registry.render())
+
+    def test_stage_timer(self):
+        registry = Registry()
+        histogram = registry.histogram('filedo_stage_seconds', 'Stage time', ['endpoint', 'stage'])
+        timer = StageTimer('search', histogram)
+        with timer.stage('lookup'):
+            pass
+        timer.record('zip', 0.25)
+
+        self.assertEqual(histogram.count(endpoint='search', stage='lookup'), 1)
+        self.assertEqual([name for name, _ in timer.timings], ['lookup', 'zip'])
+        self.assertTrue(timer.server_timing().endswith('zip;dur=250.00'))
+
+    def test_json_log_includes_extra_fields(self):
+        record = logging.LogRecord('filedo', logging.ERROR, __file__, 1, "DB Insert Error: %s", ('timeout',), None)
+        record.nomor_surat = 'SK/001'
+
+        entry = json.loads(JsonFormatter().format(record))
+
+        self.assertEqual(entry['level'], 'error')
+        self.assertEqual(entry['message'], 'DB Insert Error: timeout')
+        self.assertEqual(entry['nomor_surat'], 'SK/001')
+
+
+if __name__ == '__main__':
+    unittest.main()
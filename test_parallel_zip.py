@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import CompressionPolicy, precompressed_writes_supported, process_file_retrieval
+
+
+class TestParallelZip(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.staging_dir = os.path.join(self.test_dir, 'staging')
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.contents = {}
+        self.paths = []
+        for i in range(6):
+            name = f"lampiran_{i}.pdf" if i % 2 else f"lampiran_{i}.txt"
+            content = os.urandom(200 * 1024) if i % 2 else (b"nomor surat %d\n" % i) * 20000
+            path = os.path.join(self.test_dir, name)
+            with open(path, 'wb') as f:
+                f.write(content)
+            self.contents[name] = content
+            self.paths.append(path)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        shutil.rmtree(self.test_dir)
+
+    def test_precompressed_writes_work_on_this_python(self):
+        # Fails when a Python upgrade breaks the zipfile internals the parallel path uses
+        self.assertTrue(precompressed_writes_supported())
+
+    def test_parallel_archive_matches_sources(self):
+        policy = CompressionPolicy(store_extensions=['.pdf'])
+        zip_filename = process_file_retrieval(self.paths, self.staging_dir, policy=policy, executor=self.executor)
+
+        with zipfile.ZipFile(os.path.join(self.staging_dir, zip_filename)) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.namelist(), [os.path.basename(p) for p in self.paths])
+            for name, content in self.contents.items():
+                self.assertEqual(zf.read(name), content)
+            self.assertEqual(zf.getinfo('lampiran_1.pdf').compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(zf.getinfo('lampiran_0.txt').compress_type, zipfile.ZIP_DEFLATED)
+
+        # Spool files are cleaned up, only the archive is left
+        staged = [os.path.relpath(os.path.join(root, name), self.staging_dir).replace(os.sep, '/')
+                  for root, _, names in os.walk(self.staging_dir) for name in names]
+        self.assertEqual(staged, [zip_filename])
+
+    def test_small_bundle_stays_sequential(self):
+        zip_filename = process_file_retrieval(
+            self.paths, self.staging_dir, executor=self.executor, parallel_min_bytes=1024 ** 3
+        )
+        with zipfile.ZipFile(os.path.join(self.staging_dir, zip_filename)) as zf:
+            self.assertIsNone(zf.testzip())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from path_index import PathIndex
+from utils import find_files_in_paths
+
+
+class TestPathIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.dir1 = os.path.join(self.test_dir, 'files', 'surat')
+        self.dir2 = os.path.join(self.test_dir, 'files2', 'surat')
+        os.makedirs(self.dir1)
+        os.makedirs(self.dir2)
+        self._touch(self.dir2, 'secret_report.pdf')
+        self.index = PathIndex([self.dir1, self.dir2], negative_ttl=60)
+        self.index.scan()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def _touch(self, directory, name):
+        with open(os.path.join(directory, name), 'w') as f:
+            f.write("content")
+
+    def test_lookup_does_not_stat(self):
+        with mock.patch('os.path.exists') as exists:
+            found = find_files_in_paths(['secret_report.pdf'], [self.dir1, self.dir2], index=self.index)
+        exists.assert_not_called()
+        self.assertEqual(found, [os.path.join(self.dir2, 'secret_report.pdf')])
+
+    def test_miss_is_cached(self):
+        self.assertIsNone(self.index.find('nope.txt', [self.dir1, self.dir2]))
+        with mock.patch('os.path.exists') as exists:
+            self.assertIsNone(self.index.find('nope.txt', [self.dir1, self.dir2]))
+        exists.assert_not_called()
+        self.assertEqual(self.index.stats()['negative_hits'], 2)
+
+    def test_file_added_after_scan_is_found(self):
+        self._touch(self.dir1, 'late.pdf')
+        self.assertEqual(self.index.find('late.pdf', [self.dir1, self.dir2]), os.path.join(self.dir1, 'late.pdf'))
+
+    def test_refresh_picks_up_changed_roots(self):
+        os.remove(os.path.join(self.dir2, 'secret_report.pdf'))
+        self._touch(self.dir1, 'secret_report.pdf')
+        # Force a visible mtime change regardless of filesystem timestamp granularity
+        os.utime(self.dir2, ns=(0, 0))
+        os.utime(self.dir1, ns=(0, 0))
+        self.index.refresh()
+        self.assertEqual(
+            self.index.find('secret_report.pdf', [self.dir2, self.dir1]),
+            os.path.join(self.dir1, 'secret_report.pdf')
+        )
+
+    def test_discarded_file_is_not_found_before_a_rescan(self):
+        os.remove(os.path.join(self.dir2, 'secret_report.pdf'))
+        self.index.discard('secret_report.pdf', self.dir2)
+        self.assertIsNone(self.index.find('secret_report.pdf', [self.dir1, self.dir2]))
+
+    def test_names_with_a_directory_part_are_not_found(self):
+        traversal = os.path.join('..', '..', 'files2', 'surat', 'secret_report.pdf')
+        self.assertIsNone(self.index.find(traversal, [self.dir1]))
+        self.assertIsNone(self.index.find(os.path.join(self.dir2, 'secret_report.pdf'), [self.dir1]))
+
+    def test_unindexed_path_is_probed(self):
+        other = os.path.join(self.test_dir, 'elsewhere')
+        os.makedirs(other)
+        self._touch(other, 'a.pdf')
+        self.assertEqual(self.index.find('a.pdf', [other]), os.path.join(other, 'a.pdf'))
+
+
+if __name__ == '__main__':
+    unittest.main()
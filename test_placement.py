@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+from collections import Counter, namedtuple
+from unittest import mock
+
+from placement import PlacementEngine
+
+DiskUsage = namedtuple('DiskUsage', 'total used free')
+
+
+class TestPlacementEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.roots = [os.path.join(self.test_dir, name) for name in ('files', 'files2', 'files3')]
+        for root in self.roots:
+            os.makedirs(root)
+        self.free = {self.roots[0]: 50, self.roots[1]: 900, self.roots[2]: 400}
+        patcher = mock.patch('shutil.disk_usage', side_effect=lambda root: DiskUsage(1000, 0, self.free[root]))
+        self.disk_usage = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_most_free(self):
+        engine = PlacementEngine('most_free')
+        self.assertEqual(engine.choose(self.roots), self.roots[1])
+
+    def test_threshold_excludes_full_volumes(self):
+        engine = PlacementEngine('random', min_free_bytes=100)
+        picks = {engine.choose(self.roots) for _ in range(30)}
+        self.assertNotIn(self.roots[0], picks)
+        self.assertFalse(engine.stats()['volumes'][self.roots[0]]['eligible'])
+
+        engine = PlacementEngine('most_free', min_free_ratio=0.95)
+        self.assertIsNone(engine.choose(self.roots))
+
+    def test_samples_are_cached(self):
+        engine = PlacementEngine('most_free', stat_ttl=60)
+        engine.choose(self.roots)
+        engine.choose(self.roots)
+        self.assertEqual(self.disk_usage.call_count, 3)
+
+    def test_least_recent_write(self):
+        engine = PlacementEngine('least_recent_write')
+        engine.record_write(self.roots[1], 10)
+        engine.record_write(self.roots[2], 20)
+        self.assertEqual(engine.choose(self.roots), self.roots[0])
+
+    def test_weighted_round_robin(self):
+        engine = PlacementEngine('weighted_round_robin', weights={self.roots[0]: 1, self.roots[1]: 2, self.roots[2]: 1})
+        picks = Counter(engine.choose(self.roots) for _ in range(40))
+        self.assertEqual(picks, Counter({self.roots[0]: 10, self.roots[1]: 20, self.roots[2]: 10}))
+
+    def test_missing_root_is_skipped_not_created(self):
+        # e.g. a volume that is not mounted
+        missing = os.path.join(self.test_dir, 'files4')
+        self.free[missing] = 10 ** 6
+        engine = PlacementEngine('most_free')
+        self.assertEqual(engine.choose(self.roots + [missing]), self.roots[1])
+        self.assertFalse(os.path.exists(missing))
+        self.assertEqual(engine.stats()['volumes'][missing]['error'], 'missing')
+
+        self.assertIsNone(engine.choose([missing]))
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            PlacementEngine('fastest')
+
+
+if __name__ == '__main__':
+    unittest.main()
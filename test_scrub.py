@@ -0,0 +1,188 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from cryptography.fernet import Fernet
+
+import app as app_module
+from app_test_case import AppTestCase
+from db import SURAT_INSERT_SQL, checksum_rows, insert_checksums
+from fake_db import create_database
+from scrub import Throttle, check_entry, scrub
+from utils import encrypt_data
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class TestScrub(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.roots = [os.path.join(self.test_dir, f'files{i}', 'surat') for i in (1, 2)]
+        for root in self.roots:
+            os.makedirs(root)
+        self.key = Fernet.generate_key().decode()
+        self.connect = create_database(os.path.join(self.test_dir, 'surat.sqlite'))
+        self.conn = self.connect()
+        self.checkpoint = os.path.join(self.test_dir, 'checkpoint.json')
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.test_dir)
+
+    def add_surat(self, no_surat, root, files, recorded=None, on_disk=None):
+        """
+        files: {name: content} recorded at upload; on_disk overrides what is actually stored.
+        """
+        for name, content in (on_disk if on_disk is not None else files).items():
+            with open(os.path.join(root, name), 'wb') as f:
+                f.write(content)
+        encrypted_key = encrypt_data(list(files), self.key)
+        cursor = self.conn.cursor()
+        cursor.execute(SURAT_INSERT_SQL, (no_surat, root, encrypted_key))
+        recorded = files if recorded is None else recorded
+        insert_checksums(cursor, checksum_rows(
+            encrypted_key, [(name, len(content), sha256(content)) for name, content in recorded.items()]))
+        self.conn.commit()
+
+    def run_scrub(self, **kwargs):
+        report = io.StringIO()
+        totals = scrub(self.conn, report, self.roots, self.key, checkpoint=self.checkpoint, **kwargs)
+        return totals, [json.loads(line) for line in report.getvalue().splitlines()]
+
+    def test_reports_missing_moved_and_corrupted_files(self):
+        self.add_surat('SK/OK', self.roots[0], {'ok.pdf': b'fine'})
+        self.add_surat('SK/BAD', self.roots[0], {'flip.pdf': b'original'}, on_disk={'flip.pdf': b'origin4l'})
+        self.add_surat('SK/SHORT', self.roots[0], {'short.pdf': b'complete'}, on_disk={'short.pdf': b'compl'})
+        self.add_surat('SK/GONE', self.roots[1], {'gone.pdf': b'x'}, on_disk={})
+        self.add_surat('SK/MOVED', self.roots[1], {'moved.pdf': b'y'}, on_disk={})
+        with open(os.path.join(self.roots[0], 'moved.pdf'), 'wb') as f:
+            f.write(b'y')
+
+        totals, problems = self.run_scrub()
+        self.assertEqual(totals['ok'], 1)
+        by_surat = {problem['nomor_surat']: problem for problem in problems}
+        self.assertEqual(by_surat['SK/BAD']['reason'], 'sha256')
+        self.assertEqual(by_surat['SK/SHORT']['reason'], 'size')
+        self.assertEqual(by_surat['SK/GONE']['status'], 'missing')
+        self.assertEqual(by_surat['SK/MOVED']['status'], 'moved')
+        self.assertEqual(by_surat['SK/MOVED']['found'], os.path.join(self.roots[0], 'moved.pdf'))
+        self.assertNotIn('SK/OK', by_surat)
+
+    def test_undecryptable_row(self):
+        self.conn.cursor().execute(SURAT_INSERT_SQL, ('SK/KEY', self.roots[0], encrypt_data(['a'], Fernet.generate_key().decode())))
+        self.conn.commit()
+        totals, problems = self.run_scrub()
+        self.assertEqual([p['status'] for p in problems], ['undecryptable'])
+
+    def test_backfill_records_checksums_of_legacy_files(self):
+        self.add_surat('SK/OLD', self.roots[0], {'old.pdf': b'legacy'}, recorded={})
+        totals, _ = self.run_scrub(backfill=True)
+        self.assertEqual(totals['unverified'], 1)
+
+        totals, _ = self.run_scrub()
+        self.assertEqual(totals['ok'], 1)
+        self.assertEqual(totals['unverified'], 0)
+
+    def test_resume_continues_after_the_checkpoint(self):
+        for i in range(5):
+            self.add_surat(f'SK/{i}', self.roots[0], {f'{i}.pdf': b'data'})
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT encrip_digest, no_surat FROM surat ORDER BY encrip_digest")
+        rows = cursor.fetchall()
+        digests = [row[0] for row in rows]
+
+        # As if a scrub was interrupted after the first two rows; one of their files is gone since
+        os.remove(os.path.join(self.roots[0], rows[0][1].split('/')[1] + '.pdf'))
+        with open(self.checkpoint, 'w') as f:
+            json.dump({"last_digest": digests[1], "totals": {"ok": 2}}, f)
+        totals, problems = self.run_scrub(resume=True, batch_size=2)
+        self.assertEqual(totals['ok'], 5)
+        self.assertEqual(problems, [])
+
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f)['last_digest'], digests[-1])
+        totals, _ = self.run_scrub()
+        self.assertEqual(totals['missing'], 1)
+
+    def test_quick_mode_checks_size_only(self):
+        root = self.roots[0]
+        with open(os.path.join(root, 'a.pdf'), 'wb') as f:
+            f.write(b'abcd')
+        throttle = Throttle(0)
+        self.assertEqual(check_entry('a.pdf', root, (4, 'not-hashed'), self.roots, throttle, quick=True)['status'], 'ok')
+        self.assertEqual(check_entry('a.pdf', root, (4, 'not-hashed'), self.roots, throttle)['status'], 'corrupted')
+
+
+class TestUploadRecordsChecksums(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.make_roots('files')
+
+    def test_form_upload(self):
+        response = self.client.post('/upload', data={
+            'nomor_surat': 'SK/SUM/1',
+            'file': [(io.BytesIO(b'scan one'), 'one.pdf'), (io.BytesIO(b'scan two'), 'two.pdf')]
+        }, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+
+        with app_module.db_pool.get() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT filename, size, sha256 FROM surat_file ORDER BY filename")
+            rows = cursor.fetchall()
+        self.assertEqual(rows, [('one.pdf', 8, sha256(b'scan one')), ('two.pdf', 8, sha256(b'scan two'))])
+
+    def test_names_that_sanitize_alike_are_kept_apart(self):
+        response = self.client.post('/upload', data={
+            'nomor_surat': 'SK/SUM/2',
+            'file': [(io.BytesIO(b'first'), 'a b.pdf'), (io.BytesIO(b'second'), 'a_b.pdf')]
+        }, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['filenames'], ['a_b.pdf', 'a_b_1.pdf'])
+
+        with app_module.db_pool.get() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT filename, sha256 FROM surat_file ORDER BY filename")
+            rows = cursor.fetchall()
+        self.assertEqual(rows, [('a_b.pdf', sha256(b'first')), ('a_b_1.pdf', sha256(b'second'))])
+
+    def upload(self, nomor_surat):
+        return self.client.post('/upload', data={
+            'nomor_surat': nomor_surat,
+            'file': [(io.BytesIO(b'scan'), 'scan.pdf')]
+        }, content_type='multipart/form-data')
+
+    def surat_rows(self, nomor_surat):
+        with app_module.db_pool.get() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM surat WHERE no_surat = %s", (nomor_surat,))
+            return cursor.fetchone()[0]
+
+    def test_upload_before_migration_still_stores_the_row(self):
+        with app_module.db_pool.get() as conn:
+            conn.cursor().execute("DROP TABLE surat_file")
+            conn.commit()
+        self.assertEqual(self.upload('SK/SUM/2').status_code, 200)
+        self.assertEqual(self.surat_rows('SK/SUM/2'), 1)
+
+    def test_failed_checksum_insert_fails_the_upload(self):
+        # Stands in for a deadlock, after which MySQL has rolled the transaction back
+        with app_module.db_pool.get() as conn:
+            conn.cursor().execute("CREATE TRIGGER refuse BEFORE INSERT ON surat_file "
+                                  "BEGIN SELECT RAISE(ABORT, 'deadlock'); END")
+            conn.commit()
+        self.assertEqual(self.upload('SK/SUM/3').status_code, 500)
+        self.assertEqual(self.surat_rows('SK/SUM/3'), 0)
+        # The saved file does not outlive the failed upload
+        self.assertEqual(os.listdir(app_module.app.config['SEARCH_PATHS'][0]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from staging import StagingManager, archive_path, load_batch_list, new_archive_name, save_batch_list, touch
+from utils import process_file_retrieval
+from zip_cache import ZipCache
+
+
+class TestStagingManager(unittest.TestCase):
+
+    def setUp(self):
+        self.staging_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.staging_dir)
+
+    def stage(self, size: int, created_ago: float, accessed_ago: float = None) -> str:
+        zip_filename = new_archive_name(self.staging_dir)
+        path = archive_path(self.staging_dir, zip_filename)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        now = time.time()
+        accessed_ago = created_ago if accessed_ago is None else accessed_ago
+        os.utime(path, (now - accessed_ago, now - created_ago))
+        return path
+
+    def test_archives_are_sharded(self):
+        zip_filename = new_archive_name(self.staging_dir)
+        shard, name = zip_filename.split('/')
+        self.assertEqual(len(shard), 2)
+        self.assertTrue(name.startswith('secure_files_' + shard))
+        self.assertTrue(os.path.isdir(os.path.join(self.staging_dir, shard)))
+
+    def test_idle_and_old_archives_expire(self):
+        fresh = self.stage(10, created_ago=60)
+        idle = self.stage(10, created_ago=7200)
+        old_but_used = self.stage(10, created_ago=10 * 3600, accessed_ago=10)
+        manager = StagingManager(self.staging_dir, ttl=3600, max_age=8 * 3600)
+
+        result = manager.sweep()
+
+        self.assertEqual(sorted(result['expired']), sorted([idle, old_but_used]))
+        self.assertTrue(os.path.exists(fresh))
+        self.assertFalse(os.path.exists(idle))
+        self.assertFalse(os.path.exists(old_but_used))
+
+    def test_batch_lists_are_reused_and_expire(self):
+        name = save_batch_list(self.staging_dir, ['SK/1', 'SK/2'])
+        self.assertEqual(save_batch_list(self.staging_dir, ['SK/1', 'SK/2']), name)
+        self.assertEqual(load_batch_list(self.staging_dir, name), ['SK/1', 'SK/2'])
+        self.assertIsNone(load_batch_list(self.staging_dir, '../' + name))
+
+        path = archive_path(self.staging_dir, name)
+        os.utime(path, (time.time() - 7200, time.time() - 7200))
+        result = StagingManager(self.staging_dir, ttl=3600).sweep()
+        self.assertEqual(result['expired'], [path])
+        self.assertIsNone(load_batch_list(self.staging_dir, name))
+
+    def test_quota_evicts_least_recently_used(self):
+        recent = self.stage(100, created_ago=1800, accessed_ago=10)
+        stale = self.stage(100, created_ago=1800, accessed_ago=900)
+        just_built = self.stage(100, created_ago=5)
+        manager = StagingManager(self.staging_dir, ttl=3600, quota_bytes=150, min_age=60)
+
+        result = manager.sweep()
+
+        # just_built is protected by min_age, so two older archives go
+        self.assertEqual(result['evicted'], [stale, recent])
+        self.assertTrue(os.path.exists(just_built))
+        self.assertEqual(manager.stats()['evicted'], 2)
+
+    def test_touch_protects_archive_from_eviction(self):
+        first = self.stage(100, created_ago=1800, accessed_ago=600)
+        second = self.stage(100, created_ago=1800, accessed_ago=300)
+        touch(first)
+        manager = StagingManager(self.staging_dir, ttl=3600, quota_bytes=150)
+
+        self.assertEqual(manager.sweep()['evicted'], [second])
+
+    def test_dry_run_keeps_files(self):
+        idle = self.stage(10, created_ago=7200)
+        manager = StagingManager(self.staging_dir, ttl=3600)
+
+        self.assertEqual(manager.sweep(dry_run=True)['expired'], [idle])
+        self.assertTrue(os.path.exists(idle))
+
+    def test_cache_rebuilds_swept_archive(self):
+        source = os.path.join(self.staging_dir, 'surat.pdf')
+        with open(source, 'w') as f:
+            f.write("content")
+        staging_dir = os.path.join(self.staging_dir, 'staging')
+        cache = ZipCache()
+        first = process_file_retrieval([source], staging_dir, cache=cache)
+        os.utime(archive_path(staging_dir, first), (time.time() - 7200, time.time() - 7200))
+
+        StagingManager(staging_dir, ttl=3600).sweep()
+        second = process_file_retrieval([source], staging_dir, cache=cache)
+
+        self.assertNotEqual(first, second)
+        self.assertTrue(os.path.exists(archive_path(staging_dir, second)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+from utils import CompressionPolicy, stream_zip
+
+
+class TestStreamZip(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.files = []
+        for name, content in [('surat.pdf', os.urandom(300 * 1024)), ('nota.txt', b'isi nota ' * 500)]:
+            path = os.path.join(self.test_dir, name)
+            with open(path, 'wb') as f:
+                f.write(content)
+            self.files.append((path, content))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_stream_produces_valid_archive(self):
+        chunks = list(stream_zip([path for path, _ in self.files], chunk_size=64 * 1024))
+        self.assertGreater(len(chunks), 2)
+
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+            self.assertIsNone(zf.testzip())
+            for path, content in self.files:
+                self.assertEqual(zf.read(os.path.basename(path)), content)
+
+    def test_missing_files_are_skipped(self):
+        paths = [self.files[0][0], os.path.join(self.test_dir, 'hilang.pdf')]
+        data = b"".join(stream_zip(paths))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.assertEqual(zf.namelist(), ['surat.pdf'])
+
+    def test_policy_level_is_applied(self):
+        path = os.path.join(self.test_dir, 'log.txt')
+        with open(path, 'wb') as f:
+            f.write(b''.join(b'%d nomor %x\n' % (i, i * 7919 % 1000003) for i in range(20000)))
+
+        def compressed_size(level):
+            data = b"".join(stream_zip([path], policy=CompressionPolicy(mode='deflate', level=level)))
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                return zf.getinfo('log.txt').compress_size
+        # Fails if ZipFile.open() stops honouring the level set on the ZipInfo
+        self.assertLess(compressed_size(9), compressed_size(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
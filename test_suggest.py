@@ -0,0 +1,85 @@
+import io
+import unittest
+
+import app as app_module
+from app_test_case import AppTestCase
+from db import NO_SURAT_ALL_SQL
+from suggest_index import SuggestIndex
+
+
+NUMBERS = ['SK/2024/001', 'SK/2024/002', 'SK/2024/010', 'SK/2023/001', 'ND-17/KEU/III/2024', 'ND-18/HRD/III/2024']
+
+
+class TestSuggestIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = SuggestIndex(lambda: NUMBERS)
+        self.index.reload()
+
+    def test_prefix_matches_in_order(self):
+        self.assertEqual(self.index.suggest('SK/2024/', 10)[:3], ['SK/2024/001', 'SK/2024/002', 'SK/2024/010'])
+        self.assertEqual(self.index.suggest('sk/2024/00', 2), ['SK/2024/001', 'SK/2024/002'])
+
+    def test_typos_and_partial_numbers(self):
+        self.assertEqual(self.index.suggest('SK/2024/01O', 1), ['SK/2024/010'])
+        self.assertEqual(self.index.suggest('KEU/III', 1), ['ND-17/KEU/III/2024'])
+        self.assertEqual(self.index.suggest('zzzz', 5), [])
+
+    def test_add_is_visible_and_survives_a_running_reload(self):
+        def load():
+            # An upload finishing while the rows are read
+            self.index.add('SK/2025/001')
+            return NUMBERS
+
+        self.index.load = load
+        self.index.reload()
+        self.assertEqual(self.index.suggest('SK/2025', 1), ['SK/2025/001'])
+        self.assertEqual(self.index.stats()['entries'], len(NUMBERS) + 1)
+
+    def test_failed_reload_keeps_the_index(self):
+        def load():
+            raise RuntimeError("database down")
+
+        self.index.load = load
+        self.index.reload()
+        self.assertEqual(self.index.suggest('ND-17', 1), ['ND-17/KEU/III/2024'])
+        self.assertEqual(self.index.stats()['load_errors'], 1)
+
+
+class TestSuggestEndpoint(AppTestCase):
+
+    swapped = AppTestCase.swapped + ('suggest_index',)
+
+    def setUp(self):
+        super().setUp()
+        self.root, = self.make_roots('files')
+        for no_surat in NUMBERS:
+            self.insert_surat(no_surat, self.root, ['scan.pdf'])
+
+        def load():
+            with app_module.db_pool.get() as conn:
+                cursor = conn.cursor()
+                cursor.execute(NO_SURAT_ALL_SQL)
+                return [row[0] for row in cursor.fetchall()]
+
+        app_module.suggest_index = SuggestIndex(load)
+        app_module.suggest_index.reload()
+
+    def test_suggest(self):
+        response = self.client.get('/suggest', query_string={'q': 'SK/2024/', 'limit': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['suggestions'], ['SK/2024/001', 'SK/2024/002'])
+        self.assertEqual(self.client.get('/suggest').get_json()['suggestions'], [])
+
+    def test_upload_updates_the_index(self):
+        response = self.client.post('/upload', data={
+            'nomor_surat': 'SK/2026/777',
+            'file': [(io.BytesIO(b'scan'), 'scan.pdf')]
+        }, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        suggestions = self.client.get('/suggest', query_string={'q': 'sk/2026'}).get_json()['suggestions']
+        self.assertEqual(suggestions[0], 'SK/2026/777')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import app as app_module
+from app_test_case import AppTestCase
+from uploads import UploadConflict, UploadSessionManager
+from utils import decrypt_data, save_stream_to_dir
+
+
+class TestUploads(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.manager = UploadSessionManager(chunk_size=256)
+        self.data = os.urandom(2000)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_save_stream_hashes_and_renames(self):
+        full_path, digest, size = save_stream_to_dir(io.BytesIO(self.data), 'scan 01.pdf', self.test_dir)
+        self.assertEqual(full_path, os.path.join(self.test_dir, 'scan_01.pdf'))
+        self.assertEqual(digest, hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(size, len(self.data))
+        self.assertEqual(os.listdir(self.test_dir), ['scan_01.pdf'])
+
+    def test_chunked_upload_resumes_and_finalizes(self):
+        session = self.manager.create('SK/001', self.test_dir, [{'name': 'scan.pdf', 'size': 2000}])
+        self.manager.write_chunk(session, 0, io.BytesIO(self.data[:700]), start=0, total=2000)
+
+        # A retried chunk that overlaps stored data is rejected with the resume offset
+        with self.assertRaises(UploadConflict) as ctx:
+            self.manager.write_chunk(session, 0, io.BytesIO(self.data[300:900]), start=300, total=2000)
+        self.assertEqual(ctx.exception.received, 700)
+
+        upload = self.manager.write_chunk(session, 0, io.BytesIO(self.data[700:]), start=700, total=2000)
+        self.assertTrue(upload.complete)
+
+        stored = self.manager.finalize(session)
+        self.assertEqual(stored, [{'name': 'scan.pdf', 'size': 2000, 'sha256': hashlib.sha256(self.data).hexdigest()}])
+        with open(os.path.join(self.test_dir, 'scan.pdf'), 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+        # Open until the surat row is saved
+        self.assertIs(self.manager.get(session.id), session)
+        self.manager.close(session)
+        self.assertIsNone(self.manager.get(session.id))
+
+    def test_incomplete_session_cannot_finalize(self):
+        session = self.manager.create('SK/002', self.test_dir, [{'name': 'a.pdf'}, {'name': 'b.pdf'}])
+        self.manager.write_chunk(session, 0, io.BytesIO(b'whole file'))
+        with self.assertRaises(ValueError):
+            self.manager.finalize(session)
+
+    def test_oversized_chunk_is_rejected(self):
+        session = self.manager.create('SK/003', self.test_dir, [{'name': 'a.pdf', 'size': 10}])
+        with self.assertRaises(ValueError):
+            self.manager.write_chunk(session, 0, io.BytesIO(self.data), start=0, total=10)
+
+    def test_chunk_must_match_its_range_length(self):
+        session = self.manager.create('SK/004', self.test_dir, [{'name': 'a.pdf', 'size': 2000}])
+        with self.assertRaises(ValueError):
+            self.manager.write_chunk(session, 0, io.BytesIO(self.data[:500]), start=0, total=2000, length=700)
+        with self.assertRaises(ValueError):
+            self.manager.write_chunk(session, 0, io.BytesIO(self.data[:900]), start=0, total=2000, length=700)
+        # Neither rejected body was kept
+        self.assertEqual(session.files[0].received, 0)
+
+        self.manager.write_chunk(session, 0, io.BytesIO(self.data[:700]), start=0, total=2000, length=700)
+        self.manager.write_chunk(session, 0, io.BytesIO(self.data[700:]), start=700, total=2000, length=1300)
+        stored = self.manager.finalize(session)
+        self.assertEqual(stored[0]['sha256'], hashlib.sha256(self.data).hexdigest())
+
+    def test_finalize_resumes_after_a_failed_move(self):
+        session = self.manager.create('SK/005', self.test_dir, [{'name': 'a.pdf'}, {'name': 'b.pdf'}])
+        self.manager.write_chunk(session, 0, io.BytesIO(b'first'))
+        self.manager.write_chunk(session, 1, io.BytesIO(b'second'))
+        # b.pdf's part file went missing, so its rename fails
+        os.rename(session.files[1].part_path, session.files[1].part_path + '.away')
+        with self.assertRaises(OSError):
+            self.manager.finalize(session)
+        os.rename(session.files[1].part_path + '.away', session.files[1].part_path)
+
+        self.assertEqual([entry['name'] for entry in self.manager.finalize(session)], ['a.pdf', 'b.pdf'])
+        self.assertEqual(sorted(os.listdir(self.test_dir)), ['.uploads', 'a.pdf', 'b.pdf'])
+
+    def test_discard_removes_moved_files_of_an_unrecorded_session(self):
+        removed = []
+        self.manager.on_remove = lambda filename, root: removed.append((filename, root))
+        session = self.manager.create('SK/006', self.test_dir, [{'name': 'a.pdf'}])
+        self.manager.write_chunk(session, 0, io.BytesIO(b'data'))
+        self.manager.finalize(session)
+        self.manager.discard(session)
+        self.assertEqual(os.listdir(self.test_dir), ['.uploads'])
+        self.assertEqual(removed, [('a.pdf', self.test_dir)])
+        self.assertEqual(os.listdir(os.path.join(self.test_dir, '.uploads')), [])
+
+    def test_part_files_left_by_a_restart_are_swept(self):
+        before_restart = UploadSessionManager(ttl=60)
+        orphan = before_restart.create('SK/007', self.test_dir, [{'name': 'a.pdf'}, {'name': 'b.pdf'}])
+        before_restart.write_chunk(orphan, 0, io.BytesIO(b'partial'))
+        self.manager.ttl = 60
+        live = self.manager.create('SK/008', self.test_dir, [{'name': 'c.pdf'}])
+        # Too recent to tell from a session still being written by another worker
+        self.assertEqual(self.manager.sweep_parts([self.test_dir]), [])
+
+        old = time.time() - 120
+        for path in [f.part_path for f in orphan.files + live.files]:
+            os.utime(path, (old, old))
+        self.assertEqual(sorted(self.manager.sweep_parts([self.test_dir])), sorted(f.part_path for f in orphan.files))
+        # This process's own session is left to its ttl
+        self.assertTrue(os.path.exists(live.files[0].part_path))
+
+
+class TestUploadSessionEndpoints(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.root, = self.make_roots('files')
+
+    def start(self, nomor_surat, files):
+        response = self.client.post('/upload/sessions', json={
+            'nomor_surat': nomor_surat,
+            'files': [{'name': name, 'size': len(content)} for name, content in files.items()]
+        })
+        self.assertEqual(response.status_code, 201)
+        session_id = response.get_json()['session_id']
+        for index, content in enumerate(files.values()):
+            response = self.client.put(f'/upload/sessions/{session_id}/files/{index}', data=content,
+                                       headers={'Content-Range': f'bytes 0-{len(content) - 1}/{len(content)}'})
+            self.assertEqual(response.status_code, 200)
+        return session_id
+
+    def test_complete_can_be_retried_after_a_failed_insert(self):
+        session_id = self.start('SK/SES/1', {'scan.pdf': b'scan'})
+        conn = self.connect()
+        conn.cursor().execute("CREATE TRIGGER refuse BEFORE INSERT ON surat BEGIN SELECT RAISE(ABORT, 'down'); END")
+        conn.commit()
+        response = self.client.post(f'/upload/sessions/{session_id}/complete')
+        self.assertEqual(response.status_code, 500)
+        self.assertIsNotNone(app_module.upload_sessions.get(session_id))
+
+        conn.cursor().execute("DROP TRIGGER refuse")
+        conn.commit()
+        response = self.client.post(f'/upload/sessions/{session_id}/complete')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(app_module.upload_sessions.get(session_id))
+        cursor = conn.cursor()
+        cursor.execute("SELECT encrip FROM surat WHERE no_surat = 'SK/SES/1'")
+        row = cursor.fetchall()
+        conn.close()
+        self.assertEqual(decrypt_data(row[0][0], self.key), ['scan.pdf'])
+        with open(os.path.join(self.root, 'scan.pdf'), 'rb') as f:
+            self.assertEqual(f.read(), b'scan')
+
+        # A completed session is gone
+        self.assertEqual(self.client.post(f'/upload/sessions/{session_id}/complete').status_code, 404)
+
+    def test_chunk_shorter_than_its_range_is_rejected(self):
+        response = self.client.post('/upload/sessions', json={'nomor_surat': 'SK/SES/2',
+                                                              'files': [{'name': 'a.pdf', 'size': 10}]})
+        session_id = response.get_json()['session_id']
+        response = self.client.put(f'/upload/sessions/{session_id}/files/0', data=b'12345',
+                                   headers={'Content-Range': 'bytes 0-9/10'})
+        self.assertEqual(response.status_code, 400)
+        status = self.client.get(f'/upload/sessions/{session_id}').get_json()
+        self.assertEqual(status['files'][0]['received'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
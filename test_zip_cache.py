@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from utils import process_file_retrieval
+from zip_cache import ZipCache
+
+
+class TestZipCache(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.staging_dir = os.path.join(self.test_dir, 'staging')
+        self.file_path = os.path.join(self.test_dir, 'surat.pdf')
+        with open(self.file_path, 'w') as f:
+            f.write("original content")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_identical_request_reuses_archive(self):
+        cache = ZipCache()
+        first = process_file_retrieval([self.file_path], self.staging_dir, cache=cache)
+        second = process_file_retrieval([self.file_path], self.staging_dir, cache=cache)
+        self.assertEqual(first, second)
+        self.assertEqual(len(os.listdir(self.staging_dir)), 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_changed_source_invalidates(self):
+        cache = ZipCache()
+        first = process_file_retrieval([self.file_path], self.staging_dir, cache=cache)
+        with open(self.file_path, 'w') as f:
+            f.write("edited content, longer than before")
+        second = process_file_retrieval([self.file_path], self.staging_dir, cache=cache)
+        self.assertNotEqual(first, second)
+
+    def test_deleted_archive_is_rebuilt(self):
+        cache = ZipCache()
+        first = process_file_retrieval([self.file_path], self.staging_dir, cache=cache)
+        os.remove(os.path.join(self.staging_dir, first))
+        second = process_file_retrieval([self.file_path], self.staging_dir, cache=cache)
+        self.assertNotEqual(first, second)
+        self.assertTrue(os.path.exists(os.path.join(self.staging_dir, second)))
+
+    def test_expired_entry_is_rebuilt(self):
+        cache = ZipCache(max_age=0.01)
+        first = process_file_retrieval([self.file_path], self.staging_dir, cache=cache)
+        time.sleep(0.05)
+        second = process_file_retrieval([self.file_path], self.staging_dir, cache=cache)
+        self.assertNotEqual(first, second)
+        # A client may still be fetching the old archive; the staging sweeper removes it
+        self.assertTrue(os.path.exists(os.path.join(self.staging_dir, first)))
+
+    def test_entry_limit_evicts_least_recent(self):
+        other = os.path.join(self.test_dir, 'lampiran.pdf')
+        with open(other, 'w') as f:
+            f.write("attachment")
+        cache = ZipCache(max_entries=1)
+        first = process_file_retrieval([self.file_path], self.staging_dir, cache=cache)
+        process_file_retrieval([other], self.staging_dir, cache=cache)
+        self.assertEqual(cache.stats()['entries'], 1)
+        # Forgotten, not deleted: the first archive was handed out moments ago
+        self.assertTrue(os.path.exists(os.path.join(self.staging_dir, first)))
+        self.assertNotEqual(process_file_retrieval([self.file_path], self.staging_dir, cache=cache), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
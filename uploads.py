@@ -0,0 +1,296 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+from werkzeug.utils import secure_filename
+
+# Part files live in a hidden subdirectory of the storage root: same filesystem,
+# so completion is an atomic rename, and the path index never sees them.
+PARTS_DIRNAME = '.uploads'
+
+
+class UploadConflict(Exception):
+    """Raised when a chunk does not start where the stored data ends."""
+
+    def __init__(self, message: str, received: int):
+        super().__init__(message)
+        self.received = received
+
+
+class UploadFile:
+
+    def __init__(self, name: str, size, part_path: str):
+        self.name = name
+        self.size = size  # declared total size, None until known
+        self.part_path = part_path
+        self.received = 0
+        self.complete = False
+        self.hasher = hashlib.sha256()
+        self.stored = None  # {"name", "size", "sha256"} once moved into place
+
+    def to_dict(self, index: int) -> dict:
+        return {
+            "index": index,
+            "name": self.name,
+            "size": self.size,
+            "received": self.received,
+            "complete": self.complete
+        }
+
+
+class UploadSession:
+    """
+    One resumable upload of several files for a single nomor_surat.
+    All files go to the same storage root, like a regular /upload.
+    """
+
+    def __init__(self, nomor_surat: str, target_dir: str, files: list):
+        self.id = uuid.uuid4().hex
+        self.nomor_surat = nomor_surat
+        self.target_dir = target_dir
+        self.files = files
+        self.updated = time.time()
+        self.store = None  # content store the files were handed to, if any
+        self.closed = False
+        # Reentrant so completion can hold it across finalize() and the row insert
+        self.lock = threading.RLock()
+
+    def to_dict(self) -> dict:
+        return {
+            "session_id": self.id,
+            "nomor_surat": self.nomor_surat,
+            "files": [f.to_dict(i) for i, f in enumerate(self.files)]
+        }
+
+
+class UploadSessionManager:
+    """
+    Keeps resumable upload sessions in memory.
+    Chunks are written straight into a part file under the target storage root
+    and hashed on the way through; completed files are renamed into place.
+    A session stays open until close() is called once its surat row is saved,
+    so a failed completion can be retried. Sessions idle longer than `ttl`
+    seconds are dropped with their part files and any files already moved.
+    Sessions live in memory only, so part files outlive a restart: every
+    sweep_interval seconds the parts directories of `roots` are swept too.
+    on_remove: Optional callback(filename, root) for each moved file discard() deletes.
+    """
+
+    def __init__(self, ttl=24 * 3600, chunk_size=1024 * 1024, on_remove=None, roots=(), sweep_interval=3600):
+        self.ttl = ttl
+        self.chunk_size = chunk_size
+        self.on_remove = on_remove
+        self.roots = list(roots)
+        self.sweep_interval = sweep_interval
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    def create(self, nomor_surat: str, target_dir: str, files: list) -> UploadSession:
+        """
+        files: list of {"name": ..., "size": optional total bytes}.
+        """
+        self._purge()
+        parts_dir = os.path.join(target_dir, PARTS_DIRNAME)
+        os.makedirs(parts_dir, exist_ok=True)
+
+        upload_files = []
+        seen = set()
+        for entry in files:
+            name = secure_filename(entry.get('name') or '')
+            if not name:
+                raise ValueError("Every file needs a valid name")
+            if name in seen:
+                raise ValueError(f"Duplicate file name: {name}")
+            seen.add(name)
+            size = entry.get('size')
+            if size is not None and (not isinstance(size, int) or size < 0):
+                raise ValueError(f"Invalid size for {name}")
+            upload_files.append(UploadFile(name, size, None))
+
+        session = UploadSession(nomor_surat, target_dir, upload_files)
+        for index, upload in enumerate(upload_files):
+            upload.part_path = os.path.join(parts_dir, f"{session.id}_{index}.part")
+            open(upload.part_path, 'wb').close()
+
+        with self._lock:
+            self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str):
+        self._purge()
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def write_chunk(self, session: UploadSession, index: int, stream, start: int = 0, total=None,
+                    length=None) -> UploadFile:
+        """
+        Appends the request body to file `index`, starting at byte `start`.
+        A body sent without a range (total None and start 0) is the whole file.
+        length: bytes the body must carry, from the Content-Range end. A body of
+        any other length is rejected and none of it is kept.
+        """
+        if index < 0 or index >= len(session.files):
+            raise ValueError("Unknown file index")
+
+        with session.lock:
+            upload = session.files[index]
+            if upload.complete:
+                raise UploadConflict("File already complete", upload.received)
+            if start != upload.received:
+                raise UploadConflict(f"Expected chunk starting at byte {upload.received}", upload.received)
+            if total is not None:
+                if upload.size is not None and upload.size != total:
+                    raise ValueError(f"Declared size {upload.size} does not match {total}")
+                upload.size = total
+
+            # A ranged chunk is all or nothing: hash into a copy and count
+            # its bytes only once the whole range has arrived
+            hasher = upload.hasher if length is None else upload.hasher.copy()
+            received = upload.received
+            with open(upload.part_path, 'r+b') as part:
+                # Drop bytes of an interrupted write that were never acknowledged
+                part.truncate(upload.received)
+                part.seek(upload.received)
+                try:
+                    while True:
+                        chunk = stream.read(self.chunk_size)
+                        if not chunk:
+                            break
+                        if upload.size is not None and received + len(chunk) > upload.size:
+                            raise ValueError("Chunk exceeds declared file size")
+                        if length is not None and received + len(chunk) > start + length:
+                            raise ValueError("Chunk is longer than its Content-Range")
+                        part.write(chunk)
+                        hasher.update(chunk)
+                        received += len(chunk)
+                        if length is None:
+                            upload.received = received
+                finally:
+                    part.flush()
+                    os.fsync(part.fileno())
+            if length is not None:
+                if received - start != length:
+                    raise ValueError("Chunk is shorter than its Content-Range")
+                upload.hasher, upload.received = hasher, received
+
+            if upload.size is None and total is None and start == 0:
+                upload.size = upload.received
+            upload.complete = upload.size is not None and upload.received == upload.size
+            session.updated = time.time()
+            return upload
+
+    def finalize(self, session: UploadSession, store=None) -> list:
+        """
+        Renames every completed part into the storage root, or hands it to the
+        content store when one is given. Files moved by an earlier, failed
+        attempt are not moved again. The session stays open; call close() once
+        the surat row is committed.
+        Returns [{"name", "size", "sha256"}]. Raises ValueError if a file is incomplete.
+        """
+        with session.lock:
+            pending = [f.name for f in session.files if not f.complete]
+            if pending:
+                raise ValueError(f"Incomplete files: {pending}")
+            if store is not None:
+                session.store = store
+            results = []
+            for upload in session.files:
+                if upload.stored is None:
+                    digest = upload.hasher.hexdigest()
+                    if session.store is not None:
+                        session.store.adopt(upload.part_path, session.target_dir, digest, upload.size)
+                    else:
+                        os.replace(upload.part_path, os.path.join(session.target_dir, upload.name))
+                    upload.stored = {"name": upload.name, "size": upload.size, "sha256": digest}
+                results.append(upload.stored)
+            session.updated = time.time()
+        return results
+
+    def close(self, session: UploadSession):
+        """
+        Forgets a completed session; its files now belong to the surat row.
+        """
+        with session.lock:
+            session.closed = True
+        with self._lock:
+            self._sessions.pop(session.id, None)
+
+    def discard(self, session: UploadSession):
+        """
+        Drops a session with its part files, and with any files finalize()
+        already moved but no surat row came to reference.
+        """
+        with session.lock:
+            if session.closed:
+                return
+            session.closed = True
+        with self._lock:
+            self._sessions.pop(session.id, None)
+        for upload in session.files:
+            try:
+                if upload.stored is None:
+                    os.remove(upload.part_path)
+                elif session.store is not None:
+                    session.store.release(upload.stored['sha256'], prefer=[session.target_dir])
+                else:
+                    os.remove(os.path.join(session.target_dir, upload.name))
+                    if self.on_remove:
+                        self.on_remove(upload.name, session.target_dir)
+            except OSError:
+                pass
+
+    def _purge(self):
+        cutoff = time.time() - self.ttl
+        now = time.monotonic()
+        with self._lock:
+            expired = [s for s in self._sessions.values() if s.updated < cutoff]
+            sweep = self.roots and now >= self._next_sweep
+            if sweep:
+                self._next_sweep = now + self.sweep_interval
+        for session in expired:
+            self.discard(session)
+        if sweep:
+            self.sweep_parts(self.roots)
+
+    def sweep_parts(self, roots: list) -> list:
+        """
+        Removes part files of sessions this process does not know, e.g. from
+        before a restart, once the newest part of the session is older than ttl.
+        Parts of another worker's session are spared while it is still written to.
+        Returns the removed paths.
+        """
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            live = set(self._sessions)
+        removed = []
+        for root in roots:
+            sessions = {}  # session id -> [(path, mtime)]
+            try:
+                with os.scandir(os.path.join(root, PARTS_DIRNAME)) as entries:
+                    for entry in entries:
+                        if not entry.name.endswith('.part'):
+                            continue
+                        try:
+                            mtime = entry.stat().st_mtime
+                        except OSError:
+                            continue
+                        sessions.setdefault(entry.name.split('_', 1)[0], []).append((entry.path, mtime))
+            except OSError:
+                continue
+            for session_id, parts in sessions.items():
+                if session_id in live or max(mtime for _, mtime in parts) >= cutoff:
+                    continue
+                for path, _ in parts:
+                    try:
+                        os.remove(path)
+                        removed.append(path)
+                    except OSError:
+                        pass
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"active_sessions": len(self._sessions)}
@@ -1,12 +1,53 @@
+import hashlib
+import io
+import logging
 import os
 import shutil
-import uuid
+import tempfile
 import zipfile
 import random
 import json
+import functools
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from werkzeug.utils import secure_filename
 from cryptography.fernet import Fernet
 from config import Config
+from staging import archive_path, new_archive_name, touch
+from cas import blob_path, is_blob_entry
+
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize=8)
+def get_fernet(secret_key) -> Fernet:
+    """
+    Returns the Fernet cipher for secret_key, built once per key and reused.
+    """
+    return Fernet(secret_key.strip())
+
+def _decrypt_with(f: Fernet, encrypted_key):
+    # Verify if it's bytes or string, Fernet expects bytes
+    if isinstance(encrypted_key, str):
+        encrypted_key = encrypted_key.encode()
+    
+    decrypted_bytes = f.decrypt(encrypted_key)
+    decrypted_str = decrypted_bytes.decode()
+    
+    # Try to load as JSON (list of files)
+    try:
+        return json.loads(decrypted_str)
+    except json.JSONDecodeError:
+        # Fallback for legacy single strings (if any exist)
+        return [decrypted_str]
+
+def _encrypt_with(f: Fernet, data) -> str:
+    # Serialize if list
+    if isinstance(data, list):
+        text_to_encrypt = json.dumps(data)
+    else:
+        text_to_encrypt = str(data)
+        
+    return f.encrypt(text_to_encrypt.encode()).decode()
 
 def decrypt_data(encrypted_key: str, secret_key: str):
     """
@@ -14,34 +55,59 @@ def decrypt_data(encrypted_key: str, secret_key: str):
     Returns a Python list of filenames.
     """
     try:
-        f = Fernet(secret_key.strip())
-        # Verify if it's bytes or string, Fernet expects bytes
-        if isinstance(encrypted_key, str):
-            encrypted_key = encrypted_key.encode()
-        
-        decrypted_bytes = f.decrypt(encrypted_key)
-        decrypted_str = decrypted_bytes.decode()
-        
-        # Try to load as JSON (list of files)
-        try:
-            return json.loads(decrypted_str)
-        except json.JSONDecodeError:
-            # Fallback for legacy single strings (if any exist)
-            return [decrypted_str]
-            
+        return _decrypt_with(get_fernet(secret_key), encrypted_key)
     except Exception as e:
-        print(f"Decryption error: {e}")
+        logger.warning("Decryption error: %s", e)
         return None
 
-def find_files_in_paths(filenames: list, search_paths: list) -> list:
+def entry_name(entry) -> str:
+    """
+    Original filename of an encrip entry: a plain filename, or a
+    {"name", "sha256"} entry of a file kept in the content store.
+    """
+    return entry['name'] if isinstance(entry, dict) else entry
+
+def _find_blob(entry: dict, search_paths: list, store=None):
+    # Content-addressed files are found by digest, named by their original name
+    if store is not None:
+        path = store.locate(entry['sha256'], prefer=search_paths)
+    else:
+        path = next((p for p in (blob_path(root, entry['sha256']) for root in search_paths) if os.path.isfile(p)),
+                    None)
+    return (path, entry['name']) if path else None
+
+def is_plain_filename(name) -> bool:
+    """
+    True for a bare file name: no directory part, not '.' or '..'.
+    """
+    return (isinstance(name, str) and name not in ('', '.', '..') and '\0' not in name
+            and '/' not in name and '\\' not in name and os.path.basename(name) == name)
+
+def find_files_in_paths(filenames: list, search_paths: list, index=None, store=None) -> list:
     """
     Searches for files. 
     NOTE: If we trust the DB path, we might not use this iteratively. 
     But this helper can find files if we only have filenames.
+    index: Optional PathIndex answering lookups from memory instead of stat calls.
+    store: Optional ContentStore; {"name", "sha256"} entries are then also found
+           in the other storage roots. They resolve to (blob path, name) pairs.
+    Names that are not bare file names are ignored.
     Returns list of found full paths.
     """
     found_paths = []
     for filename in filenames:
+        if is_blob_entry(filename):
+            member = _find_blob(filename, search_paths, store)
+            if member:
+                found_paths.append(member)
+            continue
+        if not is_plain_filename(filename):
+            continue
+        if index is not None:
+            full_path = index.find(filename, search_paths)
+            if full_path:
+                found_paths.append(full_path)
+            continue
         for path in search_paths:
             full_path = os.path.join(path, filename)
             if os.path.exists(full_path):
@@ -49,45 +115,478 @@ def find_files_in_paths(filenames: list, search_paths: list) -> list:
                 break
     return found_paths
 
-def process_file_retrieval(source_file_paths: list, staging_dir: str) -> str:
+def find_files_batch(groups: list, search_paths: list, index=None, store=None) -> list:
+    """
+    Locates the files of many surat at once.
+    groups: List of (filenames, directory) where directory is the DB path of the
+            surat, or None to search every entry of search_paths.
+    With an index every lookup is answered from memory; without one each involved
+    directory is listed once instead of probing every file in every root.
+    Returns, per group, the list of found full paths.
+    """
+    if index is not None:
+        return [find_files_in_paths(filenames, [directory] if directory else search_paths, index=index, store=store)
+                for filenames, directory in groups]
+
+    listings = {}
+    for filenames, directory in groups:
+        if all(is_blob_entry(filename) for filename in filenames):
+            continue
+        for path in [directory] if directory else search_paths:
+            if path not in listings:
+                try:
+                    listings[path] = set(os.listdir(path))
+                except OSError:
+                    listings[path] = set()
+
+    results = []
+    for filenames, directory in groups:
+        found_paths = []
+        for filename in filenames:
+            if is_blob_entry(filename):
+                member = _find_blob(filename, [directory] if directory else search_paths, store)
+                if member:
+                    found_paths.append(member)
+                continue
+            for path in [directory] if directory else search_paths:
+                if filename in listings[path]:
+                    found_paths.append(os.path.join(path, filename))
+                    break
+        results.append(found_paths)
+    return results
+
+class CompressionPolicy:
+    """
+    Chooses the zip compression method per file.
+    mode: 'adaptive' stores already-compressed files and deflates the rest,
+          'deflate' always deflates, 'store' never compresses.
+    In adaptive mode a file is stored when its extension is in store_extensions
+    or when deflating a sample of sample_bytes saves less than min_saving.
+    """
+    MODES = ('adaptive', 'deflate', 'store')
+
+    def __init__(self, mode='adaptive', level=6, store_extensions=(), sample_bytes=64 * 1024, min_saving=0.05):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown compression mode: {mode}")
+        self.mode = mode
+        self.level = level
+        self.store_extensions = {ext.lower() for ext in store_extensions}
+        self.sample_bytes = sample_bytes
+        self.min_saving = min_saving
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            mode=config['ZIP_COMPRESSION'],
+            level=config['ZIP_COMPRESSLEVEL'],
+            store_extensions=config['ZIP_STORE_EXTENSIONS'],
+            sample_bytes=config['ZIP_SAMPLE_BYTES'],
+            min_saving=config['ZIP_MIN_SAVING']
+        )
+
+    def choose(self, file_path: str):
+        """
+        Returns (compress_type, compresslevel) for a file.
+        """
+        if self.mode == 'store':
+            return zipfile.ZIP_STORED, None
+        if self.mode == 'deflate':
+            return zipfile.ZIP_DEFLATED, self.level
+
+        if os.path.splitext(file_path)[1].lower() in self.store_extensions:
+            return zipfile.ZIP_STORED, None
+        if not self._compresses_well(file_path):
+            return zipfile.ZIP_STORED, None
+        return zipfile.ZIP_DEFLATED, self.level
+
+    def _compresses_well(self, file_path: str) -> bool:
+        try:
+            with open(file_path, 'rb') as f:
+                sample = f.read(self.sample_bytes)
+        except OSError:
+            return True
+        if not sample:
+            return True
+        # Level 1 is enough to tell text-like data from already-compressed data
+        saving = 1 - len(zlib.compress(sample, 1)) / len(sample)
+        return saving >= self.min_saving
+
+def _compression_for(file_path: str, policy):
+    if policy is None:
+        return zipfile.ZIP_DEFLATED, None
+    return policy.choose(file_path)
+
+def archive_member(entry):
+    """
+    Archive sources are a file path, stored under its basename, or a
+    (path, arcname) pair that places the file elsewhere, e.g. in a folder.
+    Returns (path, arcname).
+    """
+    if isinstance(entry, (tuple, list)):
+        return entry[0], entry[1]
+    return entry, os.path.basename(entry)
+
+def process_file_retrieval(source_file_paths: list, staging_dir: str, cache=None, policy=None,
+                           executor=None, parallel_min_bytes: int = 0, progress=None, extra_members=None,
+                           source_cache=None) -> str:
     """
     Zips multiple files into one archive.
-    source_file_paths: List of absolute paths to files.
-    Returns the name of the zip file.
+    source_file_paths: List of absolute paths to files, or (path, arcname) pairs.
+    extra_members: Optional {arcname: bytes} of generated members, e.g. a manifest.
+    cache: Optional ZipCache; an identical, unchanged file set reuses the staged zip.
+    policy: Optional CompressionPolicy; without one every file is deflated.
+    executor: Optional thread pool; members are then compressed concurrently when
+              the bundle has several files totalling at least parallel_min_bytes.
+    progress: Optional callback(done, total) called after each member is written.
+    source_cache: Optional HotFileCache; members are read from its local copies when valid.
+    Returns the zip's name relative to staging_dir, e.g. 'ab/secure_files_ab....zip'.
     """
     if not os.path.exists(staging_dir):
         os.makedirs(staging_dir)
 
-    # Generate a unique name for the zip
-    unique_id = str(uuid.uuid4())
-    zip_filename = f"secure_files_{unique_id}.zip"
-    zip_file_path = os.path.join(staging_dir, zip_filename)
+    def build_from(members):
+        return _build_zip(members, staging_dir, policy, executor, parallel_min_bytes, progress, extra_members)
+
+    def build():
+        if source_cache is None:
+            return build_from(source_file_paths)
+        originals = [archive_member(entry) for entry in source_file_paths]
+        with source_cache.pinned(source_file_paths) as members:
+            zip_filename = build_from(members)
+        if zip_filename is None and members != originals:
+            # A local copy may have been removed by another worker: read the sources
+            zip_filename = build_from(originals)
+        return zip_filename
+
+    key = cache.key_for(source_file_paths, staging_dir, extra_members) if cache is not None else None
+    if key is None:
+        return build()
+
+    with cache.build_lock(key):
+        zip_filename = cached_archive(source_file_paths, staging_dir, cache, extra_members, key=key)
+        if zip_filename:
+            return zip_filename
+
+        zip_filename = build()
+        if zip_filename:
+            cache.put(key, archive_path(staging_dir, zip_filename))
+        return zip_filename
+
+def cached_archive(source_file_paths: list, staging_dir: str, cache, extra_members=None, key=None,
+                   count_miss: bool = True):
+    """
+    Returns the name of an identical, unchanged archive the ZipCache has staged
+    for these files, or None.
+    """
+    if key is None:
+        key = cache.key_for(source_file_paths, staging_dir, extra_members)
+    cached_path = cache.get(key, count_miss) if key is not None else None
+    if not cached_path:
+        return None
+    touch(cached_path)
+    return os.path.relpath(cached_path, staging_dir).replace(os.sep, '/')
+
+def _build_zip(source_file_paths: list, staging_dir: str, policy=None, executor=None, parallel_min_bytes: int = 0,
+               progress=None, extra_members=None) -> str:
+    # Unique name inside a shard subdirectory of the staging dir
+    zip_filename = new_archive_name(staging_dir)
+    zip_file_path = archive_path(staging_dir, zip_filename)
 
     try:
+        existing = [archive_member(entry) for entry in source_file_paths if os.path.exists(archive_member(entry)[0])]
+        if executor is not None and len(existing) > 1 and precompressed_writes_supported() and \
+                sum(os.path.getsize(file_path) for file_path, _ in existing) >= parallel_min_bytes:
+            _write_zip_parallel(zip_file_path, existing, policy, executor, staging_dir, progress, extra_members)
+            return zip_filename
+
         with zipfile.ZipFile(zip_file_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file_path in source_file_paths:
-                if os.path.exists(file_path):
-                    # Keep original filename in zip
-                    arcname = os.path.basename(file_path)
-                    zipf.write(file_path, arcname=arcname)
+            _write_extra_members(zipf, extra_members)
+            for done, (file_path, arcname) in enumerate(existing, 1):
+                compress_type, level = _compression_for(file_path, policy)
+                zipf.write(file_path, arcname=arcname, compress_type=compress_type, compresslevel=level)
+                if progress:
+                    progress(done, len(existing))
         
         return zip_filename
-    except Exception as e:
-        print(f"Error zipping files: {e}")
+    except Exception:
+        logger.exception("Error zipping files")
+        if os.path.exists(zip_file_path):
+            os.remove(zip_file_path)
         return None
 
+def _compress_member(file_path: str, compress_type: int, level, spool_dir: str, chunk_size: int = 1024 * 1024):
+    """
+    Reads (and for deflate, compresses) one file on a worker thread.
+    Deflated output goes to a spool file in spool_dir; stored members are copied
+    from the source at assembly time.
+    Returns (crc, compress_size, file_size, spool_path).
+    """
+    crc = 0
+    file_size = 0
+    compress_size = 0
+    spool_path = None
+    compressor = None
+    spool = None
+    if compress_type == zipfile.ZIP_DEFLATED:
+        # Same raw deflate stream zipfile itself produces
+        compressor = zlib.compressobj(level if level is not None else zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        fd, spool_path = tempfile.mkstemp(prefix='.member_', dir=spool_dir)
+        spool = os.fdopen(fd, 'wb')
+
+    try:
+        with open(file_path, 'rb') as src:
+            while True:
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                file_size += len(chunk)
+                crc = zlib.crc32(chunk, crc)
+                if compressor is not None:
+                    data = compressor.compress(chunk)
+                    compress_size += len(data)
+                    spool.write(data)
+        if compressor is not None:
+            data = compressor.flush()
+            compress_size += len(data)
+            spool.write(data)
+        else:
+            compress_size = file_size
+    except Exception:
+        if spool is not None:
+            spool.close()
+            os.remove(spool_path)
+        raise
+    finally:
+        if spool is not None and not spool.closed:
+            spool.close()
+    return crc, compress_size, file_size, spool_path
+
+def _write_extra_members(zipf, extra_members):
+    for arcname, data in (extra_members or {}).items():
+        zipf.writestr(arcname, data, compress_type=zipfile.ZIP_DEFLATED)
+
+def _write_zip_parallel(zip_file_path: str, source_file_paths: list, policy, executor, spool_dir: str, progress=None,
+                        extra_members=None):
+    """
+    Compresses members concurrently on executor and assembles them, in order, into one zip.
+    zlib releases the GIL, so threads scale with cores.
+    """
+    members = [archive_member(entry) for entry in source_file_paths]
+    methods = [_compression_for(file_path, policy) for file_path, _ in members]
+    futures = [
+        executor.submit(_compress_member, file_path, compress_type, level, spool_dir)
+        for (file_path, _), (compress_type, level) in zip(members, methods)
+    ]
+    try:
+        with zipfile.ZipFile(zip_file_path, 'w') as zipf:
+            _write_extra_members(zipf, extra_members)
+            for done, ((file_path, arcname), (compress_type, _), future) in enumerate(zip(members, methods, futures), 1):
+                crc, compress_size, file_size, spool_path = future.result()
+                try:
+                    zinfo = zipfile.ZipInfo.from_file(file_path, arcname=arcname)
+                    zinfo.compress_type = compress_type
+                    with open(spool_path or file_path, 'rb') as src:
+                        _write_precompressed(zipf, zinfo, crc, compress_size, file_size, src)
+                finally:
+                    if spool_path:
+                        os.remove(spool_path)
+                if progress:
+                    progress(done, len(members))
+    except Exception:
+        for future in futures:
+            if future.cancel():
+                continue
+            try:
+                spool_path = future.result()[3]
+            except Exception:
+                continue
+            if spool_path and os.path.exists(spool_path):
+                os.remove(spool_path)
+        raise
+
+def _write_precompressed(zipf, zinfo: zipfile.ZipInfo, crc: int, compress_size: int, file_size: int, src):
+    zinfo.CRC = crc
+    zinfo.compress_size = compress_size
+    zinfo.file_size = file_size
+
+    # zipfile has no public API for adding already-compressed data: write the local
+    # header and payload ourselves, then register the entry so close() lists it
+    # in the central directory. This relies on ZipFile.fp, filelist, NameToInfo and
+    # start_dir, which precompressed_writes_supported() checks before use.
+    zip64 = file_size > zipfile.ZIP64_LIMIT or compress_size > zipfile.ZIP64_LIMIT
+    zinfo.header_offset = zipf.fp.tell()
+    zipf.fp.write(zinfo.FileHeader(zip64))
+    shutil.copyfileobj(src, zipf.fp, 1024 * 1024)
+    zipf.filelist.append(zinfo)
+    zipf.NameToInfo[zinfo.filename] = zinfo
+    zipf.start_dir = zipf.fp.tell()
+
+@functools.lru_cache(maxsize=None)
+def precompressed_writes_supported() -> bool:
+    """
+    Round-trips a member through _write_precompressed in memory, once per process.
+    If a Python release changes the zipfile internals it uses, bundles are
+    zipped sequentially instead of in parallel.
+    """
+    data = b"precompressed probe " * 64
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    payload = compressor.compress(data) + compressor.flush()
+    buffer = io.BytesIO()
+    try:
+        with zipfile.ZipFile(buffer, 'w') as zipf:
+            zipf.writestr('before', b'x')
+            zinfo = zipfile.ZipInfo('probe')
+            zinfo.compress_type = zipfile.ZIP_DEFLATED
+            _write_precompressed(zipf, zinfo, zlib.crc32(data), len(payload), len(data), io.BytesIO(payload))
+            zipf.writestr('after', b'y')
+        with zipfile.ZipFile(buffer) as zipf:
+            if zipf.testzip() is None and zipf.read('probe') == data and zipf.namelist() == ['before', 'probe', 'after']:
+                return True
+    except Exception:
+        pass
+    logger.warning("zipfile internals changed: parallel zip assembly is disabled")
+    return False
+
+def _set_compress_level(zinfo: zipfile.ZipInfo, level):
+    # ZipFile.open() takes the level from the ZipInfo it is given. The attribute
+    # is public as compress_level from Python 3.13, _compresslevel before that.
+    if hasattr(zinfo, 'compress_level'):
+        zinfo.compress_level = level
+    else:
+        zinfo._compresslevel = level
+
+class _StreamSink(io.RawIOBase):
+    """
+    Write-only, unseekable sink that holds zip output until the generator yields it.
+    zipfile falls back to data descriptors when it cannot seek.
+    """
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def stream_zip(source_file_paths: list, chunk_size: int = 1024 * 1024, policy=None, extra_members=None):
+    """
+    Yields a zip archive of the given files (paths or (path, arcname) pairs) chunk by chunk.
+    Nothing is written to disk and memory stays bounded by chunk_size,
+    whatever the size of the files.
+    policy: Optional CompressionPolicy; without one every file is deflated.
+    extra_members: Optional {arcname: bytes} of generated members, written first.
+    """
+    sink = _StreamSink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        _write_extra_members(zipf, extra_members)
+        for entry in source_file_paths:
+            file_path, arcname = archive_member(entry)
+            if not os.path.exists(file_path):
+                continue
+            zinfo = zipfile.ZipInfo.from_file(file_path, arcname=arcname)
+            zinfo.compress_type, level = _compression_for(file_path, policy)
+            _set_compress_level(zinfo, level)
+            with open(file_path, 'rb') as src, zipf.open(zinfo, 'w') as dest:
+                while True:
+                    chunk = src.read(chunk_size)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    # Central directory is written when the archive is closed
+    yield sink.drain()
+
 def save_file_to_dir(file_storage, target_dir: str) -> str:
     """
     Saves a single file to the specific directory.
     Returns the full path.
     """
+    full_path, _, _ = save_stream_to_dir(file_storage.stream, file_storage.filename, target_dir)
+    return full_path
+
+def candidate_names(filename: str):
+    """
+    Yields filename, then name_1.ext, name_2.ext, ...
+    """
+    stem, ext = os.path.splitext(filename)
+    yield filename
+    attempt = 1
+    while True:
+        yield f"{stem}_{attempt}{ext}"
+        attempt += 1
+
+def unique_name(filename: str, taken) -> str:
+    """
+    First of candidate_names(filename) not in taken.
+    """
+    return next(name for name in candidate_names(filename) if name not in taken)
+
+def reserve_unique_path(target_dir: str, filename: str) -> str:
+    """
+    Claims filename in target_dir, or name_1.ext, name_2.ext, ... when taken, by
+    creating an empty placeholder with O_EXCL, so concurrent writers never get
+    the same name. Returns the claimed path.
+    """
+    for name in candidate_names(filename):
+        candidate = os.path.join(target_dir, name)
+        try:
+            os.close(os.open(candidate, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600))
+            return candidate
+        except FileExistsError:
+            continue
+
+def save_stream_to_dir(stream, filename: str, target_dir: str, chunk_size: int = 1024 * 1024,
+                       unique: bool = False):
+    """
+    Copies a readable stream into target_dir chunk by chunk, hashing it on the way.
+    Data goes to a temporary file that is renamed into place once complete,
+    so readers never see a partially written file.
+    unique: never replace an existing file; a numeric suffix is added instead
+    (see reserve_unique_path), so the returned name may differ from filename.
+    Returns (full_path, sha256 hex digest, size in bytes).
+    """
     if not os.path.exists(target_dir):
         os.makedirs(target_dir)
-        
-    filename = secure_filename(file_storage.filename)
+
+    filename = secure_filename(filename)
     full_path = os.path.join(target_dir, filename)
-    file_storage.save(full_path)
-    return full_path
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{filename}.", suffix='.part', dir=target_dir)
+    hasher = hashlib.sha256()
+    size = 0
+    reserved = None
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                out.write(chunk)
+                hasher.update(chunk)
+                size += len(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+        if unique:
+            full_path = reserved = reserve_unique_path(target_dir, filename)
+        os.replace(tmp_path, full_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+            if reserved:
+                os.remove(reserved)
+        raise
+    return full_path, hasher.hexdigest(), size
 
 def encrypt_data(data, secret_key: str) -> str:
     """
@@ -96,17 +595,45 @@ def encrypt_data(data, secret_key: str) -> str:
     Returns encrypted string.
     """
     try:
-        f = Fernet(secret_key.strip())
-        
-        # Serialize if list
-        if isinstance(data, list):
-            text_to_encrypt = json.dumps(data)
-        else:
-            text_to_encrypt = str(data)
-            
-        encrypted = f.encrypt(text_to_encrypt.encode()).decode()
-        return encrypted
-    except Exception as e:
-        print(f"Encryption error: {e}")
+        return _encrypt_with(get_fernet(secret_key), data)
+    except Exception:
+        logger.exception("Encryption error")
         return None
 
+def _decrypt_chunk(secret_key, encrypted_keys: list) -> list:
+    f = get_fernet(secret_key)
+    results = []
+    for encrypted_key in encrypted_keys:
+        try:
+            results.append(_decrypt_with(f, encrypted_key))
+        except Exception:
+            results.append(None)
+    return results
+
+def _encrypt_chunk(secret_key, items: list) -> list:
+    f = get_fernet(secret_key)
+    return [_encrypt_with(f, data) for data in items]
+
+def _run_chunked(fn, secret_key, items: list, workers: int, chunk_size: int) -> list:
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    if workers <= 1 or len(chunks) <= 1:
+        return [result for chunk in chunks for result in fn(secret_key, chunk)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        results = pool.map(fn, [secret_key] * len(chunks), chunks)
+        return [result for chunk_results in results for result in chunk_results]
+
+def decrypt_many(encrypted_keys: list, secret_key: str, workers: int = 1, chunk_size: int = 2000) -> list:
+    """
+    Decrypts many 'encrip' values, e.g. for admin scans over the surat table.
+    Returns a list aligned with encrypted_keys; entries that fail to decrypt are None.
+    workers > 1 spreads the chunks over a process pool.
+    """
+    return _run_chunked(_decrypt_chunk, secret_key, list(encrypted_keys), workers, chunk_size)
+
+def encrypt_many(items: list, secret_key: str, workers: int = 1, chunk_size: int = 2000) -> list:
+    """
+    Encrypts many values (lists or strings) with the same key.
+    Returns a list of tokens aligned with items.
+    """
+    return _run_chunked(_encrypt_chunk, secret_key, list(items), workers, chunk_size)
+
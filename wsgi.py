@@ -0,0 +1,12 @@
+"""
+Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app                 # Linux
+    waitress-serve --threads=16 --port=5000 wsgi:app      # Windows
+
+The Flask dev server (python app.py) is for local use only; debug mode there is
+off unless FILEDO_DEBUG=1, so neither entry point loads the interactive debugger.
+"""
+from app import app
+
+application = app
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class ZipCache:
+    """
+    Remembers archives already built in the staging dir, so an identical file set
+    reuses the existing zip instead of being compressed again.
+    Keys cover each source file's path, size and mtime: a changed source file
+    produces a new key and the stale entry is evicted by age or size.
+    Evicting only forgets an entry: the archive may have just been handed out,
+    so deleting it is left to the StagingManager's TTL and quota sweeps.
+    """
+
+    def __init__(self, max_entries=512, max_bytes=5 * 1024 ** 3, max_age=6 * 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+        self._entries = OrderedDict()  # key -> (zip_path, size, created), LRU order
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Striped locks so two requests for the same files build the archive only once
+        self._build_locks = [threading.Lock() for _ in range(64)]
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @staticmethod
+    def key_for(source_file_paths: list, staging_dir: str, extra_members=None):
+        """
+        Builds the cache key for a file set (paths or (path, arcname) pairs) plus
+        any generated members. Returns None if no source file exists.
+        """
+        parts = []
+        for entry in source_file_paths:
+            file_path, arcname = entry if isinstance(entry, (tuple, list)) else (entry, None)
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            parts.append([os.path.abspath(file_path), arcname, st.st_size, st.st_mtime_ns])
+        if not parts:
+            return None
+        extras = sorted((arcname, hashlib.sha256(data).hexdigest()) for arcname, data in (extra_members or {}).items())
+        payload = json.dumps([os.path.abspath(staging_dir), parts, extras])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def build_lock(self, key: str) -> threading.Lock:
+        return self._build_locks[int(key[:8], 16) % len(self._build_locks)]
+
+    def get(self, key: str, count_miss: bool = True):
+        """
+        Returns the staged zip path for key, or None if it is missing or expired.
+        count_miss=False for a quick look ahead of a lookup that will count it.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                zip_path, size, created = entry
+                if time.time() - created > self.max_age:
+                    self._pop(key)
+                    entry = None
+                elif not self._still_staged(zip_path, size):
+                    # Archive was removed or altered behind our back
+                    self._pop(key)
+                    entry = None
+                else:
+                    self._entries.move_to_end(key)
+            if entry is None:
+                if count_miss:
+                    self._stats['misses'] += 1
+            else:
+                self._stats['hits'] += 1
+        return entry[0] if entry is not None else None
+
+    def put(self, key: str, zip_path: str):
+        try:
+            size = os.path.getsize(zip_path)
+        except OSError:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (zip_path, size, time.time())
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        now = time.time()
+        for key in list(self._entries):
+            if now - self._entries[key][2] > self.max_age:
+                self._pop(key)
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._pop(next(iter(self._entries)))
+
+    def _pop(self, key: str) -> str:
+        zip_path, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        self._stats['evictions'] += 1
+        return zip_path
+
+    @staticmethod
+    def _still_staged(zip_path: str, size: int) -> bool:
+        try:
+            return os.path.getsize(zip_path) == size
+        except OSError:
+            return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        return stats